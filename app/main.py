@@ -1,24 +1,45 @@
 """
 PyQt6 エントリーポイント（アプリ起動）
 """
+# 起動時間の計測（最初に読み込んで、ここを起点にする）
+from app.utils import startup_timing
+import os
 import sys
 from PyQt6.QtWidgets import QApplication
 from app.ui.main_window import MainWindow
 from app.services import db
+from app.services import answer_buffer
+from app.utils import instrumentation
+
+startup_timing.mark("imports")
 
 
 def main():
     """アプリケーションのメイン関数"""
+    # サービス呼び出しの計測（JHS_ENGLISH_TRAINER_PROFILE=1 のときだけ）
+    if os.getenv(instrumentation.ENV_VAR):
+        instrumentation.enable()
+    
     # データベース初期化
     db.init_db()
+    startup_timing.mark("init_db")
+    
+    # 回答の書き込みをまとめる（前回異常終了時のジャーナルもここで復元される）
+    answer_buffer.enable()
+    startup_timing.mark("answer_buffer")
     
     # PyQt6アプリケーション作成
     app = QApplication(sys.argv)
+    startup_timing.mark("qapplication")
     
     # メインウィンドウ作成
     window = MainWindow()
+    startup_timing.mark("main_window")
     window.show()
     
+    # 終了時に書き込み待ちの回答を DB に反映
+    app.aboutToQuit.connect(window.flush_answers)
+    
     # イベントループ開始
     sys.exit(app.exec())
 
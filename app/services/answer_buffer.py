@@ -0,0 +1,362 @@
+"""
+回答の書き込みをまとめる write-behind バッファ
+単語・文法の進捗をメモリ上に保持し、(ユーザー, 項目) ごとに最新の状態だけを
+タイマー・タブ切り替え・アプリ終了時に1トランザクションでまとめて書き込む。
+
+回答イベント（answer_log）も同じトランザクションでまとめて追記する。
+
+書き込み前の状態はジャーナルファイル（JSON Lines）に追記しておき、
+アプリが異常終了しても次回 enable() 時に再適用する。
+既定（fsync=False）ではジャーナルは OS のページキャッシュまでしか書かないので、
+アプリのプロセスが落ちても残るが、OS のクラッシュや停電では直近の回答が失われることがある
+（enable(fsync=True) なら回答ごとに fsync して、それにも耐える）。
+メモリ上の DB（db.configure(in_memory=True)）では DB 自体がプロセスとともに消えるので、
+ジャーナルは書かない。
+ジャーナルには「回答後の進捗行そのもの」を書くので、進捗は何度再適用しても結果は同じ。
+イベントは二重に追記しないよう、ジャーナル先頭のバッチIDを
+answer_journal_state と照合してから適用する。
+"""
+import atexit
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from app.services import db
+from app.services import answer_log
+
+
+_lock = threading.RLock()
+_enabled = False
+_journal_path: Path | None = None
+_journal_file = None
+_fsync = False
+# 終了時の disable() を登録済みか（enable() のたびに登録しない）
+_atexit_registered = False
+
+# (user_id, word_id) -> word_progress の1行
+_pending_words: dict[tuple[int, int], dict] = {}
+# (user_id, grammar_id) -> grammar_progress の1行
+_pending_grammar: dict[tuple[int, int], dict] = {}
+# (user_id, question_id) -> grammar_question_progress の1行
+_pending_grammar_questions: dict[tuple[int, int], dict] = {}
+# answer_events に追記する行（answer_log.make_event の戻り値）
+_pending_events: list[tuple] = []
+# 現在のジャーナルのバッチID（flush のたびに新しくなる）
+_batch_id: str | None = None
+
+
+def get_journal_path() -> str | None:
+    """
+    ジャーナルファイルのパスを取得（app.db と同じフォルダ）
+
+    Returns:
+        パス。メモリ上の DB を使っている場合は None（ジャーナルを書かない）
+    """
+    if db.is_in_memory():
+        return None
+    return str(Path(db.get_db_path()).with_name("answer_journal.jsonl"))
+
+
+def enable(journal_path: str | None = None, fsync: bool = False) -> None:
+    """
+    バッファを有効にする
+
+    前回のジャーナルが残っていれば、その内容を DB に書き込んでから始める。
+
+    Args:
+        journal_path: ジャーナルファイルのパス（省略時は get_journal_path()。
+            メモリ上の DB ではジャーナルを書かない）
+        fsync: True の場合は回答ごとにジャーナルを fsync する（OS クラッシュ・停電にも耐える）
+    """
+    global _enabled, _journal_path, _journal_file, _fsync, _atexit_registered
+    with _lock:
+        if _enabled:
+            return
+        journal_path = journal_path or get_journal_path()
+        _journal_path = Path(journal_path) if journal_path else None
+        _fsync = fsync
+
+        if _journal_path is not None:
+            # 前回のジャーナルを再適用
+            _replay_journal()
+            _journal_file = open(_journal_path, "w", encoding="utf-8")
+        _start_batch()
+        _enabled = True
+
+        if not _atexit_registered:
+            atexit.register(disable)
+            _atexit_registered = True
+
+
+def disable() -> None:
+    """残りを書き込んでバッファを無効にする"""
+    global _enabled, _journal_file
+    with _lock:
+        if not _enabled:
+            return
+        flush()
+        if _journal_file is not None:
+            _journal_file.close()
+            _journal_file = None
+        _enabled = False
+
+
+def is_enabled() -> bool:
+    """バッファが有効かどうか"""
+    return _enabled
+
+
+def pending_count() -> int:
+    """まだ DB に書き込んでいない進捗の件数"""
+    with _lock:
+        return (
+            len(_pending_words) + len(_pending_grammar)
+            + len(_pending_grammar_questions) + len(_pending_events)
+        )
+
+
+def get_word_progress(user_id: int, word_id: int) -> dict | None:
+    """バッファ上の word_progress（なければ None）"""
+    with _lock:
+        row = _pending_words.get((user_id, word_id))
+        return dict(row) if row else None
+
+
+def put_word_progress(row: dict) -> None:
+    """
+    word_progress の1行をバッファに入れる（同じ単語の古い状態は上書き）
+
+    Args:
+        row: user_id, word_id, stage, total_correct, total_wrong, correct_streak,
+             avg_answer_time_sec, last_answered_at, last_answered_day を含む辞書
+    """
+    with _lock:
+        _pending_words[(row['user_id'], row['word_id'])] = dict(row)
+        _append_journal("word", row)
+
+
+def get_grammar_progress(user_id: int, grammar_id: int) -> dict | None:
+    """バッファ上の grammar_progress（なければ None）"""
+    with _lock:
+        row = _pending_grammar.get((user_id, grammar_id))
+        return dict(row) if row else None
+
+
+def put_grammar_progress(row: dict) -> None:
+    """
+    grammar_progress の1行をバッファに入れる（同じトピックの古い状態は上書き）
+
+    Args:
+        row: user_id, grammar_id, correct_count, wrong_count, mastery_level,
+             last_studied_at を含む辞書
+    """
+    with _lock:
+        _pending_grammar[(row['user_id'], row['grammar_id'])] = dict(row)
+        _append_journal("grammar", row)
+
+
+def get_grammar_question_progress(user_id: int, question_id: int) -> dict | None:
+    """バッファ上の grammar_question_progress（なければ None）"""
+    with _lock:
+        row = _pending_grammar_questions.get((user_id, question_id))
+        return dict(row) if row else None
+
+
+def put_grammar_question_progress(row: dict) -> None:
+    """
+    grammar_question_progress の1行をバッファに入れる（同じ問題の古い状態は上書き）
+
+    Args:
+        row: user_id, question_id, correct_count, wrong_count, correct_streak,
+             last_answered_at を含む辞書
+    """
+    with _lock:
+        _pending_grammar_questions[(row['user_id'], row['question_id'])] = dict(row)
+        _append_journal("grammar_question", row)
+
+
+def put_event(event: tuple) -> None:
+    """
+    回答イベントをバッファに入れる
+
+    Args:
+        event: answer_log.make_event() の戻り値
+    """
+    with _lock:
+        _pending_events.append(event)
+        _append_journal("event", list(event))
+
+
+def flush() -> int:
+    """
+    バッファの内容を1トランザクションで DB に書き込み、ジャーナルを空にする
+
+    書き込みに失敗した場合は、バッファとジャーナルをそのまま残して例外を送出する
+    （次の flush で同じ内容を書き直す）。
+
+    Returns:
+        書き込んだ行数（進捗行 + イベント）
+
+    Raises:
+        sqlite3.Error: DB に書き込めなかった（ロック中など）
+    """
+    with _lock:
+        if (
+            not _pending_words and not _pending_grammar
+            and not _pending_grammar_questions and not _pending_events
+        ):
+            return 0
+
+        count = _write_rows(
+            list(_pending_words.values()),
+            list(_pending_grammar.values()),
+            list(_pending_grammar_questions.values()),
+            list(_pending_events),
+            _batch_id,
+        )
+        _pending_words.clear()
+        _pending_grammar.clear()
+        _pending_grammar_questions.clear()
+        _pending_events.clear()
+
+        # DB に反映済みなのでジャーナルを空にして新しいバッチを始める
+        if _journal_file is not None:
+            _journal_file.seek(0)
+            _journal_file.truncate()
+            _start_batch()
+
+        return count
+
+
+def _start_batch() -> None:
+    """新しいバッチIDをジャーナルの先頭に書く（_lock を保持した状態で呼ぶこと）"""
+    global _batch_id
+    _batch_id = uuid.uuid4().hex
+    _append_journal("batch", _batch_id)
+
+
+def _append_journal(kind: str, row) -> None:
+    """ジャーナルに1行追記する（_lock を保持した状態で呼ぶこと）"""
+    if _journal_file is None:
+        return
+    _journal_file.write(json.dumps({"kind": kind, "row": row}, ensure_ascii=False) + "\n")
+    _journal_file.flush()
+    if _fsync:
+        os.fsync(_journal_file.fileno())
+
+
+def _replay_journal() -> None:
+    """前回のジャーナルを読み込んで DB に書き込む（_lock を保持した状態で呼ぶこと）"""
+    if not _journal_path.exists():
+        return
+
+    batch_id = None
+    words = {}
+    grammar = {}
+    grammar_questions = {}
+    events = []
+    with open(_journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # 書き込み途中で落ちた最終行は捨てる
+                continue
+            row = entry["row"]
+            if entry["kind"] == "batch":
+                batch_id = row
+            elif entry["kind"] == "word":
+                words[(row['user_id'], row['word_id'])] = row
+            elif entry["kind"] == "grammar":
+                grammar[(row['user_id'], row['grammar_id'])] = row
+            elif entry["kind"] == "grammar_question":
+                grammar_questions[(row['user_id'], row['question_id'])] = row
+            elif entry["kind"] == "event":
+                # error_kind を追加する前のジャーナルのイベントは NULL で埋める
+                events.append(tuple(row) + (None,) * (answer_log.EVENT_FIELDS - len(row)))
+
+    if batch_id is not None and batch_id == _get_applied_batch_id():
+        # flush 済み（ジャーナルを消す直前に落ちた）ので何もしない
+        words, grammar, grammar_questions, events = {}, {}, {}, []
+
+    if words or grammar or grammar_questions or events:
+        count = _write_rows(
+            list(words.values()),
+            list(grammar.values()),
+            list(grammar_questions.values()),
+            events,
+            batch_id,
+        )
+        print(f"[AnswerBuffer] ジャーナルから {count} 件の回答を復元しました")
+
+    _journal_path.unlink()
+
+
+def _get_applied_batch_id() -> str | None:
+    """最後に DB に反映したジャーナルのバッチID"""
+    row = db.get_connection().execute(
+        "SELECT last_batch_id FROM answer_journal_state WHERE id = 1"
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _write_rows(
+    word_rows: list[dict],
+    grammar_rows: list[dict],
+    grammar_question_rows: list[dict],
+    events: list[tuple],
+    batch_id: str | None,
+) -> int:
+    """進捗行の upsert とイベントの追記を1トランザクションで行う"""
+    conn = db.get_connection()
+    with conn:
+        cursor = conn.cursor()
+        if word_rows:
+            cursor.executemany("""
+                INSERT INTO word_progress
+                (user_id, word_id, stage, total_correct, total_wrong, correct_streak,
+                 avg_answer_time_sec, last_answered_at, last_answered_day)
+                VALUES (:user_id, :word_id, :stage, :total_correct, :total_wrong, :correct_streak,
+                        :avg_answer_time_sec, :last_answered_at, :last_answered_day)
+                ON CONFLICT(user_id, word_id) DO UPDATE SET
+                    stage = excluded.stage,
+                    total_correct = excluded.total_correct,
+                    total_wrong = excluded.total_wrong,
+                    correct_streak = excluded.correct_streak,
+                    avg_answer_time_sec = excluded.avg_answer_time_sec,
+                    last_answered_at = excluded.last_answered_at,
+                    last_answered_day = excluded.last_answered_day
+            """, word_rows)
+        if grammar_rows:
+            cursor.executemany("""
+                INSERT INTO grammar_progress
+                (user_id, grammar_id, correct_count, wrong_count, mastery_level, last_studied_at)
+                VALUES (:user_id, :grammar_id, :correct_count, :wrong_count, :mastery_level,
+                        :last_studied_at)
+                ON CONFLICT(user_id, grammar_id) DO UPDATE SET
+                    correct_count = excluded.correct_count,
+                    wrong_count = excluded.wrong_count,
+                    mastery_level = excluded.mastery_level,
+                    last_studied_at = excluded.last_studied_at
+            """, grammar_rows)
+        if grammar_question_rows:
+            cursor.executemany("""
+                INSERT INTO grammar_question_progress
+                (user_id, question_id, correct_count, wrong_count, correct_streak, last_answered_at)
+                VALUES (:user_id, :question_id, :correct_count, :wrong_count, :correct_streak,
+                        :last_answered_at)
+                ON CONFLICT(user_id, question_id) DO UPDATE SET
+                    correct_count = excluded.correct_count,
+                    wrong_count = excluded.wrong_count,
+                    correct_streak = excluded.correct_streak,
+                    last_answered_at = excluded.last_answered_at
+            """, grammar_question_rows)
+        answer_log.insert_events(cursor, events)
+        if batch_id is not None:
+            cursor.execute("""
+                INSERT INTO answer_journal_state (id, last_batch_id) VALUES (1, ?)
+                ON CONFLICT(id) DO UPDATE SET last_batch_id = excluded.last_batch_id
+            """, (batch_id,))
+
+    return len(word_rows) + len(grammar_rows) + len(grammar_question_rows) + len(events)
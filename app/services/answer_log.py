@@ -0,0 +1,109 @@
+"""
+回答イベントログ（追記専用）
+1回の回答を answer_events テーブルに1行で記録する。
+
+word_progress / grammar_progress はこのログから作れる「集計結果」であり、
+word_service.rebuild_word_progress() / grammar_service.rebuild_grammar_progress() で
+ログを1回なめるだけで作り直せる。
+
+1行はすべて整数列（種別・正誤・ミリ秒単位の回答時間・UNIX ミリ秒の時刻・誤答の種類）なので小さい。
+"""
+from datetime import datetime
+
+
+# item_kind の値
+KIND_WORD = 0     # item_id = words.word_id
+KIND_GRAMMAR = 1  # item_id = grammar_questions.question_id
+
+INSERT_EVENTS_SQL = """
+    INSERT INTO answer_events
+    (user_id, item_kind, item_id, is_correct, answer_ms, answered_at, error_kind)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# make_event が返すタプルの要素数（古いジャーナルの短いイベントは NULL で埋める）
+EVENT_FIELDS = 7
+
+
+def make_event(
+    user_id: int,
+    item_kind: int,
+    item_id: int,
+    is_correct: bool,
+    answer_time_sec: float | None,
+    answered_at: datetime,
+    error_kind: int | None = None,
+) -> tuple:
+    """
+    answer_events の1行を作る
+
+    Args:
+        user_id: ユーザーID
+        item_kind: KIND_WORD または KIND_GRAMMAR
+        item_id: word_id または question_id
+        is_correct: 正解かどうか
+        answer_time_sec: 回答時間（秒）。測っていない場合は None
+        answered_at: 回答時刻
+        error_kind: 誤答の種類（vocabulary_index.ERROR_CODES）。なければ None
+
+    Returns:
+        INSERT_EVENTS_SQL にそのまま渡せるタプル
+    """
+    answer_ms = None if answer_time_sec is None else int(round(answer_time_sec * 1000))
+    return (
+        user_id,
+        item_kind,
+        item_id,
+        1 if is_correct else 0,
+        answer_ms,
+        to_epoch_ms(answered_at),
+        error_kind,
+    )
+
+
+def to_epoch_ms(dt: datetime) -> int:
+    """ローカル時刻を UNIX ミリ秒に変換する"""
+    return int(round(dt.timestamp() * 1000))
+
+
+def from_epoch_ms(ms: int) -> datetime:
+    """UNIX ミリ秒をローカル時刻に変換する"""
+    return datetime.fromtimestamp(ms / 1000)
+
+
+def insert_events(cursor, events: list[tuple]) -> None:
+    """イベントをまとめて追記する（トランザクションは呼び出し側で管理）"""
+    if events:
+        cursor.executemany(INSERT_EVENTS_SQL, events)
+
+
+def iter_events(conn, item_kind: int, user_id: int | None = None):
+    """
+    イベントを記録順に1行ずつ返す（全件をメモリに載せない）
+
+    Args:
+        conn: DB 接続
+        item_kind: KIND_WORD または KIND_GRAMMAR
+        user_id: 指定した場合はそのユーザーの分だけ
+
+    Yields:
+        (user_id, item_id, is_correct, answer_ms, answered_at) のタプル
+    """
+    sql = """
+        SELECT user_id, item_id, is_correct, answer_ms, answered_at
+        FROM answer_events
+        WHERE item_kind = ?
+    """
+    params = [item_kind]
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params.append(user_id)
+    sql += " ORDER BY event_id"
+
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            return
+        for row in rows:
+            yield tuple(row)
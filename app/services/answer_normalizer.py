@@ -0,0 +1,141 @@
+"""
+解答の正規化と、許容する解答（表記ゆれ）の照合
+
+採点では、生徒の解答を normalize() で正規形（キー）にして、正解の正規形の集合と比べる。
+正規化で吸収する表記ゆれ:
+  - 全角英数字・全角スペース（日本語 IME のまま入力した場合）: NFKC で半角にする
+  - 大文字小文字
+  - 前後・語の間の余分な空白、句読点の前の空白
+  - 文末のピリオド・疑問符・感嘆符（「。」「．」を含む）
+  - 短縮形（doesn't / does not, I'm / I am, can't / cannot / can not など）: 展開した形にそろえる
+  - 曲がった引用符（’）・ダッシュ類
+
+正解の正規形は教材のインポート時に作って grammar_questions.answer_keys に保存しておく
+（encode_answer_keys）。正規化の規則を変えたら NORMALIZER_VERSION を上げる
+（古いキーは読み込み時に作り直す）。
+"""
+import json
+import re
+import unicodedata
+
+
+# 正規化の規則を変えたら上げる
+NORMALIZER_VERSION = 1
+
+# NFKC のあとにそろえる文字
+_CHAR_MAP = str.maketrans({
+    "‘": "'", "’": "'", "‛": "'", "′": "'", "`": "'", "´": "'",
+    "“": '"', "”": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "−": "-",
+    "。": ".", "｡": ".", "、": ",", "､": ",",
+})
+
+# 不規則な短縮形
+_IRREGULAR = {
+    "won't": "will not",
+    "can't": "cannot",
+    "shan't": "shall not",
+    "let's": "let us",
+}
+# 規則的な短縮形の語尾
+_SUFFIXES = {
+    "n't": " not",
+    "'re": " are",
+    "'ve": " have",
+    "'ll": " will",
+    "'m": " am",
+}
+# 's を is と読む語（それ以外の 's は所有格として残す）
+_IS_WORDS = frozenset({
+    "he", "she", "it", "that", "this", "there", "here", "what", "who", "where", "when", "how",
+})
+
+_CONTRACTION_RE = re.compile(r"[a-z]+(?:n't|'(?:re|ve|ll|m|s))(?![a-z])")
+_CANNOT_RE = re.compile(r"\bcan not\b")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r" ([,.!?;:])")
+_TRAILING_PUNCT = ".!? "
+
+
+def _expand(match: re.Match) -> str:
+    word = match.group(0)
+    irregular = _IRREGULAR.get(word)
+    if irregular is not None:
+        return irregular
+    if word.endswith("n't"):
+        return word[:-3] + " not"
+    base, _, suffix = word.rpartition("'")
+    if suffix == "s":
+        return f"{base} is" if base in _IS_WORDS else word
+    return base + _SUFFIXES["'" + suffix]
+
+
+def normalize(text: str) -> str:
+    """
+    解答を正規形にする（採点で比べるキー）
+
+    Args:
+        text: 生徒の解答、または正解
+
+    Returns:
+        正規形の文字列
+    """
+    text = unicodedata.normalize("NFKC", text).lower().translate(_CHAR_MAP)
+    text = " ".join(text.split())
+    if "'" in text:
+        text = _CONTRACTION_RE.sub(_expand, text)
+    if "can not" in text:
+        text = _CANNOT_RE.sub("cannot", text)
+    text = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", text)
+    return text.rstrip(_TRAILING_PUNCT)
+
+
+def accepted_keys(correct_answer: str, accepted_answers=()) -> list[str]:
+    """
+    正解と許容する別解の正規形（重複なし・順序は正解が先）
+
+    Args:
+        correct_answer: 正解
+        accepted_answers: 許容する別解（教材の accepted_answers）
+    """
+    keys = {}
+    for answer in (correct_answer, *accepted_answers):
+        if answer:
+            keys.setdefault(normalize(answer), None)
+    return list(keys)
+
+
+def encode_answer_keys(correct_answer: str, accepted_answers=()) -> str:
+    """
+    grammar_questions.answer_keys に保存する JSON
+
+    別解そのものも入れておき、正規化の規則が変わったときに作り直せるようにする。
+    """
+    accepted_answers = list(accepted_answers or ())
+    return json.dumps({
+        "version": NORMALIZER_VERSION,
+        "accepted": accepted_answers,
+        "keys": accepted_keys(correct_answer, accepted_answers),
+    }, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_answer_keys(value: str | None, correct_answer: str) -> frozenset[str]:
+    """
+    保存しておいた answer_keys から正規形の集合を取り出す
+
+    未設定（インポート前の行）や正規化のバージョンが違う場合は、その場で作り直す。
+    """
+    data = None
+    if value:
+        try:
+            data = json.loads(value)
+        except ValueError:
+            data = None
+    if data and data.get("version") == NORMALIZER_VERSION:
+        return frozenset(data["keys"])
+    accepted = data.get("accepted", []) if data else []
+    return frozenset(accepted_keys(correct_answer, accepted))
+
+
+def is_match(answer: str, keys) -> bool:
+    """解答が正規形の集合のどれかに一致するか（正規化1回 + 集合の検索1回）"""
+    return normalize(answer) in keys
@@ -0,0 +1,250 @@
+"""
+読み上げ音声のディスクキャッシュ
+(テキスト, ボイス, 速度) から作ったキー（内容アドレス）ごとに、合成した音声（WAV）を
+1ファイルずつ保存する。同じ単語をもう一度読み上げるときは合成せずにファイルを読むだけになる。
+
+合計サイズが上限を超えたら、最後に使ってから最も時間が経ったものから消す（LRU）。
+キーごとのサイズと最終使用時刻は index.json に保存する（LRU の順序を次回起動に引き継ぐ）。
+
+MemoryAudioPool は同じキーで音声をメモリ上に持っておくバッファ（これから再生しそうなもの）。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+# キャッシュの合計サイズの既定の上限
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+INDEX_FILENAME = "index.json"
+
+# キーの作り方・保存形式を変えたら上げる（古いキャッシュは使われずに消える）
+CACHE_FORMAT_VERSION = 1
+
+
+def make_key(text: str, voice: str, rate: int) -> str:
+    """(テキスト, ボイス, 速度) のキー（16 バイトの blake2b の16進文字列）"""
+    payload = json.dumps([CACHE_FORMAT_VERSION, text, voice, rate], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class AudioCache:
+    """
+    内容アドレスの音声キャッシュ（LRU・サイズ上限つき）
+
+    複数のスレッドから使ってよい（ファイルの読み書きもロックの中で行う）。
+    """
+
+    def __init__(self, directory, max_bytes: int = DEFAULT_MAX_BYTES, extension: str = "wav"):
+        """
+        Args:
+            directory: 音声ファイルと index.json を置くフォルダ（なければ作る）
+            max_bytes: 合計サイズの上限
+            extension: 音声ファイルの拡張子
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        # key -> {"size", "last_used"}（先頭ほど古い）
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._total_bytes = 0
+        self._dirty = False
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.{self.extension}"
+
+    def _load_index(self) -> None:
+        """index.json を読む。ファイルが消えた項目は捨て、index にないファイルは拾い直す"""
+        entries = []
+        try:
+            with open(self.directory / INDEX_FILENAME, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == CACHE_FORMAT_VERSION:
+                entries = index.get("entries", [])
+        except (OSError, ValueError):
+            pass
+
+        for key, size, last_used in entries:
+            if self._path(key).exists():
+                self._entries[key] = {"size": size, "last_used": last_used}
+        # 前回 index を保存する前に終了した分（古い順に並べて末尾に足す）
+        orphans = []
+        for path in self.directory.glob(f"*.{self.extension}"):
+            if path.stem not in self._entries:
+                stat = path.stat()
+                orphans.append((stat.st_mtime, path.stem, stat.st_size))
+        for mtime, key, size in sorted(orphans):
+            self._entries[key] = {"size": size, "last_used": mtime}
+            self._dirty = True
+
+        self._total_bytes = sum(entry["size"] for entry in self._entries.values())
+        self._evict()
+
+    def save_index(self) -> None:
+        """index.json を書き出す（変更がなければ何もしない）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            index = {
+                "version": CACHE_FORMAT_VERSION,
+                "entries": [
+                    [key, entry["size"], entry["last_used"]]
+                    for key, entry in self._entries.items()
+                ],
+            }
+            path = self.directory / INDEX_FILENAME
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp, path)
+            self._dirty = False
+
+    def get(self, key: str) -> bytes | None:
+        """
+        キャッシュされた音声を取り出す
+
+        Returns:
+            音声データ。なければ None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            try:
+                data = self._path(key).read_bytes()
+            except OSError:
+                # 外から消された
+                self._remove(key)
+                self.misses += 1
+                return None
+            entry["last_used"] = time.time()
+            self._entries.move_to_end(key)
+            self._dirty = True
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """音声を保存する（上限を超えたら古いものから消す）"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            path = self._path(key)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._entries[key] = {"size": len(data), "last_used": time.time()}
+            self._total_bytes += len(data)
+            self._dirty = True
+            self._evict()
+            self.save_index()
+
+    def get_or_create(self, text: str, voice: str, rate: int, synthesize) -> bytes:
+        """
+        キャッシュにあればそれを、なければ synthesize(text, voice, rate) で作って保存して返す
+
+        合成はロックの外で行う（合成中も他のスレッドはキャッシュを読める）。
+        """
+        key = make_key(text, voice, rate)
+        data = self.get(key)
+        if data is None:
+            data = synthesize(text, voice, rate)
+            self.put(key, data)
+        return data
+
+    def contains(self, key: str) -> bool:
+        """キャッシュにあるか（最終使用時刻は更新しない）"""
+        with self._lock:
+            return key in self._entries
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry["size"]
+        self._dirty = True
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """合計サイズが上限以下になるまで古いものから消す"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """すべて消す"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            self.save_index()
+
+    def stats(self) -> dict:
+        """件数・合計サイズ・ヒット数・ミス数"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class MemoryAudioPool:
+    """
+    メモリ上の音声バッファ（LRU・サイズ上限つき）
+
+    これから再生しそうな音声を先に置いておき、再生時にディスクも読まずに済ませる。
+    複数のスレッドから使ってよい。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._buffers: OrderedDict[str, bytes] = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, key: str) -> bytes | None:
+        """音声を取り出す（なければ None）"""
+        with self._lock:
+            data = self._buffers.get(key)
+            if data is not None:
+                self._buffers.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """音声を置く（上限を超えたら古いものから捨てる）"""
+        with self._lock:
+            old = self._buffers.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old)
+            self._buffers[key] = data
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._buffers) > 1:
+                _, dropped = self._buffers.popitem(last=False)
+                self._total_bytes -= len(dropped)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._buffers
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffers.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        """件数・合計サイズ"""
+        with self._lock:
+            return {"entries": len(self._buffers), "bytes": self._total_bytes,
+                    "max_bytes": self.max_bytes}
@@ -0,0 +1,131 @@
+"""
+読み上げ音声パック（audio_pack.bin）
+単語の音声をあらかじめまとめて合成した1つのファイル（scripts/build_audio_pack.py で作る）。
+アプリはメモリマップして、キー（audio_cache.make_key）から音声を取り出す。
+
+ファイル形式:
+    ヘッダー（32 バイト）: MAGIC(8) / 形式バージョン(u32) / 予約(u32) / 索引の位置(u64) / 索引の長さ(u64)
+    音声データ（WAV を順に並べたもの）
+    索引（JSON）: {"meta": {...}, "entries": {キー: [位置, 長さ], ...}}
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+
+# パックの場所を指定する環境変数
+AUDIO_PACK_ENV = "JHS_ENGLISH_TRAINER_AUDIO_PACK"
+AUDIO_PACK_FILENAME = "audio_pack.bin"
+
+MAGIC = b"JHSAUDIO"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIIQQ")
+
+
+class AudioPackError(Exception):
+    """音声パックが読めない・形式が合わない"""
+
+
+def default_pack_path() -> Path:
+    """既定のパックの場所（exe の場合は exe と同じフォルダ、ソースの場合は data/）"""
+    if getattr(sys, "frozen", False):
+        return Path(sys.executable).parent / AUDIO_PACK_FILENAME
+    return Path(__file__).resolve().parents[2] / "data" / AUDIO_PACK_FILENAME
+
+
+def find_pack() -> str | None:
+    """
+    使うパックのパス（環境変数 JHS_ENGLISH_TRAINER_AUDIO_PACK > 既定の場所）
+
+    Returns:
+        パックのパス。見つからなければ None
+    """
+    path = Path(os.getenv(AUDIO_PACK_ENV) or default_pack_path())
+    return str(path) if path.exists() else None
+
+
+class AudioPack:
+    """メモリマップした音声パック（読み込み専用。複数のスレッドから使ってよい）"""
+
+    def __init__(self, path):
+        """
+        Raises:
+            AudioPackError: パックが読めない・形式が合わない
+        """
+        self.path = str(path)
+        try:
+            self._file = open(self.path, "rb")
+        except OSError as e:
+            raise AudioPackError(f"音声パックを開けません: {path}: {e}")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, _, index_offset, index_length = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise AudioPackError(f"音声パックの形式が合いません: {path}")
+            index = json.loads(self._mm[index_offset:index_offset + index_length])
+        except (ValueError, struct.error) as e:
+            self.close()
+            raise AudioPackError(f"音声パックが壊れています: {path}: {e}")
+        except AudioPackError:
+            self.close()
+            raise
+        self.meta: dict = index.get("meta", {})
+        self._entries: dict[str, list[int]] = index["entries"]
+
+    def get(self, key: str) -> bytes | None:
+        """キーの音声（WAV）。なければ None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._mm[offset:offset + length]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def close(self) -> None:
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+
+def write_pack(path, blobs, meta: dict) -> int:
+    """
+    音声パックを書き出す（一時ファイルに書いてから置き換える）
+
+    Args:
+        path: 出力先
+        blobs: (キー, 音声データ) を返すイテラブル（同じキーは最初のものを使う）
+        meta: 索引に入れる情報
+
+    Returns:
+        書き込んだ件数
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    entries = {}
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        offset = _HEADER.size
+        for key, data in blobs:
+            if key in entries:
+                continue
+            f.write(data)
+            entries[key] = [offset, len(data)]
+            offset += len(data)
+        index = json.dumps({"meta": meta, "entries": entries}, ensure_ascii=False).encode("utf-8")
+        f.write(index)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, offset, len(index)))
+    os.replace(tmp, path)
+    return len(entries)
@@ -0,0 +1,158 @@
+"""
+読み上げ音声の先読み（事前合成）
+次に出題されそうな単語（先読み済みの出題単語 → スケジューラの上位候補の順）の音声を
+優先度の低いワーカースレッドで先に合成し、tts_service のメモリ上のバッファに置いておく。
+ステージ4（音声のみ）の出題や正解時の読み上げが、合成を待たずに始まる。
+
+再生ワーカー（tts_service.PlaybackWorker）が動いている間は合成しない（再生を優先する）。
+"""
+import os
+import sys
+import threading
+import time
+from typing import Callable
+from app.services import tts_service
+from app.services.word_scheduler import TOP_N
+
+
+# 1回の依頼で先に合成する単語数の上限
+DEFAULT_MAX_WORDS = TOP_N
+
+# 再生ワーカーが動いている間、合成を待つ間隔（秒）
+BUSY_POLL_SEC = 0.05
+
+
+def _lower_thread_priority() -> None:
+    """このスレッドの OS の優先度を下げる（できる環境だけ）"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            THREAD_PRIORITY_LOWEST = -2
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_LOWEST)
+        elif sys.platform.startswith("linux"):
+            # Linux ではスレッドごとに nice 値を持つ
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except Exception:
+        pass
+
+
+class AudioPrefetcher:
+    """
+    音声を先に合成しておくワーカースレッド（UI 非依存）
+
+    - request() で単語の一覧を渡す（前の依頼の残りは捨てる）
+    - 一覧は呼び出し側で作っておく（ワーカースレッドでは DB もサービスの状態も触らない）
+    - 合成した音声は tts_service のメモリ上のバッファ（とディスクキャッシュ）に入る
+    """
+
+    def __init__(self, max_words: int = DEFAULT_MAX_WORDS, is_busy: Callable[[], bool] | None = None):
+        """
+        Args:
+            max_words: 1回の依頼で合成する単語数の上限
+            is_busy: True の間は合成を待つ関数。省略時は再生ワーカーが動いているか
+        """
+        self.max_words = max_words
+        self._is_busy = is_busy or (lambda: not tts_service.get_player().is_idle())
+        self._cond = threading.Condition()
+        self._source = None
+        self._voice = ""
+        self._rate = 0
+        # request / cancel のたびに増える。古い依頼の残りは捨てる
+        self._generation = 0
+        self._stopped = False
+        self._working = False
+        # バッファに入れた音声の数（合成した分とディスクキャッシュから読んだ分）
+        self.buffered = 0
+        self._thread = threading.Thread(target=self._run, name="AudioPrefetch", daemon=True)
+        self._thread.start()
+
+    def request(self, words, voice: str = "", rate: int = 0) -> None:
+        """
+        単語の音声を先に合成するよう依頼する（すぐ戻る）
+
+        Args:
+            words: 英単語のリスト。先頭ほど先に合成する
+            voice: ボイス
+            rate: 読み上げ速度
+        """
+        with self._cond:
+            self._source = list(words)
+            self._voice = voice
+            self._rate = rate
+            self._generation += 1
+            self._cond.notify_all()
+
+    def cancel(self) -> None:
+        """合成待ちの単語を捨てる（合成中の1件は最後まで行う）"""
+        with self._cond:
+            self._source = None
+            self._generation += 1
+
+    def shutdown(self) -> None:
+        """ワーカースレッドを停止する"""
+        with self._cond:
+            self._stopped = True
+            self._source = None
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """依頼をすべて処理し終えるまで待つ（テスト・ベンチマーク用）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._source is not None or self._working:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _run(self) -> None:
+        """ワーカースレッド本体"""
+        _lower_thread_priority()
+        com = tts_service.init_com()
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopped and self._source is None:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    source, voice, rate = self._source, self._voice, self._rate
+                    generation = self._generation
+                    self._source = None
+                    self._working = True
+                try:
+                    self._render(source, voice, rate, generation)
+                except Exception as e:
+                    print(f"[AudioPrefetch] 先読みエラー: {e}")
+                finally:
+                    with self._cond:
+                        self._working = False
+                        self._cond.notify_all()
+        finally:
+            if com is not None:
+                com.CoUninitialize()
+
+    def _render(self, source, voice: str, rate: int, generation: int) -> None:
+        """単語を先頭から順に合成する（新しい依頼が来たら途中でやめる）"""
+        seen = set()
+        for text in source:
+            if len(seen) >= self.max_words:
+                return
+            if not text or text in seen:
+                continue
+            seen.add(text)
+            # 再生中は待つ（再生を優先する）
+            while self._is_busy():
+                with self._cond:
+                    if generation != self._generation or self._stopped:
+                        return
+                time.sleep(BUSY_POLL_SEC)
+            with self._cond:
+                if generation != self._generation or self._stopped:
+                    return
+            if tts_service.is_buffered(text, voice, rate):
+                continue
+            if tts_service.get_audio(text, voice, rate) is not None:
+                self.buffered += 1
@@ -0,0 +1,655 @@
+"""
+紛らわしい単語のグラフ（word_confusables）を作る
+つづりが似ている単語（weather / whether, very / every など）と、
+意味（words.japanese）が同じ単語（see / look など）を結ぶ疎なグラフを、教材のインポート時に作っておく。
+出題では、直前の単語と紛らわしい単語を続けて出して見比べさせる（word_service）。
+
+つづりの近さは、前後に印（^ $）を付けた文字 bigram の集合のコサイン類似度。
+転置索引を引いて、bigram を共有する単語の組だけを比べる（単語数 × bigram 数の密な行列は作らない）。
+bigram は出現頻度の低い順に並べ、類似度が閾値以上なら必ず共有する先頭の数個だけを索引に入れる
+（prefix filter。「e$」のようなよく出る bigram で候補が膨らまない）。
+NumPy があれば、先頭の bigram から2つ選んだ組で索引を作り（bigram は数百種類しかなく、
+1つでは候補が絞れない）、候補の組をブロックごとに配列で作って、ビット集合の AND で共通の数を数える
+（1ブロックの候補は BLOCK_CELLS 組まで）。NumPy がなければ同じことを Python のループで行う
+（小さい教材向け）。
+
+教材の同期で変わった単語が少なければ、update_edges で変わった単語とその近くの単語の辺だけを
+作り直す（全単語の組は比べない）。
+
+意味は japanese を「／」「、」などで区切り、補足の（…）と「〜」を除いたもので比べる。
+"""
+from collections import Counter, defaultdict
+from itertools import chain, combinations
+import importlib.util
+import math
+import re
+import unicodedata
+from app.services import answer_normalizer
+
+# NumPy は読み込みに時間がかかるので、グラフを作るときに読み込む
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+np = None
+
+
+def _load_numpy():
+    """NumPy を読み込む（2回目以降は読み込み済みのものを返す）"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+# つづりが似ているとみなすコサイン類似度の下限
+SPELLING_THRESHOLD = 0.6
+# 意味が同じ単語に足すスコア
+MEANING_SCORE = 0.5
+# この数より多くの単語が同じ意味を持つ場合は結ばない（「〜の」のような広すぎる訳語）
+MEANING_GROUP_MAX = 8
+# 1単語あたりに残す紛らわしい単語の数（相手側で残った組も含めるので、これより多くなることはある）
+MAX_PARTNERS = 5
+
+# NumPy 版で1回に比べる候補の組の数（作業用の配列は1組あたり数十バイト）
+BLOCK_CELLS = 1 << 20
+# 類似度は小数 4 桁に丸めて比べる（NumPy 版と純 Python 版で同じ結果にするため）
+SCORE_DIGITS = 4
+
+# NumPy がない場合に全体を作る単語数の上限（大きい教材では時間がかかりすぎる）
+PURE_PYTHON_MAX_WORDS = 20000
+# 変わった単語がこの割合を超えたら、差分ではなく全体を作り直す
+INCREMENTAL_MAX_FRACTION = 0.05
+
+# word_confusables.reason（ビットの組み合わせ）
+REASON_SPELLING = 1
+REASON_MEANING = 2
+
+_NOTE_RE = re.compile(r"[（(][^）)]*[）)]")
+_MEANING_SEPARATORS_RE = re.compile(r"[／/、,;]")
+_MEANING_STRIP = "〜~…・ "
+
+
+def bigrams(text: str) -> frozenset[str]:
+    """正規形の前後に ^ $ を付けた文字 bigram の集合"""
+    key = "^" + answer_normalizer.normalize(text) + "$"
+    return frozenset(key[i:i + 2] for i in range(len(key) - 1))
+
+
+def meanings(japanese: str) -> set[str]:
+    """japanese の訳語（区切り・補足の（…）・「〜」を除いたもの）"""
+    text = _NOTE_RE.sub("", unicodedata.normalize("NFKC", japanese or ""))
+    result = set()
+    for part in _MEANING_SEPARATORS_RE.split(text):
+        part = part.strip(_MEANING_STRIP)
+        if part:
+            result.add(part)
+    return result
+
+
+def _score(overlap: int, size_a: int, size_b: int) -> float:
+    """共通の bigram の数から求めたコサイン類似度（SCORE_DIGITS 桁に丸める）"""
+    return round(overlap / math.sqrt(size_a * size_b), SCORE_DIGITS)
+
+
+def _lower_bound(threshold: float) -> float:
+    """丸めると threshold 以上になりうる類似度の下限（フィルタはこれで判定する）"""
+    return threshold - 10 ** -SCORE_DIGITS
+
+
+def _prefix_length(size: int, fraction: float) -> int:
+    """共通の bigram が size * fraction 個以上あるなら、必ず1つは共有する先頭の bigram の数"""
+    need = max(1, math.ceil(size * fraction - 1e-9))
+    return max(1, size - need + 1)
+
+
+def _signature_length(size: int, fraction: float) -> int:
+    """共通の bigram が size * fraction 個（2個）以上あるなら、2つは共有する先頭の bigram の数"""
+    return size - max(2, math.ceil(size * fraction - 1e-9)) + 2
+
+
+class _GramTable:
+    """
+    単語ごとの bigram を、出現頻度の低い順の番号（0 が最も少ない）で持つ
+
+    番号の並びが prefix filter の順序になる。共通の数はビット集合（int）の AND で数える。
+    """
+
+    def __init__(self, grams):
+        """grams: 単語ごとの bigram の集合のイテラブル（集合は番号にしてから捨てる）"""
+        ids = {}
+        words = [tuple(ids.setdefault(gram, len(ids)) for gram in word_grams) for word_grams in grams]
+        frequency = Counter(chain.from_iterable(words))
+        rank = [0] * len(ids)
+        for i, gram in enumerate(sorted(ids, key=lambda g: (frequency[ids[g]], g))):
+            rank[ids[gram]] = i
+        self.vocabulary_size = len(rank)
+        self.ranks = [sorted(rank[gram] for gram in word) for word in words]
+        self.sizes = [len(ranks) for ranks in self.ranks]
+        self.bits = [sum(1 << r for r in ranks) for ranks in self.ranks]
+        # similar の索引と _similar_numpy の索引（最初に使うときに作る）
+        self._postings = None
+        self._arrays = None
+
+    def __len__(self) -> int:
+        return len(self.ranks)
+
+    def score(self, i: int, j: int) -> float:
+        """i と j のコサイン類似度"""
+        return _score((self.bits[i] & self.bits[j]).bit_count(), self.sizes[i], self.sizes[j])
+
+    def _signatures(self, i: int, fraction: float) -> list[int]:
+        """
+        i の先頭の bigram から2つ選んだ組の番号
+
+        共通の数が α 以上の単語どうしは、先頭の（大きさ - α + 2）個の中で2つは共有する。
+        bigram が1つの単語（空の単語）は -1 だけ。
+        """
+        ranks = self.ranks[i]
+        if len(ranks) < 2:
+            return [-1]
+        prefix = ranks[:_signature_length(len(ranks), fraction)]
+        return [a * self.vocabulary_size + b for a, b in combinations(prefix, 2)]
+
+    def similar(self, i: int, threshold: float, active: set[int] | None = None) -> dict[int, float]:
+        """
+        i とつづりが似ている単語
+
+        Args:
+            active: 相手にする単語の位置（None ならすべて）
+
+        Returns:
+            {位置: 類似度}
+        """
+        # 大きさの比は fraction 倍以内なので、共通の数はどちらの大きさ × fraction 以上にもなる
+        fraction = _lower_bound(threshold) ** 2
+        if self._postings is None:
+            postings = defaultdict(list)
+            for j in range(len(self.ranks)):
+                for signature in self._signatures(j, fraction):
+                    postings[signature].append(j)
+            self._postings = postings
+
+        candidates = set()
+        for signature in self._signatures(i, fraction):
+            candidates.update(self._postings[signature])
+        candidates.discard(i)
+
+        # 相手の大きさごとに必要な共通の数（大きさの比が fraction 倍を超える相手は入れない）
+        size = self.sizes[i]
+        bound = _lower_bound(threshold)
+        need = {
+            other: math.ceil(bound * math.sqrt(size * other) - 1e-9)
+            for other in range(math.ceil(size * fraction - 1e-9), math.floor(size / fraction + 1e-9) + 1)
+        }
+        bits = self.bits[i]
+        result = {}
+        for j in candidates:
+            if active is not None and j not in active:
+                continue
+            overlap = (bits & self.bits[j]).bit_count()
+            if overlap < need.get(self.sizes[j], size + 1):
+                continue
+            score = _score(overlap, size, self.sizes[j])
+            if score >= threshold:
+                result[j] = score
+        return result
+
+
+def _spelling_pairs_python(table: _GramTable, threshold: float) -> list[tuple[int, int, float]]:
+    """
+    類似度が threshold 以上の単語の組（bigram の転置索引で候補を絞る）
+
+    単語を大きさの順に見ていき、それまでの単語（同じか小さい）の索引だけを引くので、
+    組はそれぞれ1回だけ比べる。
+    """
+    bound = _lower_bound(threshold)
+    postings = defaultdict(list)
+    pairs = []
+    for i in sorted(range(len(table)), key=lambda i: (table.sizes[i], i)):
+        size = table.sizes[i]
+        ranks = table.ranks[i]
+        candidates = set()
+        for r in ranks[:_prefix_length(size, bound * bound)]:
+            candidates.update(postings[r])
+        low = size * bound * bound - 1e-9
+        for j in candidates:
+            if table.sizes[j] < low:
+                continue
+            score = table.score(i, j)
+            if score >= threshold:
+                pairs.append((min(i, j), max(i, j), score))
+        # 相手（自分以上の大きさ）と共通の数は、自分の大きさ × bound 以上になる
+        for r in ranks[:_prefix_length(size, bound)]:
+            postings[r].append(i)
+    return pairs
+
+
+def _popcount(values):
+    """uint64 の配列の各要素の立っているビットの数"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def _offsets(lengths):
+    """長さ lengths の区間を並べたときの、各要素の区間内での位置"""
+    return np.arange(int(lengths.sum()), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+
+def _signatures(ranks: list[list[int]], positions, length: int, vocabulary_size: int):
+    """
+    単語（先頭の bigram の数が同じ）ごとに、先頭 length 個の bigram から2つ選んだ組の番号を並べる
+
+    bigram が1つの単語（空の単語）は vocabulary_size² だけ（_GramTable._signatures の -1）。
+
+    Returns:
+        (組の番号, 単語の位置) の配列
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if length < 2:
+        return np.full(len(positions), vocabulary_size ** 2, dtype=np.int64), positions
+    prefix = np.array([r[:length] for r in ranks], dtype=np.int64)
+    left, right = np.triu_indices(length, 1)
+    keys = (prefix[:, left] * vocabulary_size + prefix[:, right]).ravel()
+    return keys, np.repeat(positions, len(left))
+
+
+def _bit_columns(ranks: list[list[int]], vocabulary_size: int):
+    """bigram のビット集合（64 個ずつの列 × 単語）"""
+    grams = np.fromiter(chain.from_iterable(ranks), dtype=np.int64)
+    words = np.repeat(np.arange(len(ranks)), [len(r) for r in ranks])
+    bits = np.zeros(((vocabulary_size + 63) // 64, len(ranks)), dtype=np.uint64)
+    np.bitwise_or.at(
+        bits, (grams // 64, words), np.left_shift(np.uint64(1), (grams % 64).astype(np.uint64))
+    )
+    return bits
+
+
+def _need_table(longest: int, bound: float):
+    """大きさの組ごとに、類似度が bound 以上になるのに必要な共通の数"""
+    grid = np.arange(longest + 1, dtype=np.float64)
+    return np.ceil(bound * np.sqrt(np.outer(grid, grid)) - 1e-9).astype(np.int64)
+
+
+def _candidate_blocks(low, counts, probe_words, index_words, bits):
+    """
+    索引の範囲 [low, low + counts) を展開した候補の組を、BLOCK_CELLS 組ずつ作る
+
+    Yields:
+        (probe の単語, 索引の単語, 共通の bigram の数) の配列
+    """
+    cumulative = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        done = int(cumulative[start - 1]) if start else 0
+        stop = max(start + 1, int(np.searchsorted(cumulative, done + BLOCK_CELLS, side="right")))
+        block = counts[start:stop]
+        if block.sum():
+            xs = np.repeat(probe_words[start:stop], block)
+            ys = index_words[np.repeat(low[start:stop], block) + _offsets(block)]
+            overlap = np.zeros(len(xs), dtype=np.int64)
+            for column in bits:
+                overlap += _popcount(column[xs] & column[ys])
+            yield xs, ys, overlap
+        start = stop
+
+
+def _spelling_pairs_numpy(table: _GramTable, threshold: float):
+    """
+    _spelling_pairs_python と同じ組を、候補の組をブロックごとの配列で作って求める
+
+    bigram は種類が少なく（数百）、1つだけでは候補が絞れないので、2つの bigram の組で索引を作る
+    （_GramTable._signatures）。索引は (組の番号, 単語) を並べた1本の配列。
+    大きさが同じ単語ごとに、自分より前（大きさが同じか小さく、bound² 倍以上）の単語の範囲を
+    二分探索で求めて展開し、共通の数をビット集合で数える。
+
+    Returns:
+        (位置, 位置, 共通の数) の配列。丸めた類似度が threshold に届かない組も少し含む
+    """
+    np = _load_numpy()
+    n = len(table)
+    bound = _lower_bound(threshold)
+    sizes = np.array(table.sizes, dtype=np.int64)
+    # 大きさの順に並べ直す（以降の「単語」はこの順番の位置）
+    order = np.lexsort((np.arange(n), sizes))
+    sorted_sizes = sizes[order]
+    ranks = [table.ranks[i] for i in order.tolist()]
+    size_list = np.unique(sorted_sizes).tolist()
+    size_start = np.searchsorted(sorted_sizes, size_list).tolist() + [n]
+    need = _need_table(size_list[-1], bound)
+
+    # bigram が1つの単語（空の単語）どうしは、索引を使わずに組にする
+    empty = int(np.searchsorted(sorted_sizes, 2))
+    xs, ys = np.triu_indices(empty, 1)
+    found_keys = [ys * n + xs]
+    found_overlaps = [np.ones(len(xs), dtype=np.int64)]
+
+    index_keys = []
+    for k, size in enumerate(size_list):
+        if size >= 2:
+            # 自分以上の大きさの相手と共通の数は size * bound 以上
+            keys, words = _signatures(
+                ranks[size_start[k]:size_start[k + 1]], range(size_start[k], size_start[k + 1]),
+                _signature_length(size, bound), table.vocabulary_size,
+            )
+            index_keys.append(keys * n + words)
+    index_keys = np.sort(np.concatenate(index_keys)) if index_keys else np.zeros(0, dtype=np.int64)
+    index_words = index_keys % n
+    bits = _bit_columns(ranks, table.vocabulary_size)
+
+    for k, size in enumerate(size_list):
+        if size < 2:
+            continue
+        # 自分以下の大きさの相手と共通の数は size * bound² 以上
+        probe_keys, probe_words = _signatures(
+            ranks[size_start[k]:size_start[k + 1]], range(size_start[k], size_start[k + 1]),
+            _signature_length(size, bound * bound), table.vocabulary_size,
+        )
+        first = int(np.searchsorted(sorted_sizes, size * bound * bound - 1e-9))
+        low = np.searchsorted(index_keys, probe_keys * n + first)
+        counts = np.searchsorted(index_keys, probe_keys * n + probe_words) - low
+        del probe_keys
+        for xs, ys, overlap in _candidate_blocks(low, counts, probe_words, index_words, bits):
+            keep = overlap >= need[size, sorted_sizes[ys]]
+            # 似ている組は共有する bigram の組の数だけ見つかるので、1つにまとめる
+            keys, first_found = np.unique(xs[keep] * n + ys[keep], return_index=True)
+            found_keys.append(keys)
+            found_overlaps.append(overlap[keep][first_found])
+
+    # ブロックの境目で分かれた組をまとめる
+    keys, first_found = np.unique(np.concatenate(found_keys), return_index=True)
+    return order[keys // n], order[keys % n], np.concatenate(found_overlaps)[first_found]
+
+
+def _grouped_signatures(table: _GramTable, positions: list[int], fraction: float):
+    """positions の単語の、_GramTable._signatures と同じ組の番号 (組の番号, 単語の位置) の配列"""
+    groups = defaultdict(list)
+    for i in positions:
+        groups[_signature_length(table.sizes[i], fraction)].append(i)
+    keys = [np.zeros(0, dtype=np.int64)]
+    words = [np.zeros(0, dtype=np.int64)]
+    for length, members in groups.items():
+        group_keys, group_words = _signatures(
+            [table.ranks[i] for i in members], members, length, table.vocabulary_size
+        )
+        keys.append(group_keys)
+        words.append(group_words)
+    return np.concatenate(keys), np.concatenate(words)
+
+
+def _similar_numpy(table: _GramTable, queries, threshold: float, active=None) -> dict:
+    """
+    queries の単語それぞれの _GramTable.similar を、配列でまとめて求める
+
+    Returns:
+        {位置: {位置: 類似度}}（queries のすべての単語を含む）
+    """
+    np = _load_numpy()
+    n = len(table)
+    bound = _lower_bound(threshold)
+    queries = sorted(set(queries))
+    result = {i: {} for i in queries}
+    if not queries:
+        return result
+    if table._arrays is None:
+        keys, words = _grouped_signatures(table, range(n), bound * bound)
+        index_keys = np.sort(keys * n + words)
+        table._arrays = (index_keys, index_keys % n, _bit_columns(table.ranks, table.vocabulary_size))
+    index_keys, index_words, bits = table._arrays
+    sizes = np.array(table.sizes, dtype=np.int64)
+    need = _need_table(int(sizes.max()), bound)
+    allowed = np.ones(n, dtype=bool)
+    if active is not None:
+        allowed[:] = False
+        allowed[list(active)] = True
+
+    probe_keys, probe_words = _grouped_signatures(table, queries, bound * bound)
+    low = np.searchsorted(index_keys, probe_keys * n)
+    counts = np.searchsorted(index_keys, probe_keys * n + n) - low
+    found = []
+    for xs, ys, overlap in _candidate_blocks(low, counts, probe_words, index_words, bits):
+        keep = (xs != ys) & allowed[ys] & (overlap >= need[sizes[xs], sizes[ys]])
+        found.append(np.unique(xs[keep] * n + ys[keep]))
+    keys = np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+    for i, j in zip((keys // n).tolist(), (keys % n).tolist()):
+        score = table.score(i, j)
+        if score >= threshold:
+            result[i][j] = score
+    return result
+
+
+def _spelling_candidates_numpy(table: _GramTable, threshold: float, limit: int):
+    """
+    単語ごとに、類似度の高い limit 語に入りうるつづりの似た単語 (位置, 位置, 類似度)
+
+    並べ替えは丸める前の類似度で行い、丸めると limit 番目と同点になりうるものまで残す
+    （丸めと同点の順は spelling_neighbors が Python で決める）。
+    """
+    np = _load_numpy()
+    xs, ys, overlaps = _spelling_pairs_numpy(table, threshold)
+    sizes = np.array(table.sizes, dtype=np.float64)
+    ratios = np.tile(overlaps / np.sqrt(sizes[xs] * sizes[ys]), 2)
+    words = np.concatenate([xs, ys])
+    others = np.concatenate([ys, xs])
+    del xs, ys
+    order = np.lexsort((-ratios, words))
+    words, others, ratios = words[order], others[order], ratios[order]
+    overlaps = np.tile(overlaps, 2)[order]
+    del order
+
+    # 単語ごとに limit 番目の類似度
+    counts = np.bincount(words, minlength=len(table))
+    nth = np.cumsum(counts) - counts + limit - 1
+    cutoff = np.full(len(table), -np.inf)
+    cutoff[counts >= limit] = ratios[nth[counts >= limit]]
+    keep = ratios >= cutoff[words] - 10 ** -SCORE_DIGITS
+    for i, j, overlap in zip(words[keep].tolist(), others[keep].tolist(), overlaps[keep].tolist()):
+        # 丸めは Python で行う（純 Python 版と同じ値にする）
+        score = _score(overlap, table.sizes[i], table.sizes[j])
+        if score >= threshold:
+            yield i, j, score
+
+
+def spelling_neighbors(
+    table: _GramTable, threshold: float = SPELLING_THRESHOLD, limit: int = MAX_PARTNERS
+) -> dict[int, dict[int, float]]:
+    """
+    単語ごとに、bigram のコサイン類似度が threshold 以上の単語を、高い順（同点は位置の順）に limit 語まで
+
+    意味が同じ単語はスコアが MEANING_SCORE 高いので、紛らわしい単語として残るつづりの似た単語は
+    この limit 語に必ず入っている（それより下の単語は辺にならない）。
+
+    Returns:
+        {位置: {位置: 類似度}}
+    """
+    if len(table) < 2:
+        return {}
+    if NUMPY_AVAILABLE:
+        candidates = _spelling_candidates_numpy(table, threshold, limit)
+    else:
+        candidates = chain.from_iterable(
+            ((i, j, score), (j, i, score)) for i, j, score in _spelling_pairs_python(table, threshold)
+        )
+    found = defaultdict(list)
+    for i, j, score in candidates:
+        found[i].append((-score, j))
+    neighbors = {}
+    for i, partners in found.items():
+        partners.sort()
+        neighbors[i] = {j: -score for score, j in partners[:limit]}
+    return neighbors
+
+
+def _meaning_groups(words: list) -> dict[int, list[list[int]]]:
+    """位置 -> その単語が入っている「意味が同じ単語」の組（2〜MEANING_GROUP_MAX 語）のリスト"""
+    by_meaning = defaultdict(list)
+    for i, word in enumerate(words):
+        for meaning in meanings(word[2]):
+            by_meaning[meaning].append(i)
+    groups = defaultdict(list)
+    for members in by_meaning.values():
+        if 2 <= len(members) <= MEANING_GROUP_MAX:
+            for i in members:
+                groups[i].append(members)
+    return groups
+
+
+def _ranked_partners(i, similar: dict, groups: list, table: _GramTable, word_ids: list) -> list:
+    """
+    i の紛らわしい単語の候補を、スコアの高い順（同点は word_id の小さい順）に並べる
+
+    Args:
+        similar: i とつづりが似ている単語 {位置: 類似度}（上位 MAX_PARTNERS 語だけでもよい）
+        groups: i が入っている意味が同じ単語の組
+
+    Returns:
+        (スコア, 位置, reason) のリスト
+    """
+    found = {j: [score, REASON_SPELLING] for j, score in similar.items()}
+    for members in groups:
+        for j in members:
+            if j != i and j not in found:
+                score = table.score(i, j)
+                found[j] = [score, REASON_SPELLING if score >= SPELLING_THRESHOLD else 0]
+            if j != i:
+                found[j][1] |= REASON_MEANING
+    ranked = [
+        (score + MEANING_SCORE if reason & REASON_MEANING else score, j, reason)
+        for j, (score, reason) in found.items()
+    ]
+    ranked.sort(key=lambda partner: (-partner[0], word_ids[partner[1]]))
+    return ranked
+
+
+def _keep(edges: dict, i: int, partners: list) -> None:
+    """partners の上位 MAX_PARTNERS 件を両向きの辺にする"""
+    for score, j, reason in partners[:MAX_PARTNERS]:
+        edge = (round(score, SCORE_DIGITS), reason)
+        edges[(i, j)] = edge
+        edges[(j, i)] = edge
+
+
+def _edge_rows(edges: dict, word_ids: list) -> list[tuple[int, int, float, int]]:
+    return sorted(
+        (word_ids[i], word_ids[j], score, reason) for (i, j), (score, reason) in edges.items()
+    )
+
+
+def build_edges(words, log=None) -> list[tuple[int, int, float, int]]:
+    """
+    紛らわしい単語のグラフを作る
+
+    つづりが似ている組と意味が同じ組を合わせ、スコア（類似度 + 意味が同じなら MEANING_SCORE）の
+    高い順に単語ごと MAX_PARTNERS 件まで残す。どちらかの単語で残った組は両向きに入れる。
+
+    Args:
+        words: (word_id, english, japanese) のイテラブル
+        log: 詳細ログを出す関数。None なら出さない
+
+    Returns:
+        word_confusables の行 (word_id, other_word_id, score, reason) のリスト
+    """
+    # 位置の順を word_id の順にする（同点の並びを update_edges と揃える）
+    words = sorted(words, key=lambda word: word[0])
+    if not NUMPY_AVAILABLE and len(words) > PURE_PYTHON_MAX_WORDS:
+        if log:
+            log(f"NumPy がないため、紛らわしい単語のグラフは作りません（{len(words)} 語）")
+        return []
+
+    word_ids = [word[0] for word in words]
+    table = _GramTable(bigrams(word[1]) for word in words)
+    similar = spelling_neighbors(table)
+    groups = _meaning_groups(words)
+
+    edges = {}
+    for i in similar.keys() | groups.keys():
+        _keep(edges, i, _ranked_partners(i, similar.get(i, {}), groups.get(i, ()), table, word_ids))
+
+    if log:
+        log(f"紛らわしい単語: {len(edges) // 2} 組（{len(similar.keys() | groups.keys())} 語）")
+    return _edge_rows(edges, word_ids)
+
+
+def update_edges(words, previous: dict, log=None) -> tuple[set[int] | None, list[tuple]]:
+    """
+    変わった単語のまわりだけ、紛らわしい単語のグラフを作り直す
+
+    組のスコアはその2語だけで決まるので、候補が増減・変化するのは、変わった単語と
+    つづりが似ている単語・同じ意味の単語（dirty）だけ。dirty の単語に付く辺を作り直し、
+    それ以外の単語どうしの辺はそのまま使える（build_edges で全体を作ったのと同じ結果になる）。
+
+    Args:
+        words: いまの廃止されていない単語 (word_id, english, japanese)
+        previous: グラフを作ったときの廃止されていない単語 {word_id: (english, japanese)}
+        log: 詳細ログを出す関数。None なら出さない
+
+    Returns:
+        (辺を作り直した word_id の集合, それらの単語に付く辺（build_edges と同じ形式）)。
+        変わった単語が多い場合は全体を作り直して (None, すべての辺) を返す
+    """
+    words = list(words)
+    current = {word[0]: (word[1], word[2]) for word in words}
+    changed = {word_id for word_id, word in current.items() if previous.get(word_id) != word}
+    changed |= previous.keys() - current.keys()
+    if not changed:
+        return set(), []
+    respelled = any(
+        word_id in previous and word_id in current and previous[word_id][0] != current[word_id][0]
+        for word_id in changed
+    )
+    if respelled or len(changed) > len(words) * INCREMENTAL_MAX_FRACTION:
+        return None, build_edges(words, log)
+
+    # 廃止された単語も、似ていた単語を探すために後ろに並べる（相手にはしない）
+    retired = sorted(previous.keys() - current.keys())
+    entries = words + [(word_id, *previous[word_id]) for word_id in retired]
+    word_ids = [entry[0] for entry in entries]
+    position = {word_id: i for i, word_id in enumerate(word_ids)}
+    active = set(range(len(words)))
+    table = _GramTable(bigrams(entry[1]) for entry in entries)
+    groups = _meaning_groups(words)
+    by_meaning = defaultdict(set)
+    for i, word in enumerate(words):
+        for meaning in meanings(word[2]):
+            by_meaning[meaning].add(i)
+
+    similar = {}
+
+    def find_similar(positions):
+        """まだ求めていない単語の、つづりが似ている単語を求める（NumPy があればまとめて）"""
+        missing = [i for i in positions if i not in similar]
+        if NUMPY_AVAILABLE:
+            similar.update(_similar_numpy(table, missing, SPELLING_THRESHOLD, active))
+        else:
+            for i in missing:
+                similar[i] = table.similar(i, SPELLING_THRESHOLD, active)
+
+    find_similar(position[word_id] for word_id in changed)
+    dirty = set()
+    for word_id in changed:
+        i = position[word_id]
+        dirty.add(i)
+        dirty.update(similar[i])
+        for word in (current.get(word_id), previous.get(word_id)):
+            if word is not None:
+                for meaning in meanings(word[1]):
+                    dirty.update(by_meaning.get(meaning, ()))
+
+    find_similar(dirty & active)
+    ranked = {
+        i: _ranked_partners(i, similar[i], groups.get(i, ()), table, word_ids) for i in dirty & active
+    }
+    # dirty でない相手の側で残る辺も作り直す
+    others = {j for partners in ranked.values() for _, j, _ in partners if j not in dirty}
+    find_similar(others)
+
+    edges = {}
+    for i, partners in ranked.items():
+        _keep(edges, i, partners)
+    for j in others:
+        partners = _ranked_partners(j, similar[j], groups.get(j, ()), table, word_ids)
+        _keep(edges, j, [p for p in partners[:MAX_PARTNERS] if p[1] in dirty])
+
+    if log:
+        log(f"紛らわしい単語: {len(changed)} 語の変更で {len(dirty)} 語の辺を作り直しました")
+    return {word_ids[i] for i in dirty}, _edge_rows(edges, word_ids)
@@ -0,0 +1,265 @@
+"""
+読み込み専用のコンテンツパック
+words / grammar_topics / grammar_questions / word_confusables をあらかじめ
+1つの SQLite ファイル（content.db）にまとめておき（scripts/build_content_pack.py）、
+起動時に読み込み専用で ATTACH する。
+
+ATTACH した接続では、同名の TEMP VIEW が本体（app.db）のテーブルより優先されるので、
+サービス側の SQL は変えずにパックの内容を読める。教材は app.db にコピーされない。
+
+word_id / question_id はビルドをまたいで変わらない（前回のパックを引き継いで差分同期する）ので、
+学習進捗・回答ログはパックを更新してもそのまま使える。
+"""
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from app.services import migrations
+
+
+# パックの場所を指定する環境変数
+PACK_PATH_ENV = "JHS_ENGLISH_TRAINER_CONTENT"
+PACK_FILENAME = "content.db"
+
+# パックのスキーマバージョン（テーブル構成を変えたら上げる）
+# 2: grammar_questions.answer_keys を追加
+# 3: word_confusables を追加
+PACK_SCHEMA_VERSION = 3
+
+# ATTACH するときのスキーマ名（本体の集計トリガーはこの名前で ATTACH の有無を見る。migrations._migrate_v12）
+SCHEMA_NAME = "content"
+
+# パックに入っているテーブル（この名前の TEMP VIEW で本体のテーブルを隠す）
+CONTENT_TABLES = ("words", "grammar_topics", "grammar_questions", "word_confusables")
+
+# パックのメモリマップサイズ
+PACK_MMAP_SIZE_BYTES = 64 * 1024 * 1024
+
+
+# このプロセスで教材を書き換えた・パックを切り替えた回数（notify_changed）。
+# 教材から作ったメモリ上の索引は、これが変わっていれば DB を読まずに作り直せる
+_generation = 0
+
+
+class ContentPackError(Exception):
+    """コンテンツパックが読めない・バージョンが合わない"""
+
+
+def notify_changed() -> None:
+    """教材が変わったことを知らせる（importer の書き込み・パックの切り替えで呼ぶ）"""
+    global _generation
+    _generation += 1
+
+
+def generation() -> int:
+    """このプロセス内の教材の世代（notify_changed のたびに増える。DB は読まない）"""
+    return _generation
+
+
+def default_pack_path() -> Path:
+    """既定のパックの場所（exe の場合は exe と同じフォルダ、ソースの場合は data/）"""
+    if getattr(sys, "frozen", False):
+        return Path(sys.executable).parent / PACK_FILENAME
+    return Path(__file__).resolve().parents[2] / "data" / PACK_FILENAME
+
+
+def find_pack() -> str | None:
+    """
+    使うパックのパス（環境変数 JHS_ENGLISH_TRAINER_CONTENT > 既定の場所）
+
+    Returns:
+        パックのパス。見つからなければ None
+    """
+    path = Path(os.getenv(PACK_PATH_ENV) or default_pack_path())
+    return str(path) if path.exists() else None
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    """
+    パックのテーブルとインデックスを作る（ビルド用。列は app.db のテーブルと同じ）
+
+    古いスキーマのパックには、足りない列を追加する（ID を引き継いだまま作り直せる）。
+    """
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS pack_info (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS words (
+            word_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            english TEXT NOT NULL,
+            japanese TEXT NOT NULL,
+            grade INTEGER,
+            unit TEXT,
+            level INTEGER,
+            created_at TEXT,
+            content_hash TEXT,
+            retired INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_words_english ON words(english);
+        CREATE INDEX IF NOT EXISTS idx_words_grade_unit_level ON words(grade, unit, level);
+        CREATE INDEX IF NOT EXISTS idx_words_unit_grade_level ON words(unit, grade, level);
+        CREATE INDEX IF NOT EXISTS idx_words_level ON words(level);
+
+        CREATE TABLE IF NOT EXISTS grammar_topics (
+            grammar_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            level INTEGER,
+            related_units TEXT,
+            created_at TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_grammar_topics_title ON grammar_topics(title);
+
+        CREATE TABLE IF NOT EXISTS grammar_questions (
+            question_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            grammar_id INTEGER NOT NULL,
+            question_type TEXT NOT NULL,
+            prompt_text TEXT NOT NULL,
+            choice1 TEXT,
+            choice2 TEXT,
+            choice3 TEXT,
+            choice4 TEXT,
+            correct_answer TEXT NOT NULL,
+            explanation TEXT,
+            content_hash TEXT,
+            retired INTEGER NOT NULL DEFAULT 0,
+            answer_keys TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_grammar_questions_topic_prompt
+            ON grammar_questions(grammar_id, prompt_text);
+
+        CREATE TABLE IF NOT EXISTS word_confusables (
+            word_id INTEGER NOT NULL,
+            other_word_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            reason INTEGER NOT NULL,
+            PRIMARY KEY (word_id, other_word_id)
+        ) WITHOUT ROWID;
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(grammar_questions)")}
+    if "answer_keys" not in columns:
+        conn.execute("ALTER TABLE grammar_questions ADD COLUMN answer_keys TEXT")
+
+
+def read_info(conn: sqlite3.Connection, schema: str = "main") -> dict:
+    """パックの pack_info（schema_version, version, built_at など）"""
+    try:
+        rows = conn.execute(f"SELECT key, value FROM {schema}.pack_info").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {row[0]: row[1] for row in rows}
+
+
+def attach(conn: sqlite3.Connection, path: str) -> str:
+    """
+    パックを読み込み専用で ATTACH し、本体のテーブルを TEMP VIEW で隠す
+
+    Args:
+        conn: DB 接続
+        path: パックのファイル
+
+    Returns:
+        パックのバージョン
+
+    Raises:
+        ContentPackError: パックが読めない・スキーマバージョンが合わない
+    """
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    try:
+        conn.execute(f"ATTACH DATABASE ? AS {SCHEMA_NAME}", (uri,))
+    except sqlite3.Error as e:
+        raise ContentPackError(f"コンテンツパックを開けません: {path}: {e}")
+
+    try:
+        info = read_info(conn, SCHEMA_NAME)
+    except sqlite3.DatabaseError as e:
+        # SQLite のファイルではない・壊れている
+        conn.execute(f"DETACH DATABASE {SCHEMA_NAME}")
+        raise ContentPackError(f"コンテンツパックが壊れています: {path}: {e}")
+    if info.get("schema_version") != str(PACK_SCHEMA_VERSION):
+        conn.execute(f"DETACH DATABASE {SCHEMA_NAME}")
+        raise ContentPackError(
+            f"コンテンツパックのバージョンが合いません: {path} "
+            f"（{info.get('schema_version')} / 必要: {PACK_SCHEMA_VERSION}）"
+        )
+
+    conn.execute(f"PRAGMA {SCHEMA_NAME}.mmap_size = {PACK_MMAP_SIZE_BYTES}")
+    for table in CONTENT_TABLES:
+        conn.execute(
+            f"CREATE TEMP VIEW IF NOT EXISTS {table} AS SELECT * FROM {SCHEMA_NAME}.{table}"
+        )
+    ensure_triggers(conn)
+    return info["version"]
+
+
+def is_attached(conn: sqlite3.Connection) -> bool:
+    """この接続にパックが ATTACH されているか"""
+    return any(row[1] == SCHEMA_NAME for row in conn.execute("PRAGMA database_list"))
+
+
+def ensure_triggers(conn: sqlite3.Connection) -> None:
+    """
+    進捗集計用の TEMP トリガーを作る（まだなければ）
+
+    本体の word_progress がまだない（マイグレーション前）場合は何もしない。
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'word_progress'"
+    ).fetchone()
+    if not exists:
+        return
+    created = conn.execute(
+        "SELECT 1 FROM sqlite_temp_master WHERE type = 'trigger' "
+        "AND name = 'trg_pack_word_progress_insert_summary'"
+    ).fetchone()
+    if not created:
+        migrations.create_pack_summary_triggers(conn.cursor())
+
+
+def content_version(conn: sqlite3.Connection) -> tuple:
+    """
+    教材のバージョン（使っているパックのバージョンと、app.db に同期した教材ファイルのハッシュ）
+
+    パックの切り替え・教材のインポートで変わる。教材から作ったメモリ上の索引を
+    作り直すかどうかの判定に使う（どちらも1行程度の小さなテーブルなので軽い）。
+    """
+    return tuple(conn.execute("""
+        SELECT
+            (SELECT pack_version FROM content_pack_state WHERE id = 1),
+            (SELECT group_concat(source || ':' || file_hash) FROM content_sync_state)
+    """).fetchone())
+
+
+def sync_state(conn: sqlite3.Connection) -> bool:
+    """
+    app.db に記録したパックのバージョンを、いま使っているパックに合わせる（init_db から呼ぶ）
+
+    パックを使い始めた・やめた・別のバージョンになった場合は、
+    ステージ集計（word_stage_summary / word_catalog_summary）を作り直す。
+
+    Returns:
+        作り直した場合 True
+    """
+    version = read_info(conn, SCHEMA_NAME).get("version") if is_attached(conn) else None
+    row = conn.execute("SELECT pack_version FROM content_pack_state WHERE id = 1").fetchone()
+    if (row[0] if row else None) == version:
+        return False
+
+    if version is not None:
+        ensure_triggers(conn)
+    with conn:
+        cursor = conn.cursor()
+        # 集計トリガーは接続ごとに（パックを ATTACH していれば TEMP トリガーが）数えるので、
+        # ここでは集計をどのパックで作ったかを記録して数え直すだけ
+        if version is None:
+            cursor.execute("DELETE FROM content_pack_state")
+        else:
+            cursor.execute("""
+                INSERT INTO content_pack_state (id, pack_version) VALUES (1, ?)
+                ON CONFLICT(id) DO UPDATE SET pack_version = excluded.pack_version
+            """, (version,))
+        migrations.rebuild_word_summary(cursor)
+    notify_changed()
+    return True
@@ -1,121 +1,279 @@
 """
 SQLite データベース接続と初期化
 学習データは AppData/Roaming/JHSEnglishTrainer/data/app.db に保存
+
+接続はスレッドごとに1本を使い回す（get_connection）。
+毎回 connect しないので、ステートメントキャッシュ・ページキャッシュ・スキーマ解析が
+呼び出しをまたいで再利用される。サービス側では close() しないこと。
+
+configure() などで DB を切り替えると世代（_generation）が進み、各スレッドは次の
+get_connection() で古い世代の接続を閉じて開き直す（別スレッドの接続は他のスレッドからは閉じられないため）。
 """
 import sqlite3
 import os
+import threading
+import itertools
+import atexit
 from pathlib import Path
+from app.services import migrations
+from app.services import content_pack
+
+
+# DB ファイルの場所を指定する環境変数（APPDATA より優先）
+DB_PATH_ENV = "JHS_ENGLISH_TRAINER_DB"
+
+# 接続ごとに設定する PRAGMA
+CACHE_SIZE_KIB = 16 * 1024          # ページキャッシュ 16MB
+MMAP_SIZE_BYTES = 64 * 1024 * 1024  # メモリマップ 64MB
+STATEMENT_CACHE_SIZE = 256          # sqlite3 モジュールのプリペアドステートメントキャッシュ
+
+_config = {
+    "db_path": None,     # configure() で指定されたパス
+    "in_memory": False,  # True ならメモリ上の DB（テスト・ベンチマーク用）
+    "content_pack": None,  # None: 自動で探す / False: 使わない / パス
+}
+_memory_uri = None
+_memory_counter = itertools.count(1)
+_memory_keeper = None  # インメモリ DB を生かしておくための接続
+
+# 新しい接続に設定する row_factory（計測時は取得行数を数えるものに差し替える）
+_row_factory = sqlite3.Row
+
+_local = threading.local()
+_connections: list[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+# 接続の世代（DB を切り替えるたびに増える。古い世代の接続は開き直す）
+_generation = 0
+
+
+def configure(
+    db_path: str | None = None,
+    in_memory: bool = False,
+    content_pack_path: str | bool | None = None,
+) -> None:
+    """
+    DB の場所を設定する（開いている接続はすべて閉じる）
+    
+    Args:
+        db_path: DB ファイルのパス。None なら環境変数 / APPDATA / ホームから決める
+        in_memory: True ならメモリ上の DB を使う（プロセス内の全スレッドで共有。
+            memdb VFS なので、書き込み中の競合は busy_timeout で待つ）
+        content_pack_path: コンテンツパックのパス。None なら自動で探す、False なら使わない
+            （教材を app.db にインポートするスクリプトなど）
+    """
+    global _memory_uri, _memory_keeper
+    close_all()
+    if _memory_keeper is not None:
+        _memory_keeper.close()
+        _memory_keeper = None
+    
+    _config["db_path"] = db_path
+    _config["in_memory"] = in_memory
+    _config["content_pack"] = content_pack_path
+    _memory_uri = None
+    content_pack.notify_changed()
+    
+    if in_memory:
+        # configure ごとに新しい空の DB にする。名前を / で始めると同じプロセスの接続で共有される。
+        # 共有キャッシュ（cache=shared）はテーブル単位のロックで SQLITE_LOCKED になり、
+        # busy_timeout で待たないので使わない
+        _memory_uri = f"file:/jhs_english_trainer_{next(_memory_counter)}?vfs=memdb"
+        _memory_keeper = sqlite3.connect(_memory_uri, uri=True, check_same_thread=False)
+
+
+def set_content_pack(content_pack_path: str | bool | None) -> None:
+    """
+    コンテンツパックの使い方だけを変える（DB の場所はそのまま。開いている接続はすべて閉じる）
+    
+    Args:
+        content_pack_path: configure() と同じ。None なら自動で探す、False なら使わない
+    """
+    close_all()
+    _config["content_pack"] = content_pack_path
+    content_pack.notify_changed()
+
+
+def is_in_memory() -> bool:
+    """メモリ上の DB を使っているか（configure(in_memory=True)）"""
+    return _config["in_memory"]
 
 
 def get_db_path() -> str:
-    """データベースファイルのパスを取得"""
-    appdata = os.getenv("APPDATA")
-    if not appdata:
-        raise RuntimeError("APPDATA環境変数が見つかりません")
+    """
+    データベースファイルのパスを取得
+    
+    優先順位: configure() の指定 > 環境変数 JHS_ENGLISH_TRAINER_DB >
+    %APPDATA%/JHSEnglishTrainer/data/app.db > ~/.local/share/JHSEnglishTrainer/data/app.db
+    """
+    if _config["in_memory"]:
+        return _memory_uri
     
-    db_dir = Path(appdata) / "JHSEnglishTrainer" / "data"
-    db_dir.mkdir(parents=True, exist_ok=True)
+    if _config["db_path"]:
+        db_path = Path(_config["db_path"])
+    elif os.getenv(DB_PATH_ENV):
+        db_path = Path(os.getenv(DB_PATH_ENV))
+    else:
+        appdata = os.getenv("APPDATA")
+        if appdata:
+            base_dir = Path(appdata)
+        else:
+            # Windows 以外（開発用 PC など）
+            base_dir = Path(os.getenv("XDG_DATA_HOME") or Path.home() / ".local" / "share")
+        db_path = base_dir / "JHSEnglishTrainer" / "data" / "app.db"
     
-    return str(db_dir / "app.db")
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    return str(db_path)
 
 
-def get_connection():
-    """データベース接続を取得"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+def get_content_pack_path() -> str | None:
+    """使うコンテンツパックのパス（使わない・見つからない場合は None）"""
+    if _config["content_pack"] is False:
+        return None
+    if _config["content_pack"]:
+        return str(_config["content_pack"])
+    return content_pack.find_pack()
 
 
-def init_db():
-    """データベーステーブルを初期化"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # users テーブル
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            created_at TEXT
-        )
-    """)
-    
-    # grammar_topics テーブル
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS grammar_topics (
-            grammar_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            level INTEGER,
-            related_units TEXT,
-            created_at TEXT
-        )
-    """)
-    
-    # scenarios テーブル（会話トレーニング用）
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS scenarios (
-            scenario_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            level INTEGER,
-            topic_tag TEXT,
-            description TEXT,
-            is_active INTEGER DEFAULT 1
-        )
-    """)
-    
-    # scenario_steps テーブル（会話トレーニング用）
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS scenario_steps (
-            step_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            scenario_id INTEGER NOT NULL,
-            order_no INTEGER NOT NULL,
-            bot_text TEXT NOT NULL,
-            expected_patterns TEXT,
-            required_keywords TEXT,
-            hint_jp TEXT,
-            model_answer TEXT,
-            allowed_vocab_set TEXT,
-            FOREIGN KEY (scenario_id) REFERENCES scenarios(scenario_id)
-        )
-    """)
-    
-    # conversation_progress テーブル（会話トレーニング用）
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS conversation_progress (
-            user_id INTEGER NOT NULL,
-            scenario_id INTEGER NOT NULL,
-            last_step_order INTEGER DEFAULT 0,
-            cleared_count INTEGER DEFAULT 0,
-            last_cleared_at TEXT,
-            PRIMARY KEY (user_id, scenario_id),
-            FOREIGN KEY (scenario_id) REFERENCES scenarios(scenario_id)
+def _open_connection(attach_pack: bool = True) -> sqlite3.Connection:
+    """
+    新しい接続を開いて PRAGMA を設定する
+    
+    Args:
+        attach_pack: False ならコンテンツパックを ATTACH しない（マイグレーション用）
+    """
+    # uri=True はコンテンツパックを読み込み専用（?mode=ro）で ATTACH するため
+    if _config["in_memory"]:
+        conn = sqlite3.connect(
+            _memory_uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE
         )
-    """)
-    
-    # conversation_log テーブル（会話トレーニング用）
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS conversation_log (
-            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            scenario_id INTEGER NOT NULL,
-            step_id INTEGER NOT NULL,
-            user_answer TEXT,
-            judge_result TEXT,
-            score INTEGER,
-            answered_at TEXT,
-            FOREIGN KEY (scenario_id) REFERENCES scenarios(scenario_id),
-            FOREIGN KEY (step_id) REFERENCES scenario_steps(step_id)
+    else:
+        conn = sqlite3.connect(
+            get_db_path(), uri=True, cached_statements=STATEMENT_CACHE_SIZE
         )
-    """)
+    conn.row_factory = _row_factory
     
-    # 単語やその他のテーブルは後で追加予定
+    if not _config["in_memory"]:
+        # WAL: 読み込みが書き込みを待たない。synchronous=NORMAL で fsync を減らす
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA busy_timeout = 5000")
     
-    conn.commit()
+    pack_path = get_content_pack_path() if attach_pack else None
+    if pack_path:
+        try:
+            content_pack.attach(conn, pack_path)
+        except content_pack.ContentPackError as e:
+            # 壊れた・バージョンの合わないパックで起動できなくならないよう、
+            # 以降の接続はパックを使わずに app.db の教材で動く（毎回開き直さない）
+            print(f"[DB] {e}（コンテンツパックを使わずに続けます）")
+            _config["content_pack"] = False
+            content_pack.notify_changed()
+    return conn
+
+
+def set_row_factory(factory) -> None:
+    """
+    すべての接続の row_factory を差し替える（開いている接続にも反映する）
+    
+    Args:
+        factory: sqlite3 の row_factory。None なら既定の sqlite3.Row に戻す
+    """
+    global _row_factory
+    _row_factory = factory or sqlite3.Row
+    with _connections_lock:
+        for conn in _connections:
+            conn.row_factory = _row_factory
+
+
+def get_connection():
+    """
+    データベース接続を取得（呼び出したスレッド専用の接続を使い回す）
+    
+    DB の切り替え（configure など）より前に開いた接続なら、閉じて開き直す。
+    
+    Note:
+        返した接続は close() しないこと。閉じる場合は close_connection() を使う。
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.generation != _generation:
+        close_connection()
+        conn = None
+    if conn is None:
+        generation = _generation
+        conn = _open_connection()
+        _local.conn = conn
+        _local.generation = generation
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def close_connection() -> None:
+    """呼び出したスレッドの接続を閉じる（スレッド終了時・スクリプト終了時など）"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _connections_lock:
+        if conn in _connections:
+            _connections.remove(conn)
     conn.close()
 
 
+def close_all() -> None:
+    """
+    すべてのスレッドの接続を閉じる（アプリ終了時・DB 切り替え時）
+    
+    別スレッドの接続はこのスレッドからは閉じられないので、世代を進めておき、
+    そのスレッドが次に get_connection() を呼んだとき（または close_connection() で）閉じる。
+    """
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        connections = list(_connections)
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            # 別スレッドで作られた接続（そのスレッドが閉じる）
+            continue
+        with _connections_lock:
+            if conn in _connections:
+                _connections.remove(conn)
+    if getattr(_local, "conn", None) is not None:
+        _local.conn = None
+
+
+atexit.register(close_all)
+
+
+def init_db():
+    """
+    データベーステーブルを初期化
+    
+    スキーマは PRAGMA user_version で管理し、古い場合だけマイグレーションする
+    （最新なら PRAGMA の読み込み1回で終わる）。
+    コンテンツパックを使う場合は、パックのバージョンが変わったときだけ集計を作り直す。
+    """
+    conn = get_connection()
+    if content_pack.is_attached(conn) and migrations.get_version(conn) < migrations.LATEST_VERSION:
+        # パックの TEMP VIEW があると本体のテーブルを変更できないので、素の接続で移行する
+        plain = _open_connection(attach_pack=False)
+        try:
+            migrations.migrate(plain)
+        finally:
+            plain.close()
+        content_pack.ensure_triggers(conn)
+    else:
+        migrations.migrate(conn)
+    
+    # コンテンツパックの切り替えに合わせてステージ集計を作り直す
+    content_pack.sync_state(conn)
+
+
 if __name__ == "__main__":
     # テスト用
     init_db()
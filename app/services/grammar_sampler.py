@@ -0,0 +1,226 @@
+"""
+文法問題の出題サンプラー（ユーザー・トピック単位のインメモリ重み付き抽選）
+
+トピックの問題ごとに重み（間違えた問題・しばらく解いていない問題ほど大きい）を
+Fenwick 木（Binary Indexed Tree）で保持し、重みに比例した確率で1問選ぶ。
+抽選・回答後の重みの更新はどちらも O(log n) で、全件スキャンやソートは行わない。
+
+直前に出した問題は重みを 0 にしておき、続けて同じ問題が出ないようにする。
+"""
+from collections import deque
+from datetime import date
+import random
+from app.services.word_scheduler import parse_answered_date
+
+
+# 重みの定数
+UNANSWERED_WEIGHT = 6.0   # 未回答の問題
+BASE_WEIGHT = 1.0         # 回答済みの問題の最低の重み
+MISSED_WEIGHT = 4.0       # 最後に間違えた問題（連続正解 0）
+WRONG_WEIGHT = 2.0        # 不正解1回あたり（連続正解が続くほど小さくなる）
+WRONG_COUNT_MAX = 5       # 不正解の回数はここで頭打ち（1問ばかり出ないように）
+STALE_WEIGHT = 0.5        # 最後に解いてから1日あたり
+STALE_DAYS_MAX = 30       # 日数はここで頭打ち
+
+# 直前に出した問題をいくつ避けるか（問題数が少ないトピックでは 問題数 - 1 まで）
+RECENT_EXCLUDE = 1
+
+
+def calc_weight(correct_count: int, wrong_count: int, correct_streak: int, days: int | None) -> float:
+    """
+    問題の出題の重みを計算する
+
+    weight = 1 + (最後に間違えた ? 4 : 0) + min(wrong_count, 5) * 2 / (1 + correct_streak)
+             + min(days, 30) * 0.5
+
+    Args:
+        days: 最後に解いてからの日数。未回答なら None
+    """
+    if days is None or correct_count + wrong_count == 0:
+        return UNANSWERED_WEIGHT
+    weight = BASE_WEIGHT + min(days, STALE_DAYS_MAX) * STALE_WEIGHT
+    if correct_streak == 0 and wrong_count > 0:
+        weight += MISSED_WEIGHT
+    weight += min(wrong_count, WRONG_COUNT_MAX) * WRONG_WEIGHT / (1 + correct_streak)
+    return weight
+
+
+class FenwickTree:
+    """重みの累積和を持つ Fenwick 木（1点の更新・累積和からの位置の検索が O(log n)）"""
+
+    def __init__(self, weights: list[float]):
+        n = len(weights)
+        self._tree = [0.0] * (n + 1)
+        # O(n) で構築（各ノードの値を親に足していく）
+        for i, w in enumerate(weights, start=1):
+            self._tree[i] += w
+            parent = i + (i & -i)
+            if parent <= n:
+                self._tree[parent] += self._tree[i]
+        self._top = 1 << max(0, n.bit_length() - 1) if n else 0
+
+    def __len__(self) -> int:
+        return len(self._tree) - 1
+
+    def add(self, i: int, delta: float) -> None:
+        """i 番目（0 始まり）の重みに delta を足す"""
+        i += 1
+        n = len(self._tree)
+        while i < n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def total(self) -> float:
+        """重みの合計"""
+        i = len(self._tree) - 1
+        result = 0.0
+        while i > 0:
+            result += self._tree[i]
+            i -= i & -i
+        return result
+
+    def find(self, value: float) -> int:
+        """累積和が value を超える最初の位置（0 始まり）"""
+        pos = 0
+        step = self._top
+        n = len(self._tree) - 1
+        while step:
+            nxt = pos + step
+            if nxt <= n and self._tree[nxt] <= value:
+                pos = nxt
+                value -= self._tree[nxt]
+            step >>= 1
+        return min(pos, n - 1)
+
+
+class QuestionSampler:
+    """
+    1ユーザー・1トピックぶんの出題サンプラー
+
+    問題ごとの重みは _weights に持ち、Fenwick 木には出題してよい問題の重みだけを入れる
+    （直前に出した問題は木の上では 0）。
+    """
+
+    def __init__(self, user_id: int, grammar_id: int, rows, rng: random.Random | None = None):
+        """
+        Args:
+            user_id: ユーザーID
+            grammar_id: 文法トピックID
+            rows: grammar_questions LEFT JOIN grammar_question_progress の結果行
+                  （question_id, correct_count, wrong_count, correct_streak, last_answered_at を含む）
+            rng: 乱数生成器（省略時は random モジュール）
+        """
+        self.user_id = user_id
+        self.grammar_id = grammar_id
+        self._rng = rng or random
+        self._today = date.today()
+        self._question_ids: list[int] = []
+        self._index: dict[int, int] = {}
+        self._progress: list[dict] = []
+
+        for row in rows:
+            question_id = row['question_id']
+            self._index[question_id] = len(self._question_ids)
+            self._question_ids.append(question_id)
+            self._progress.append({
+                'correct_count': row['correct_count'],
+                'wrong_count': row['wrong_count'],
+                'correct_streak': row['correct_streak'],
+                'last_date': parse_answered_date(row['last_answered_at']),
+            })
+
+        # 直前に出した問題の位置（木の上では重み 0）
+        self._recent: deque[int] = deque(
+            maxlen=max(0, min(RECENT_EXCLUDE, len(self._question_ids) - 1))
+        )
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._question_ids)
+
+    def __contains__(self, question_id: int) -> bool:
+        return question_id in self._index
+
+    def _weight(self, i: int) -> float:
+        progress = self._progress[i]
+        last_date = progress['last_date']
+        days = None if last_date is None else max(0, (self._today - last_date).days)
+        return calc_weight(
+            progress['correct_count'], progress['wrong_count'], progress['correct_streak'], days
+        )
+
+    def _rebuild(self) -> None:
+        """全問題の重みを計算し直して木を作り直す（O(n)）"""
+        self._weights = [self._weight(i) for i in range(len(self._question_ids))]
+        recent = set(self._recent)
+        self._tree = FenwickTree(
+            [0.0 if i in recent else w for i, w in enumerate(self._weights)]
+        )
+
+    def _check_day(self) -> None:
+        """日付が変わっていれば全問題の重みを計算し直す"""
+        today = date.today()
+        if today != self._today:
+            self._today = today
+            self._rebuild()
+
+    def weight(self, question_id: int) -> float:
+        """問題の現在の重み（直前に出したかどうかに関係なく）"""
+        return self._weights[self._index[question_id]]
+
+    def pick(self) -> int | None:
+        """
+        重みに比例した確率で1問選ぶ（O(log n)）
+
+        Returns:
+            question_id。問題がなければ None
+        """
+        if not self._question_ids:
+            return None
+        self._check_day()
+
+        total = self._tree.total()
+        if total <= 0:
+            # 重みがすべて 0 になることはないが、念のため一様に選ぶ
+            i = self._rng.randrange(len(self._question_ids))
+        else:
+            i = self._tree.find(self._rng.random() * total)
+            if i in self._recent:
+                # 浮動小数点の誤差で境界に当たったときは、直前の問題以外から一様に選ぶ
+                i = self._rng.choice(
+                    [j for j in range(len(self._question_ids)) if j not in self._recent]
+                )
+
+        if self._recent.maxlen:
+            if len(self._recent) == self._recent.maxlen:
+                # いちばん古い「直前の問題」を抽選対象に戻す
+                released = self._recent.popleft()
+                self._tree.add(released, self._weights[released])
+            self._recent.append(i)
+            self._tree.add(i, -self._weights[i])
+        return self._question_ids[i]
+
+    def update(self, question_id: int, progress: dict) -> None:
+        """
+        回答後の進捗でその問題の重みだけ更新する（O(log n)）
+
+        Args:
+            progress: correct_count, wrong_count, correct_streak, last_answered_at を含む辞書
+        """
+        i = self._index.get(question_id)
+        if i is None:
+            return
+        self._check_day()
+
+        self._progress[i] = {
+            'correct_count': progress['correct_count'],
+            'wrong_count': progress['wrong_count'],
+            'correct_streak': progress['correct_streak'],
+            'last_date': parse_answered_date(progress['last_answered_at']),
+        }
+        old = self._weights[i]
+        new = self._weight(i)
+        self._weights[i] = new
+        if i not in self._recent:
+            self._tree.add(i, new - old)
+
@@ -1,9 +1,42 @@
 """
 文法出題・採点・マスター度管理サービス
 """
-import random
+import threading
 from datetime import datetime
 from app.services import db
+from app.services import answer_buffer
+from app.services import answer_log
+from app.services import answer_normalizer
+from app.services import content_pack
+from app.services.grammar_sampler import QuestionSampler
+
+
+# マスター度の増減
+MASTERY_GAIN = 5
+MASTERY_LOSS = 7
+MASTERY_MAX = 100
+
+# 出題で返す問題の列
+QUESTION_COLUMNS = (
+    'question_id', 'question_type', 'prompt_text',
+    'choice1', 'choice2', 'choice3', 'choice4', 'correct_answer', 'explanation',
+)
+
+# ユーザー・トピックごとの出題サンプラー
+# キー: (user_id, grammar_id)
+_samplers: dict[tuple[int, int], QuestionSampler] = {}
+_sampler_lock = threading.RLock()
+
+# 問題と解答キーの索引（トピック単位で1回だけ読み込む。採点では DB を読まない）
+# grammar_id -> {question_id: 問題（QUESTION_COLUMNS + grammar_id, answer_keys）}
+_topic_questions: dict[int, dict[int, dict]] = {}
+# question_id -> 問題（_topic_questions と同じ辞書）
+_questions: dict[int, dict] = {}
+# 索引を読み込んだときの教材のバージョン（content_pack.content_version）と
+# このプロセス内の教材の世代（content_pack.generation）
+_content_version = None
+_content_generation = None
+_index_lock = threading.RLock()
 
 
 def list_topics():
@@ -23,7 +56,6 @@ def list_topics():
     """)
     
     topics = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     return topics
 
@@ -48,89 +80,202 @@ def get_topic_detail(grammar_id: int) -> dict:
     """, (grammar_id,))
     
     topic = cursor.fetchone()
-    conn.close()
     
     if topic:
         return dict(topic)
     return None
 
 
-def get_next_question(user_id: int, grammar_id: int) -> dict:
+def _check_content_version(conn=None) -> None:
     """
-    次の問題を取得
+    教材が変わっていれば、問題の索引とサンプラーを捨てる
     
-    Args:
-        user_id: ユーザーID
-        grammar_id: 文法トピックID
+    このプロセス内の変更（importer の書き込み・パックの切り替え）は content_pack.generation で
+    DB を読まずに分かる。conn を渡した場合は、DB の教材のバージョンも比べる
+    （別のプロセスでインポートした場合。出題のときだけ行い、採点では DB を読まない）。
+    """
+    global _content_version, _content_generation
+    generation = content_pack.generation()
+    version = content_pack.content_version(conn) if conn is not None else _content_version
+    with _index_lock:
+        if generation == _content_generation and version == _content_version:
+            return
+        _content_generation = generation
+        _content_version = version
+        _topic_questions.clear()
+        _questions.clear()
+    invalidate_samplers()
+
+
+def invalidate_question_index() -> None:
+    """問題の索引を捨てる（次に使うときに読み込み直す）"""
+    global _content_version, _content_generation
+    with _index_lock:
+        _content_version = None
+        _content_generation = None
+        _topic_questions.clear()
+        _questions.clear()
+
+
+def _get_topic_questions(grammar_id: int) -> dict[int, dict]:
+    """トピックの出題できる問題の索引（初回のみ DB から読み込む）"""
+    with _index_lock:
+        questions = _topic_questions.get(grammar_id)
+        if questions is not None:
+            return questions
+        
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {", ".join(QUESTION_COLUMNS)}, answer_keys
+            FROM grammar_questions
+            WHERE grammar_id = ? AND retired = 0
+        """, (grammar_id,))
+        
+        questions = {}
+        for row in cursor.fetchall():
+            question = _to_question(row, grammar_id)
+            questions[question['question_id']] = question
+        _topic_questions[grammar_id] = questions
+        _questions.update(questions)
+        return questions
+
+
+def _to_question(row, grammar_id: int) -> dict:
+    """grammar_questions の行（QUESTION_COLUMNS + answer_keys）を索引の問題にする"""
+    question = {column: row[column] for column in QUESTION_COLUMNS}
+    question['grammar_id'] = grammar_id
+    # インポート時に作った正解・別解の正規形（answer_normalizer）
+    question['answer_keys'] = answer_normalizer.decode_answer_keys(
+        row['answer_keys'], row['correct_answer']
+    )
+    return question
+
+
+def _get_question(question_id: int) -> dict | None:
+    """
+    問題の索引から1問取得（索引にないトピックの問題なら、そのトピックを読み込む）
+    
+    索引が最新かどうかは、このプロセス内の教材の世代だけで判定する（DB は読まない）。
+    出したあとに教材の更新で外された（retired）問題は索引に入らないので、
+    DB に残っている行から作って返す（解いている途中の問題も採点できるように）。
     
     Returns:
-        問題情報の辞書
+        問題。DB にもなければ None
     """
-    conn = db.get_connection()
-    cursor = conn.cursor()
+    _check_content_version()
+    question = _questions.get(question_id)
+    if question is not None:
+        return question
     
-    # 該当トピックの問題を取得
-    cursor.execute("""
-        SELECT question_id, question_type, prompt_text,
-               choice1, choice2, choice3, choice4, correct_answer, explanation
+    row = db.get_connection().execute(f"""
+        SELECT grammar_id, retired, {", ".join(QUESTION_COLUMNS)}, answer_keys
         FROM grammar_questions
-        WHERE grammar_id = ?
-        ORDER BY RANDOM()
-        LIMIT 1
-    """, (grammar_id,))
-    
-    question = cursor.fetchone()
-    conn.close()
-    
-    if not question:
+        WHERE question_id = ?
+    """, (question_id,)).fetchone()
+    if not row:
         return None
+    if not row['retired']:
+        question = _get_topic_questions(row['grammar_id']).get(question_id)
+        if question is not None:
+            return question
+    return _to_question(row, row['grammar_id'])
+
+
+def _load_question_stats(user_id: int, grammar_id: int) -> list:
+    """トピックの出題できる問題と、そのユーザーの問題ごとの進捗を取得"""
+    # 書き込み待ちの回答があれば先に反映しておく
+    answer_buffer.flush()
     
-    return dict(question)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT
+            q.question_id,
+            COALESCE(qp.correct_count, 0) AS correct_count,
+            COALESCE(qp.wrong_count, 0) AS wrong_count,
+            COALESCE(qp.correct_streak, 0) AS correct_streak,
+            qp.last_answered_at
+        FROM grammar_questions q
+        LEFT JOIN grammar_question_progress qp
+            ON qp.question_id = q.question_id AND qp.user_id = ?
+        WHERE q.grammar_id = ? AND q.retired = 0
+        ORDER BY q.question_id
+    """, (user_id, grammar_id))
+    return cursor.fetchall()
 
 
-def check_answer(user_id: int, question_id: int, answer: str) -> dict:
+def _get_sampler(user_id: int, grammar_id: int) -> QuestionSampler:
+    """ユーザー・トピック単位のサンプラーを取得（初回のみ DB から読み込む）"""
+    key = (user_id, grammar_id)
+    sampler = _samplers.get(key)
+    if sampler is None:
+        sampler = QuestionSampler(user_id, grammar_id, _load_question_stats(user_id, grammar_id))
+        _samplers[key] = sampler
+    return sampler
+
+
+def invalidate_samplers(user_id: int | None = None) -> None:
     """
-    回答をチェックし、マスター度を更新
+    キャッシュ済みの出題サンプラーを破棄する（問題データを入れ替えたときなど）
     
     Args:
-        user_id: ユーザーID
-        question_id: 問題ID
-        answer: ユーザーの回答
-    
-    Returns:
-        採点結果（is_correct, explanation, mastery_level）
+        user_id: 指定した場合はそのユーザーの分だけ破棄する
     """
-    conn = db.get_connection()
-    cursor = conn.cursor()
+    with _sampler_lock:
+        if user_id is None:
+            _samplers.clear()
+        else:
+            for key in [k for k in _samplers if k[0] == user_id]:
+                del _samplers[key]
+
+
+def get_next_question(user_id: int, grammar_id: int) -> dict:
+    """
+    次の問題を取得
     
-    # 問題情報を取得
-    cursor.execute("""
-        SELECT grammar_id, correct_answer, explanation
-        FROM grammar_questions
-        WHERE question_id = ?
-    """, (question_id,))
+    ユーザー・トピックごとのサンプラー（grammar_sampler.QuestionSampler）が
+    間違えた問題・しばらく解いていない問題ほど出やすく、直前と同じ問題は出ないように選ぶ。
     
-    question = cursor.fetchone()
-    if not question:
-        conn.close()
-        return None
+    Args:
+        user_id: ユーザーID
+        grammar_id: 文法トピックID
     
-    grammar_id = question['grammar_id']
-    correct_answer = question['correct_answer']
-    explanation = question['explanation']
+    Returns:
+        問題情報の辞書
+    """
+    _check_content_version(db.get_connection())
+    questions = _get_topic_questions(grammar_id)
     
-    # 正誤判定（大文字小文字・空白を無視）
-    is_correct = answer.strip().lower() == correct_answer.strip().lower()
+    # 2回目は読み込み直したサンプラーで選ぶ（問題の索引とサンプラーの問題がずれていた場合）
+    for _ in range(2):
+        with _sampler_lock:
+            question_id = _get_sampler(user_id, grammar_id).pick()
+        if question_id is None:
+            return None
+        
+        question = questions.get(question_id)
+        if question is not None:
+            return {column: question[column] for column in QUESTION_COLUMNS}
+        
+        with _sampler_lock:
+            _samplers.pop((user_id, grammar_id), None)
     
-    # 進捗を取得
-    cursor.execute("""
-        SELECT mastery_level, correct_count, wrong_count
-        FROM grammar_progress
-        WHERE user_id = ? AND grammar_id = ?
-    """, (user_id, grammar_id))
+    return None
+
+
+def apply_answer(progress, is_correct: bool) -> dict:
+    """
+    回答1件ぶんのマスター度・回数の更新を計算する（DB には触れない）
     
-    progress = cursor.fetchone()
+    Args:
+        progress: 現在の進捗（mastery_level, correct_count, wrong_count を含む）。
+                  未回答なら None
+        is_correct: 正解かどうか
     
+    Returns:
+        更新後の mastery_level, correct_count, wrong_count
+    """
     if progress:
         mastery = progress['mastery_level']
         correct_count = progress['correct_count']
@@ -142,42 +287,311 @@ def check_answer(user_id: int, question_id: int, answer: str) -> dict:
     
     # マスター度を更新
     if is_correct:
-        mastery = min(100, mastery + 5)
+        mastery = min(MASTERY_MAX, mastery + MASTERY_GAIN)
         correct_count += 1
     else:
-        mastery = max(0, mastery - 7)
+        mastery = max(0, mastery - MASTERY_LOSS)
         wrong_count += 1
     
-    # 進捗を更新または挿入
-    now = datetime.now().isoformat()
-    cursor.execute("""
-        INSERT INTO grammar_progress 
-        (user_id, grammar_id, correct_count, wrong_count, mastery_level, last_studied_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(user_id, grammar_id) DO UPDATE SET
-            correct_count = excluded.correct_count,
-            wrong_count = excluded.wrong_count,
-            mastery_level = excluded.mastery_level,
-            last_studied_at = excluded.last_studied_at
-    """, (user_id, grammar_id, correct_count, wrong_count, mastery, now))
-    
-    conn.commit()
-    conn.close()
-    
     return {
-        'is_correct': is_correct,
-        'explanation': explanation,
         'mastery_level': mastery,
-        'correct_answer': correct_answer
+        'correct_count': correct_count,
+        'wrong_count': wrong_count,
     }
 
 
+def apply_question_answer(progress, is_correct: bool) -> dict:
+    """
+    回答1件ぶんの問題ごとの回数・連続正解の更新を計算する（DB には触れない）
+    
+    Args:
+        progress: 現在の進捗（correct_count, wrong_count, correct_streak を含む）。
+                  未回答なら None
+        is_correct: 正解かどうか
+    
+    Returns:
+        更新後の correct_count, wrong_count, correct_streak
+    """
+    if progress:
+        correct_count = progress['correct_count']
+        wrong_count = progress['wrong_count']
+        correct_streak = progress['correct_streak']
+    else:
+        correct_count = 0
+        wrong_count = 0
+        correct_streak = 0
+    
+    if is_correct:
+        correct_count += 1
+        correct_streak += 1
+    else:
+        wrong_count += 1
+        correct_streak = 0
+    
+    return {
+        'correct_count': correct_count,
+        'wrong_count': wrong_count,
+        'correct_streak': correct_streak,
+    }
 
 
+def check_answer(user_id: int, question_id: int, answer: str) -> dict:
+    """
+    回答をチェックし、マスター度を更新
+    
+    正誤はメモリ上の解答キーの索引で判定する（DB は読まない）。
+    進捗は、トピック・問題ごとの upsert（増分を SQL の中で足す）と回答イベントの追記を
+    1トランザクションで行う。
+    
+    Args:
+        user_id: ユーザーID
+        question_id: 問題ID
+        answer: ユーザーの回答
+    
+    Returns:
+        採点結果（is_correct, explanation, mastery_level）。
+        出したあとに外された問題も採点する。問題が DB にもなければ None
+    
+    Note:
+        answer_buffer が有効な場合、進捗は DB ではなくバッファに書き込む。
+    """
+    question = _get_question(question_id)
+    if question is None:
+        return None
+    
+    grammar_id = question['grammar_id']
+    
+    # 正誤判定（正規化1回 + 集合の検索1回。大文字小文字・空白・全角・短縮形などを吸収）
+    is_correct = answer_normalizer.is_match(answer, question['answer_keys'])
+    
+    now_dt = datetime.now()
+    now = now_dt.isoformat()
+    event = answer_log.make_event(
+        user_id, answer_log.KIND_GRAMMAR, question_id, is_correct, None, now_dt
+    )
+    
+    if answer_buffer.is_enabled():
+        mastery, question_state = _buffer_answer(user_id, grammar_id, question_id, is_correct, now)
+        answer_buffer.put_event(event)
+    else:
+        mastery, question_state = _write_answer(
+            user_id, grammar_id, question_id, is_correct, now, event
+        )
+    
+    # 出題サンプラー上の重みをこの問題だけ更新
+    with _sampler_lock:
+        sampler = _samplers.get((user_id, grammar_id))
+        if sampler is not None:
+            sampler.update(question_id, {**question_state, 'last_answered_at': now})
+    
+    return {
+        'is_correct': is_correct,
+        'explanation': question['explanation'],
+        'mastery_level': mastery,
+        'correct_answer': question['correct_answer']
+    }
 
 
+def _write_answer(
+    user_id: int, grammar_id: int, question_id: int, is_correct: bool, now: str, event: tuple
+) -> tuple[int, dict]:
+    """
+    進捗の更新と回答イベントの追記を1トランザクションで DB に書く
+    
+    今の進捗は読まず、upsert の中で回数・マスター度を足して RETURNING で受け取る
+    （apply_answer / apply_question_answer と同じ結果）。
+    
+    Returns:
+        (更新後のマスター度, 問題ごとの correct_count, wrong_count, correct_streak)
+    """
+    first = apply_answer(None, is_correct)
+    params = {
+        'user_id': user_id,
+        'grammar_id': grammar_id,
+        'question_id': question_id,
+        'correct': first['correct_count'],
+        'wrong': first['wrong_count'],
+        'mastery': first['mastery_level'],
+        'delta': MASTERY_GAIN if is_correct else -MASTERY_LOSS,
+        'mastery_max': MASTERY_MAX,
+        'now': now,
+    }
+    conn = db.get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO grammar_progress 
+            (user_id, grammar_id, correct_count, wrong_count, mastery_level, last_studied_at)
+            VALUES (:user_id, :grammar_id, :correct, :wrong, :mastery, :now)
+            ON CONFLICT(user_id, grammar_id) DO UPDATE SET
+                correct_count = correct_count + excluded.correct_count,
+                wrong_count = wrong_count + excluded.wrong_count,
+                mastery_level = MAX(0, MIN(:mastery_max, mastery_level + :delta)),
+                last_studied_at = excluded.last_studied_at
+            RETURNING mastery_level
+        """, params)
+        mastery = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO grammar_question_progress
+            (user_id, question_id, correct_count, wrong_count, correct_streak, last_answered_at)
+            VALUES (:user_id, :question_id, :correct, :wrong, :correct, :now)
+            ON CONFLICT(user_id, question_id) DO UPDATE SET
+                correct_count = correct_count + excluded.correct_count,
+                wrong_count = wrong_count + excluded.wrong_count,
+                correct_streak = CASE WHEN excluded.correct_count > 0
+                                      THEN correct_streak + 1 ELSE 0 END,
+                last_answered_at = excluded.last_answered_at
+            RETURNING correct_count, wrong_count, correct_streak
+        """, params)
+        correct_count, wrong_count, correct_streak = cursor.fetchone()
+        question_state = {
+            'correct_count': correct_count,
+            'wrong_count': wrong_count,
+            'correct_streak': correct_streak,
+        }
+        answer_log.insert_events(cursor, [event])
+    return mastery, question_state
 
 
+def _buffer_answer(
+    user_id: int, grammar_id: int, question_id: int, is_correct: bool, now: str
+) -> tuple[int, dict]:
+    """
+    進捗を answer_buffer に入れる（今の進捗はバッファ、なければ DB から読む）
+    
+    Returns:
+        (更新後のマスター度, 問題ごとの correct_count, wrong_count, correct_streak)
+    """
+    progress = answer_buffer.get_grammar_progress(user_id, grammar_id)
+    question_progress = answer_buffer.get_grammar_question_progress(user_id, question_id)
+    
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    if progress is None:
+        cursor.execute("""
+            SELECT mastery_level, correct_count, wrong_count
+            FROM grammar_progress
+            WHERE user_id = ? AND grammar_id = ?
+        """, (user_id, grammar_id))
+        
+        progress = cursor.fetchone()
+    
+    if question_progress is None:
+        cursor.execute("""
+            SELECT correct_count, wrong_count, correct_streak
+            FROM grammar_question_progress
+            WHERE user_id = ? AND question_id = ?
+        """, (user_id, question_id))
+        
+        question_progress = cursor.fetchone()
+    
+    state = apply_answer(progress, is_correct)
+    question_state = apply_question_answer(question_progress, is_correct)
+    answer_buffer.put_grammar_progress({
+        'user_id': user_id,
+        'grammar_id': grammar_id,
+        **state,
+        'last_studied_at': now,
+    })
+    answer_buffer.put_grammar_question_progress({
+        'user_id': user_id,
+        'question_id': question_id,
+        **question_state,
+        'last_answered_at': now,
+    })
+    return state['mastery_level'], question_state
 
 
-
+def rebuild_grammar_progress(user_id: int | None = None) -> int:
+    """
+    grammar_progress / grammar_question_progress を回答イベントログ（answer_events）から作り直す
+    
+    ログを記録順に1回だけ読み、問題ごとに apply_question_answer を、
+    問題IDをトピックIDに読み替えて apply_answer を順に適用する。
+    削除済みの問題のイベントは無視する。
+    イベントが1件もない (ユーザー, トピック・問題) の行はそのまま残す（ログを取り始める前の進捗を消さないため）。
+    
+    Args:
+        user_id: 指定した場合はそのユーザーの分だけ作り直す
+    
+    Returns:
+        作り直した grammar_progress の行数（残した行は含まない）
+    """
+    # 書き込み待ちのイベントを先にログへ反映しておく
+    answer_buffer.flush()
+    
+    conn = db.get_connection()
+    topic_of = {
+        row['question_id']: row['grammar_id']
+        for row in conn.execute("SELECT question_id, grammar_id FROM grammar_questions")
+    }
+    
+    states: dict[tuple[int, int], dict] = {}
+    last_studied: dict[tuple[int, int], int] = {}
+    question_states: dict[tuple[int, int], dict] = {}
+    last_answered: dict[tuple[int, int], int] = {}
+    for ev_user_id, question_id, is_correct, _answer_ms, answered_at in answer_log.iter_events(
+        conn, answer_log.KIND_GRAMMAR, user_id
+    ):
+        grammar_id = topic_of.get(question_id)
+        if grammar_id is None:
+            continue
+        key = (ev_user_id, grammar_id)
+        states[key] = apply_answer(states.get(key), bool(is_correct))
+        last_studied[key] = answered_at
+        question_key = (ev_user_id, question_id)
+        question_states[question_key] = apply_question_answer(
+            question_states.get(question_key), bool(is_correct)
+        )
+        last_answered[question_key] = answered_at
+    
+    rows = [
+        (
+            row_user_id,
+            grammar_id,
+            state['correct_count'],
+            state['wrong_count'],
+            state['mastery_level'],
+            answer_log.from_epoch_ms(last_studied[(row_user_id, grammar_id)]).isoformat(),
+        )
+        for (row_user_id, grammar_id), state in states.items()
+    ]
+    question_rows = [
+        (
+            row_user_id,
+            question_id,
+            state['correct_count'],
+            state['wrong_count'],
+            state['correct_streak'],
+            answer_log.from_epoch_ms(last_answered[(row_user_id, question_id)]).isoformat(),
+        )
+        for (row_user_id, question_id), state in question_states.items()
+    ]
+    
+    # イベントのない (ユーザー, トピック・問題) の行は消さずに残す
+    # （ログを取り始める前 = マイグレーション v3 より前の学習進捗）
+    with conn:
+        conn.executemany("""
+            INSERT INTO grammar_progress 
+            (user_id, grammar_id, correct_count, wrong_count, mastery_level, last_studied_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, grammar_id) DO UPDATE SET
+                correct_count = excluded.correct_count,
+                wrong_count = excluded.wrong_count,
+                mastery_level = excluded.mastery_level,
+                last_studied_at = excluded.last_studied_at
+        """, rows)
+        conn.executemany("""
+            INSERT INTO grammar_question_progress
+            (user_id, question_id, correct_count, wrong_count, correct_streak, last_answered_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, question_id) DO UPDATE SET
+                correct_count = excluded.correct_count,
+                wrong_count = excluded.wrong_count,
+                correct_streak = excluded.correct_streak,
+                last_answered_at = excluded.last_answered_at
+        """, question_rows)
+    
+    invalidate_samplers(user_id)
+    
+    return len(rows)
@@ -0,0 +1,529 @@
+"""
+教材データの一括インポート
+UNIQUE インデックス（words.english / grammar_topics.title /
+grammar_questions(grammar_id, prompt_text)）に対する INSERT ... ON CONFLICT を
+executemany でまとめて実行する。CHUNK_SIZE 件ごとに1トランザクション。
+
+既存の行は内容が変わっていれば更新し、同じなら何もしない。
+同じファイル内の重複は最初に出てきたものを使う。
+
+sync_words / sync_grammar_questions は教材ファイルとの差分同期を行う。
+単語は english、文法問題は (トピック, prompt_text) を内容キーとし、
+行ごとの内容ハッシュ（content_hash）を比べて、追加・変更された行だけを書き込み、
+ファイルから消えた行は削除せずに retired = 1 にする（学習進捗・回答ログは残る）。
+ファイル自体のハッシュが前回の同期と同じなら何もしない。
+
+単語が変わったときは、紛らわしい単語のグラフ（word_confusables）のうち、
+変わった単語とその近くの単語の辺を作り直す。
+"""
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from app.services import db
+from app.services import answer_normalizer
+from app.services import confusable_words
+from app.services import content_pack
+
+
+# 1トランザクションで書き込む行数
+CHUNK_SIZE = 5000
+
+# 廃止済みの行がファイルに戻ってきた場合は retired を 0 に戻す
+UPSERT_WORDS_SQL = """
+    INSERT INTO words (english, japanese, grade, unit, level, content_hash)
+    VALUES (:english, :japanese, :grade, :unit, :level, :content_hash)
+    ON CONFLICT(english) DO UPDATE SET
+        japanese = excluded.japanese,
+        grade = excluded.grade,
+        unit = excluded.unit,
+        level = excluded.level,
+        content_hash = excluded.content_hash,
+        retired = 0
+    WHERE words.content_hash IS NOT excluded.content_hash
+       OR words.retired <> 0
+"""
+
+UPSERT_TOPICS_SQL = """
+    INSERT INTO grammar_topics (title, description, level, related_units)
+    VALUES (:title, :description, :level, :related_units)
+    ON CONFLICT(title) DO UPDATE SET
+        description = excluded.description,
+        level = excluded.level,
+        related_units = excluded.related_units
+    WHERE grammar_topics.description IS NOT excluded.description
+       OR grammar_topics.level IS NOT excluded.level
+       OR grammar_topics.related_units IS NOT excluded.related_units
+"""
+
+UPSERT_QUESTIONS_SQL = """
+    INSERT INTO grammar_questions
+    (grammar_id, question_type, prompt_text, choice1, choice2, choice3, choice4,
+     correct_answer, explanation, answer_keys, content_hash)
+    VALUES (:grammar_id, :question_type, :prompt_text, :choice1, :choice2, :choice3, :choice4,
+            :correct_answer, :explanation, :answer_keys, :content_hash)
+    ON CONFLICT(grammar_id, prompt_text) DO UPDATE SET
+        question_type = excluded.question_type,
+        choice1 = excluded.choice1,
+        choice2 = excluded.choice2,
+        choice3 = excluded.choice3,
+        choice4 = excluded.choice4,
+        correct_answer = excluded.correct_answer,
+        explanation = excluded.explanation,
+        answer_keys = excluded.answer_keys,
+        content_hash = excluded.content_hash,
+        retired = 0
+    WHERE grammar_questions.content_hash IS NOT excluded.content_hash
+       OR grammar_questions.retired <> 0
+"""
+
+# 内容ハッシュの対象にする列
+WORD_CONTENT_FIELDS = ("english", "japanese", "grade", "unit", "level")
+QUESTION_CONTENT_FIELDS = (
+    "question_type", "prompt_text", "choice1", "choice2", "choice3", "choice4",
+    "correct_answer", "explanation", "accepted_answers",
+)
+
+
+def content_hash(row: dict, fields: tuple) -> str:
+    """行の内容ハッシュ（fields の値だけから作るので、ID や順番には左右されない）"""
+    payload = json.dumps([row.get(f) for f in fields], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_synced_hash(source: str) -> str | None:
+    """source（教材ファイルの種類）を最後に同期したときのファイルハッシュ"""
+    row = db.get_connection().execute(
+        "SELECT file_hash FROM content_sync_state WHERE source = ?", (source,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _mark_synced(cursor, source: str, digest: str) -> None:
+    cursor.execute("""
+        INSERT INTO content_sync_state (source, file_hash, synced_at) VALUES (?, ?, ?)
+        ON CONFLICT(source) DO UPDATE SET
+            file_hash = excluded.file_hash,
+            synced_at = excluded.synced_at
+    """, (source, digest, datetime.now().isoformat()))
+
+
+def mark_synced(source: str, digest: str) -> None:
+    """source をファイルハッシュ digest の内容で同期済みとして記録する"""
+    conn = db.get_connection()
+    with conn:
+        _mark_synced(conn.cursor(), source, digest)
+    content_pack.notify_changed()
+
+
+def load_if_changed(path, source: str, force: bool = False) -> tuple[list | None, str]:
+    """
+    教材ファイルを読み込む（前回の同期から変わっていなければ読まない）
+
+    Args:
+        path: JSON ファイル
+        source: 同期状態を記録するときの名前（"words" など）
+        force: True なら変わっていなくても読む
+
+    Returns:
+        (JSON の内容 or None（変更なし）, ファイルハッシュ)
+    """
+    data = Path(path).read_bytes()
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if not force and get_synced_hash(source) == digest:
+        return None, digest
+    return json.loads(data.decode("utf-8")), digest
+
+
+def _dedupe(rows: list[dict], key, log=None) -> tuple[list[dict], int]:
+    """キーが同じ行は最初の1件だけ残す"""
+    seen = set()
+    unique = []
+    for row in rows:
+        k = key(row)
+        if k in seen:
+            if log:
+                log(f"重複のためスキップ: {k}")
+            continue
+        seen.add(k)
+        unique.append(row)
+    return unique, len(rows) - len(unique)
+
+
+def _upsert_chunked(conn, table: str, sql: str, rows: list[dict], chunk_size: int, log=None) -> dict:
+    """
+    rows を chunk_size 件ずつ1トランザクションで upsert する
+
+    追加した行数は、チャンクの前の最大の rowid より後ろの行だけを数える
+    （テーブル全体の COUNT(*) はしない。UPDATE では rowid は変わらない）。
+
+    Returns:
+        {"inserted", "updated", "unchanged"} の件数
+    """
+    inserted = updated = 0
+    cursor = conn.cursor()
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        with conn:
+            last_rowid = cursor.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+            cursor.executemany(sql, chunk)
+            # rowcount は INSERT と、WHERE を満たした UPDATE の合計
+            changed = cursor.rowcount
+            added = cursor.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE rowid > ?", (last_rowid,)
+            ).fetchone()[0]
+        inserted += added
+        updated += changed - added
+        if log:
+            log(f"{table}: {start + len(chunk)}/{len(rows)} 件処理")
+    if inserted or updated:
+        # メモリ上の問題の索引・出題スケジューラを作り直させる
+        content_pack.notify_changed()
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": len(rows) - inserted - updated,
+    }
+
+
+def _word_rows(words: list[dict], log=None) -> tuple[list[dict], int]:
+    """words.json の要素を words テーブルの行（内容ハッシュ付き）にする"""
+    rows = []
+    for w in words:
+        row = {
+            "english": w["english"],
+            "japanese": w["japanese"],
+            "grade": w.get("grade"),
+            "unit": w.get("unit"),
+            "level": w.get("level"),
+        }
+        row["content_hash"] = content_hash(row, WORD_CONTENT_FIELDS)
+        rows.append(row)
+    return _dedupe(rows, key=lambda r: r["english"], log=log)
+
+
+def _confusable_inputs(conn) -> dict[int, tuple[str, str]]:
+    """紛らわしい単語のグラフの元になる、廃止されていない単語 {word_id: (english, japanese)}"""
+    return {
+        word_id: (english, japanese)
+        for word_id, english, japanese in conn.execute(
+            "SELECT word_id, english, japanese FROM words WHERE retired = 0"
+        )
+    }
+
+
+def rebuild_confusables(conn=None, log=None, previous: dict | None = None) -> int:
+    """
+    紛らわしい単語のグラフ（word_confusables）を、廃止されていない単語から作り直す
+
+    previous を渡すと、変わった単語とその近くの単語の辺だけを書き換える
+    （confusable_words.update_edges。変わった単語が多い・グラフがまだない場合は全体を作り直す）。
+
+    Args:
+        conn: 書き込む DB 接続（省略時は db.get_connection()。コンテンツパックのビルド用）
+        log: 詳細ログを出す関数。None なら出さない
+        previous: 単語を書き込む前の _confusable_inputs（グラフはこの単語から作られていること）
+
+    Returns:
+        書き込んだ行数（両向きに入れるので組の数の2倍）
+    """
+    conn = conn or db.get_connection()
+    words = conn.execute(
+        "SELECT word_id, english, japanese FROM words WHERE retired = 0 ORDER BY word_id"
+    ).fetchall()
+    if previous is not None and conn.execute("SELECT 1 FROM word_confusables LIMIT 1").fetchone():
+        dirty, edges = confusable_words.update_edges(words, previous, log=log)
+    else:
+        dirty, edges = None, confusable_words.build_edges(words, log=log)
+    if dirty is not None and not dirty:
+        return 0
+
+    with conn:
+        if dirty is None:
+            conn.execute("DELETE FROM word_confusables")
+        else:
+            # 作り直す単語の辺を、相手側の向きも合わせて消す
+            stale = []
+            for word_id in dirty:
+                for (other_word_id,) in conn.execute(
+                    "SELECT other_word_id FROM word_confusables WHERE word_id = ?", (word_id,)
+                ):
+                    stale.append((word_id, other_word_id))
+                    stale.append((other_word_id, word_id))
+            conn.executemany(
+                "DELETE FROM word_confusables WHERE word_id = ? AND other_word_id = ?", stale
+            )
+        conn.executemany("""
+            INSERT INTO word_confusables (word_id, other_word_id, score, reason)
+            VALUES (?, ?, ?, ?)
+        """, edges)
+    # 読み込み済みのグラフ（word_service.get_confusables）を読み直させる
+    content_pack.notify_changed()
+    return len(edges)
+
+
+def import_words(words: list[dict], chunk_size: int = CHUNK_SIZE, log=None, conn=None) -> dict:
+    """
+    単語を一括インポートする
+
+    Args:
+        words: words.json と同じ形式の辞書のリスト
+        chunk_size: 1トランザクションで書き込む件数
+        log: 詳細ログを出す関数（print など）。None なら出さない
+        conn: 書き込む DB 接続（省略時は db.get_connection()。コンテンツパックのビルド用）
+
+    Returns:
+        {"inserted", "updated", "unchanged", "duplicates", "confusables"}。
+        confusables は作り直した word_confusables の行数（単語が変わらなければ None）
+    """
+    conn = conn or db.get_connection()
+    rows, duplicates = _word_rows(words, log)
+    previous = _confusable_inputs(conn)
+    result = _upsert_chunked(conn, "words", UPSERT_WORDS_SQL, rows, chunk_size, log)
+    result["duplicates"] = duplicates
+    result["confusables"] = (
+        rebuild_confusables(conn, log, previous) if result["inserted"] or result["updated"] else None
+    )
+    return result
+
+
+def import_grammar_topics(
+    topics: list[dict],
+    chunk_size: int = CHUNK_SIZE,
+    log=None,
+    conn=None,
+) -> dict:
+    """
+    文法トピックを一括インポートする
+
+    Args:
+        topics: grammar_topics.json と同じ形式の辞書のリスト
+        chunk_size: 1トランザクションで書き込む件数
+        log: 詳細ログを出す関数。None なら出さない
+        conn: 書き込む DB 接続（省略時は db.get_connection()）
+
+    Returns:
+        {"inserted", "updated", "unchanged", "duplicates"} の件数
+    """
+    rows, duplicates = _dedupe(
+        [
+            {
+                "title": t["title"],
+                "description": t.get("description"),
+                "level": t.get("level"),
+                "related_units": json.dumps(t.get("related_units", []), ensure_ascii=False),
+            }
+            for t in topics
+        ],
+        key=lambda r: r["title"],
+        log=log,
+    )
+    result = _upsert_chunked(
+        conn or db.get_connection(), "grammar_topics", UPSERT_TOPICS_SQL, rows, chunk_size, log
+    )
+    result["duplicates"] = duplicates
+    return result
+
+
+def import_grammar_questions(
+    questions: list[dict],
+    chunk_size: int = CHUNK_SIZE,
+    log=None,
+    conn=None,
+) -> dict:
+    """
+    文法問題を一括インポートする（トピックは grammar_title で引く）
+
+    Args:
+        questions: grammar_questions.json と同じ形式の辞書のリスト
+        chunk_size: 1トランザクションで書き込む件数
+        log: 詳細ログを出す関数。None なら出さない
+        conn: 書き込む DB 接続（省略時は db.get_connection()）
+
+    Returns:
+        {"inserted", "updated", "unchanged", "duplicates", "missing_topic"} の件数
+    """
+    conn = conn or db.get_connection()
+    rows, duplicates, missing_topic = _question_rows(conn, questions, log)
+    result = _upsert_chunked(
+        conn, "grammar_questions", UPSERT_QUESTIONS_SQL, rows, chunk_size, log
+    )
+    result["duplicates"] = duplicates
+    result["missing_topic"] = missing_topic
+    return result
+
+
+def _question_rows(conn, questions: list[dict], log=None) -> tuple[list[dict], int, int]:
+    """
+    grammar_questions.json の要素を grammar_questions テーブルの行（内容ハッシュ付き）にする
+
+    Returns:
+        (行のリスト, ファイル内の重複数, トピックが見つからなかった数)
+    """
+    topic_ids = {
+        row["title"]: row["grammar_id"]
+        for row in conn.execute("SELECT grammar_id, title FROM grammar_topics")
+    }
+
+    rows = []
+    missing_topic = 0
+    for q in questions:
+        grammar_id = topic_ids.get(q["grammar_title"])
+        if grammar_id is None:
+            missing_topic += 1
+            if log:
+                log(f"エラー: トピック '{q['grammar_title']}' が見つかりません")
+            continue
+        row = {
+            "grammar_id": grammar_id,
+            "question_type": q["question_type"],
+            "prompt_text": q["prompt_text"],
+            "choice1": q.get("choice1"),
+            "choice2": q.get("choice2"),
+            "choice3": q.get("choice3"),
+            "choice4": q.get("choice4"),
+            "correct_answer": q["correct_answer"],
+            "explanation": q.get("explanation"),
+            # 正解のほかに正解とする解答（任意）
+            "accepted_answers": q.get("accepted_answers") or [],
+        }
+        # 採点で比べる正規形はインポート時に作っておく
+        row["answer_keys"] = answer_normalizer.encode_answer_keys(
+            row["correct_answer"], row["accepted_answers"]
+        )
+        row["content_hash"] = content_hash(row, QUESTION_CONTENT_FIELDS)
+        rows.append(row)
+
+    rows, duplicates = _dedupe(
+        rows, key=lambda r: (r["grammar_id"], r["prompt_text"]), log=log
+    )
+    return rows, duplicates, missing_topic
+
+
+def _sync_rows(
+    conn,
+    table: str,
+    key_columns: tuple,
+    upsert_sql: str,
+    rows: list[dict],
+    source: str | None,
+    digest: str | None,
+    log=None,
+) -> dict:
+    """
+    rows と table の差分だけを1トランザクションで書き込む
+
+    内容キーが新しい行は追加、内容ハッシュが違う行・廃止済みの行は更新、
+    table にあってファイルにない行は retired = 1 にする。
+
+    Returns:
+        {"inserted", "updated", "unchanged", "retired"} の件数
+    """
+    keys = ", ".join(key_columns)
+    existing = {
+        tuple(row[:-2]): (row[-2], row[-1])
+        for row in conn.execute(f"SELECT {keys}, content_hash, retired FROM {table}")
+    }
+
+    to_insert = []
+    to_update = []
+    seen = set()
+    for row in rows:
+        key = tuple(row[c] for c in key_columns)
+        seen.add(key)
+        current = existing.get(key)
+        if current is None:
+            to_insert.append(row)
+        elif current[0] != row["content_hash"] or current[1]:
+            to_update.append(row)
+    to_retire = [key for key, (_, retired) in existing.items() if not retired and key not in seen]
+
+    where = " AND ".join(f"{c} = ?" for c in key_columns)
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany(upsert_sql, to_insert + to_update)
+        cursor.executemany(f"UPDATE {table} SET retired = 1 WHERE {where}", to_retire)
+        if source is not None:
+            _mark_synced(cursor, source, digest)
+    content_pack.notify_changed()
+
+    if log:
+        for key in to_retire:
+            log(f"廃止: {key}")
+    return {
+        "inserted": len(to_insert),
+        "updated": len(to_update),
+        "unchanged": len(rows) - len(to_insert) - len(to_update),
+        "retired": len(to_retire),
+    }
+
+
+def sync_words(
+    words: list[dict],
+    source: str | None = None,
+    digest: str | None = None,
+    log=None,
+    conn=None,
+) -> dict:
+    """
+    単語を教材ファイルと差分同期する（word_id と学習進捗はそのまま残る）
+
+    Args:
+        words: words.json と同じ形式の辞書のリスト
+        source: 同期状態を記録する名前（load_if_changed と同じもの）。None なら記録しない
+        digest: load_if_changed が返したファイルハッシュ
+        log: 詳細ログを出す関数。None なら出さない
+        conn: 書き込む DB 接続（省略時は db.get_connection()。コンテンツパックのビルド用）
+
+    Returns:
+        {"inserted", "updated", "unchanged", "retired", "duplicates", "confusables"}。
+        confusables は作り直した word_confusables の行数（単語が変わらなければ None）
+    """
+    conn = conn or db.get_connection()
+    rows, duplicates = _word_rows(words, log)
+    previous = _confusable_inputs(conn)
+    result = _sync_rows(
+        conn, "words", ("english",), UPSERT_WORDS_SQL,
+        rows, source, digest, log,
+    )
+    result["duplicates"] = duplicates
+    # グラフがまだない場合（古い DB・パックから作り直すとき）も作る
+    changed = result["inserted"] or result["updated"] or result["retired"]
+    if not conn.execute("SELECT 1 FROM word_confusables LIMIT 1").fetchone():
+        result["confusables"] = rebuild_confusables(conn, log)
+    elif changed:
+        result["confusables"] = rebuild_confusables(conn, log, previous)
+    else:
+        result["confusables"] = None
+    return result
+
+
+def sync_grammar_questions(
+    questions: list[dict],
+    source: str | None = None,
+    digest: str | None = None,
+    log=None,
+    conn=None,
+) -> dict:
+    """
+    文法問題を教材ファイルと差分同期する（トピックは先に import_grammar_topics で入れておく）
+
+    Args:
+        questions: grammar_questions.json と同じ形式の辞書のリスト
+        source: 同期状態を記録する名前。None なら記録しない
+        digest: load_if_changed が返したファイルハッシュ
+        log: 詳細ログを出す関数。None なら出さない
+        conn: 書き込む DB 接続（省略時は db.get_connection()）
+
+    Returns:
+        {"inserted", "updated", "unchanged", "retired", "duplicates", "missing_topic"} の件数
+    """
+    conn = conn or db.get_connection()
+    rows, duplicates, missing_topic = _question_rows(conn, questions, log)
+    result = _sync_rows(
+        conn, "grammar_questions", ("grammar_id", "prompt_text"), UPSERT_QUESTIONS_SQL,
+        rows, source, digest, log,
+    )
+    result["duplicates"] = duplicates
+    result["missing_topic"] = missing_topic
+    return result
@@ -0,0 +1,902 @@
+"""
+データベーススキーマのマイグレーション
+スキーマのバージョンは PRAGMA user_version に保存する。
+起動時は user_version を1回読むだけで、古い場合だけ未適用のマイグレーションを
+1トランザクションで順に適用する。
+
+マイグレーションを追加するときは、関数を書いて MIGRATIONS の末尾に追加する
+（既存の関数は変更しないこと）。
+"""
+import sqlite3
+from datetime import datetime
+
+
+def _table_exists(cursor, table: str) -> bool:
+    """テーブルが存在するかどうか"""
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def _column_exists(cursor, table: str, column: str) -> bool:
+    """列が存在するかどうか"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def _migrate_v1(cursor):
+    """基本テーブル（ユーザー・単語・文法・会話）を作成"""
+    # users テーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            created_at TEXT
+        )
+    """)
+    
+    # grammar_topics テーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS grammar_topics (
+            grammar_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            level INTEGER,
+            related_units TEXT,
+            created_at TEXT
+        )
+    """)
+    
+    # scenarios テーブル（会話トレーニング用）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scenarios (
+            scenario_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            level INTEGER,
+            topic_tag TEXT,
+            description TEXT,
+            is_active INTEGER DEFAULT 1
+        )
+    """)
+    
+    # scenario_steps テーブル（会話トレーニング用）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scenario_steps (
+            step_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scenario_id INTEGER NOT NULL,
+            order_no INTEGER NOT NULL,
+            bot_text TEXT NOT NULL,
+            expected_patterns TEXT,
+            required_keywords TEXT,
+            hint_jp TEXT,
+            model_answer TEXT,
+            allowed_vocab_set TEXT,
+            FOREIGN KEY (scenario_id) REFERENCES scenarios(scenario_id)
+        )
+    """)
+    
+    # conversation_progress テーブル（会話トレーニング用）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_progress (
+            user_id INTEGER NOT NULL,
+            scenario_id INTEGER NOT NULL,
+            last_step_order INTEGER DEFAULT 0,
+            cleared_count INTEGER DEFAULT 0,
+            last_cleared_at TEXT,
+            PRIMARY KEY (user_id, scenario_id),
+            FOREIGN KEY (scenario_id) REFERENCES scenarios(scenario_id)
+        )
+    """)
+    
+    # conversation_log テーブル（会話トレーニング用）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_log (
+            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            scenario_id INTEGER NOT NULL,
+            step_id INTEGER NOT NULL,
+            user_answer TEXT,
+            judge_result TEXT,
+            score INTEGER,
+            answered_at TEXT,
+            FOREIGN KEY (scenario_id) REFERENCES scenarios(scenario_id),
+            FOREIGN KEY (step_id) REFERENCES scenario_steps(step_id)
+        )
+    """)
+    
+    # words テーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS words (
+            word_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            english TEXT NOT NULL,
+            japanese TEXT NOT NULL,
+            grade INTEGER,
+            unit TEXT,
+            level INTEGER,
+            created_at TEXT
+        )
+    """)
+    
+    # word_progress テーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS word_progress (
+            user_id INTEGER NOT NULL,
+            word_id INTEGER NOT NULL,
+            stage INTEGER NOT NULL DEFAULT 1,
+            total_correct INTEGER NOT NULL DEFAULT 0,
+            total_wrong INTEGER NOT NULL DEFAULT 0,
+            correct_streak INTEGER NOT NULL DEFAULT 0,
+            avg_answer_time_sec REAL NOT NULL DEFAULT 0,
+            last_answered_at TEXT,
+            PRIMARY KEY (user_id, word_id)
+        )
+    """)
+    
+    # study_sessions テーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS study_sessions (
+            session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            duration_sec INTEGER NOT NULL DEFAULT 0,
+            correct_count INTEGER NOT NULL DEFAULT 0,
+            wrong_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # grammar_questions テーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS grammar_questions (
+            question_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            grammar_id INTEGER NOT NULL,
+            question_type TEXT NOT NULL,
+            prompt_text TEXT NOT NULL,
+            choice1 TEXT,
+            choice2 TEXT,
+            choice3 TEXT,
+            choice4 TEXT,
+            correct_answer TEXT NOT NULL,
+            explanation TEXT,
+            FOREIGN KEY (grammar_id) REFERENCES grammar_topics(grammar_id)
+        )
+    """)
+    
+    # grammar_progress テーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS grammar_progress (
+            user_id INTEGER NOT NULL,
+            grammar_id INTEGER NOT NULL,
+            correct_count INTEGER NOT NULL DEFAULT 0,
+            wrong_count INTEGER NOT NULL DEFAULT 0,
+            mastery_level INTEGER NOT NULL DEFAULT 0,
+            last_studied_at TEXT,
+            PRIMARY KEY (user_id, grammar_id)
+        )
+    """)
+
+
+def _migrate_v2(cursor):
+    """
+    出題クエリ用の列とインデックスを追加
+    
+    - word_progress.last_answered_day: last_answered_at を 1970-01-01 からの日数にした整数
+    - 学年・ユニット・レベルのフィルタ用、最終回答日用、トピック別問題用のインデックス
+    """
+    if not _column_exists(cursor, "word_progress", "last_answered_day"):
+        cursor.execute("ALTER TABLE word_progress ADD COLUMN last_answered_day INTEGER")
+    # 既存データを埋める
+    cursor.execute("""
+        UPDATE word_progress
+        SET last_answered_day = CAST(
+            julianday(date(last_answered_at)) - julianday('1970-01-01') AS INTEGER
+        )
+        WHERE last_answered_at IS NOT NULL AND last_answered_day IS NULL
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_word_progress_user_last_answered
+        ON word_progress(user_id, last_answered_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_words_grade_unit_level
+        ON words(grade, unit, level)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_words_unit_grade_level
+        ON words(unit, grade, level)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_words_level
+        ON words(level)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_grammar_questions_grammar
+        ON grammar_questions(grammar_id)
+    """)
+
+
+def _migrate_v3(cursor):
+    """
+    回答イベントログ（追記専用）とジャーナル適用状態のテーブルを追加
+    
+    answer_events は answer_log モジュールを参照。
+    answer_journal_state は answer_buffer のジャーナルを二重に適用しないための1行テーブル。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS answer_events (
+            event_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            item_kind INTEGER NOT NULL,
+            item_id INTEGER NOT NULL,
+            is_correct INTEGER NOT NULL,
+            answer_ms INTEGER,
+            answered_at INTEGER NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS answer_journal_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_batch_id TEXT
+        )
+    """)
+
+
+def _migrate_v4(cursor):
+    """
+    ユーザー別ステージ集計テーブルと、それを最新に保つトリガーを追加
+    
+    - word_stage_summary: ユーザーごとの word_progress のステージ別件数
+      （words に存在する単語の分だけ数える）
+    - word_catalog_summary: 単語の総数（1行だけ）
+    
+    get_word_stats はこの2つの主キー検索だけで済む。
+    
+    トリガー内の INSERT は OR IGNORE ではなく ON CONFLICT DO NOTHING を使う
+    （OR IGNORE は外側の文の衝突方針で上書きされるため）。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS word_stage_summary (
+            user_id INTEGER PRIMARY KEY,
+            stage1_count INTEGER NOT NULL DEFAULT 0,
+            stage2_count INTEGER NOT NULL DEFAULT 0,
+            stage3_count INTEGER NOT NULL DEFAULT 0,
+            stage4_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS word_catalog_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_words INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # 既存データから初期値を作る
+    cursor.execute("DELETE FROM word_stage_summary")
+    cursor.execute("""
+        INSERT INTO word_stage_summary
+        (user_id, stage1_count, stage2_count, stage3_count, stage4_count)
+        SELECT
+            wp.user_id,
+            SUM(wp.stage <= 1),
+            SUM(wp.stage = 2),
+            SUM(wp.stage = 3),
+            SUM(wp.stage >= 4)
+        FROM word_progress wp
+        JOIN words w ON w.word_id = wp.word_id
+        GROUP BY wp.user_id
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO word_catalog_summary (id, total_words)
+        SELECT 1, COUNT(*) FROM words
+    """)
+    
+    # ---- word_progress のトリガー ----
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_word_progress_insert_summary
+        AFTER INSERT ON word_progress
+        WHEN EXISTS (SELECT 1 FROM words WHERE word_id = NEW.word_id)
+        BEGIN
+            INSERT INTO word_stage_summary (user_id) VALUES (NEW.user_id)
+                ON CONFLICT(user_id) DO NOTHING;
+            UPDATE word_stage_summary SET
+                stage1_count = stage1_count + (NEW.stage <= 1),
+                stage2_count = stage2_count + (NEW.stage = 2),
+                stage3_count = stage3_count + (NEW.stage = 3),
+                stage4_count = stage4_count + (NEW.stage >= 4)
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_word_progress_delete_summary
+        AFTER DELETE ON word_progress
+        WHEN EXISTS (SELECT 1 FROM words WHERE word_id = OLD.word_id)
+        BEGIN
+            UPDATE word_stage_summary SET
+                stage1_count = stage1_count - (OLD.stage <= 1),
+                stage2_count = stage2_count - (OLD.stage = 2),
+                stage3_count = stage3_count - (OLD.stage = 3),
+                stage4_count = stage4_count - (OLD.stage >= 4)
+            WHERE user_id = OLD.user_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_word_progress_update_summary
+        AFTER UPDATE OF user_id, word_id, stage ON word_progress
+        BEGIN
+            UPDATE word_stage_summary SET
+                stage1_count = stage1_count - (OLD.stage <= 1),
+                stage2_count = stage2_count - (OLD.stage = 2),
+                stage3_count = stage3_count - (OLD.stage = 3),
+                stage4_count = stage4_count - (OLD.stage >= 4)
+            WHERE user_id = OLD.user_id
+              AND EXISTS (SELECT 1 FROM words WHERE word_id = OLD.word_id);
+            INSERT INTO word_stage_summary (user_id)
+            SELECT NEW.user_id
+            WHERE EXISTS (SELECT 1 FROM words WHERE word_id = NEW.word_id)
+            ON CONFLICT(user_id) DO NOTHING;
+            UPDATE word_stage_summary SET
+                stage1_count = stage1_count + (NEW.stage <= 1),
+                stage2_count = stage2_count + (NEW.stage = 2),
+                stage3_count = stage3_count + (NEW.stage = 3),
+                stage4_count = stage4_count + (NEW.stage >= 4)
+            WHERE user_id = NEW.user_id
+              AND EXISTS (SELECT 1 FROM words WHERE word_id = NEW.word_id);
+        END
+    """)
+    
+    # ---- words のトリガー ----
+    # 単語の追加・削除で総数を更新し、その単語の既存の進捗も数え直す
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_words_insert_summary
+        AFTER INSERT ON words
+        BEGIN
+            UPDATE word_catalog_summary SET total_words = total_words + 1 WHERE id = 1;
+            INSERT INTO word_stage_summary (user_id)
+            SELECT user_id FROM word_progress WHERE word_id = NEW.word_id
+            ON CONFLICT(user_id) DO NOTHING;
+            UPDATE word_stage_summary SET
+                stage1_count = stage1_count + (SELECT COUNT(*) FROM word_progress wp
+                    WHERE wp.word_id = NEW.word_id AND wp.user_id = word_stage_summary.user_id
+                      AND wp.stage <= 1),
+                stage2_count = stage2_count + (SELECT COUNT(*) FROM word_progress wp
+                    WHERE wp.word_id = NEW.word_id AND wp.user_id = word_stage_summary.user_id
+                      AND wp.stage = 2),
+                stage3_count = stage3_count + (SELECT COUNT(*) FROM word_progress wp
+                    WHERE wp.word_id = NEW.word_id AND wp.user_id = word_stage_summary.user_id
+                      AND wp.stage = 3),
+                stage4_count = stage4_count + (SELECT COUNT(*) FROM word_progress wp
+                    WHERE wp.word_id = NEW.word_id AND wp.user_id = word_stage_summary.user_id
+                      AND wp.stage >= 4)
+            WHERE user_id IN (SELECT user_id FROM word_progress WHERE word_id = NEW.word_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_words_delete_summary
+        AFTER DELETE ON words
+        BEGIN
+            UPDATE word_catalog_summary SET total_words = total_words - 1 WHERE id = 1;
+            UPDATE word_stage_summary SET
+                stage1_count = stage1_count - (SELECT COUNT(*) FROM word_progress wp
+                    WHERE wp.word_id = OLD.word_id AND wp.user_id = word_stage_summary.user_id
+                      AND wp.stage <= 1),
+                stage2_count = stage2_count - (SELECT COUNT(*) FROM word_progress wp
+                    WHERE wp.word_id = OLD.word_id AND wp.user_id = word_stage_summary.user_id
+                      AND wp.stage = 2),
+                stage3_count = stage3_count - (SELECT COUNT(*) FROM word_progress wp
+                    WHERE wp.word_id = OLD.word_id AND wp.user_id = word_stage_summary.user_id
+                      AND wp.stage = 3),
+                stage4_count = stage4_count - (SELECT COUNT(*) FROM word_progress wp
+                    WHERE wp.word_id = OLD.word_id AND wp.user_id = word_stage_summary.user_id
+                      AND wp.stage >= 4)
+            WHERE user_id IN (SELECT user_id FROM word_progress WHERE word_id = OLD.word_id);
+        END
+    """)
+
+
+def _merge_duplicates(cursor, table, id_column, key_columns, references):
+    """
+    key_columns が同じ行を、id_column が最小の行にまとめる（UNIQUE インデックスを張る前の掃除）
+    
+    Args:
+        table: 対象テーブル
+        id_column: 主キー列
+        key_columns: 一意にしたい列
+        references: この id を参照する (テーブル, 列, 追加条件 or None) のリスト。
+            付け替えると主キーが重複する行（同じユーザーの進捗など）は残す側を優先して消す
+    """
+    keys = ", ".join(key_columns)
+    join = " AND ".join(f"t.{c} = k.{c}" for c in key_columns)
+    cursor.execute("DROP TABLE IF EXISTS temp._dup_map")
+    cursor.execute(f"""
+        CREATE TEMP TABLE _dup_map AS
+        SELECT t.{id_column} AS old_id, k.keep_id AS new_id
+        FROM {table} t
+        JOIN (
+            SELECT {keys}, MIN({id_column}) AS keep_id
+            FROM {table}
+            GROUP BY {keys}
+            HAVING COUNT(*) > 1
+        ) k ON {join}
+        WHERE t.{id_column} <> k.keep_id
+    """)
+    
+    for ref_table, ref_column, condition in references:
+        extra = f" AND {condition}" if condition else ""
+        cursor.execute(f"""
+            UPDATE OR IGNORE {ref_table}
+            SET {ref_column} = (SELECT new_id FROM _dup_map WHERE old_id = {ref_column})
+            WHERE {ref_column} IN (SELECT old_id FROM _dup_map){extra}
+        """)
+        cursor.execute(f"""
+            DELETE FROM {ref_table}
+            WHERE {ref_column} IN (SELECT old_id FROM _dup_map){extra}
+        """)
+    
+    cursor.execute(f"DELETE FROM {table} WHERE {id_column} IN (SELECT old_id FROM _dup_map)")
+    cursor.execute("DROP TABLE _dup_map")
+
+
+def _migrate_v5(cursor):
+    """
+    一括インポート（INSERT ... ON CONFLICT）用の UNIQUE インデックスを追加
+    
+    - words(english)
+    - grammar_topics(title)
+    - grammar_questions(grammar_id, prompt_text)
+    - word_progress(word_id): 単語の追加・削除時のトリガーが進捗を探すため
+    
+    既に重複がある場合は、古い方（ID が小さい方）に進捗・回答ログを付け替えてから消す。
+    （answer_events.item_kind は 0 = 単語、1 = 文法問題）
+    """
+    _merge_duplicates(cursor, "words", "word_id", ["english"], [
+        ("word_progress", "word_id", None),
+        ("answer_events", "item_id", "item_kind = 0"),
+    ])
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_words_english
+        ON words(english)
+    """)
+    
+    _merge_duplicates(cursor, "grammar_topics", "grammar_id", ["title"], [
+        ("grammar_questions", "grammar_id", None),
+        ("grammar_progress", "grammar_id", None),
+    ])
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_grammar_topics_title
+        ON grammar_topics(title)
+    """)
+    
+    _merge_duplicates(cursor, "grammar_questions", "question_id", ["grammar_id", "prompt_text"], [
+        ("answer_events", "item_id", "item_kind = 1"),
+    ])
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_grammar_questions_topic_prompt
+        ON grammar_questions(grammar_id, prompt_text)
+    """)
+    # (grammar_id) 単独のインデックスは上のインデックスの先頭列で代用できる
+    cursor.execute("DROP INDEX IF EXISTS idx_grammar_questions_grammar")
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_word_progress_word
+        ON word_progress(word_id)
+    """)
+
+
+def _stage_delta_sql(op: str, row: str) -> str:
+    """トリガー用: row（NEW/OLD）のステージの件数を op（+/-）する SET 句"""
+    return ",\n".join([
+        f"stage1_count = stage1_count {op} ({row}.stage <= 1)",
+        f"stage2_count = stage2_count {op} ({row}.stage = 2)",
+        f"stage3_count = stage3_count {op} ({row}.stage = 3)",
+        f"stage4_count = stage4_count {op} ({row}.stage >= 4)",
+    ])
+
+
+def _word_stage_delta_sql(op: str, word_id: str) -> str:
+    """トリガー用: 単語 word_id の全ユーザーの進捗を各ユーザーの件数に op（+/-）する SET 句"""
+    conditions = [("1", "<= 1"), ("2", "= 2"), ("3", "= 3"), ("4", ">= 4")]
+    return ",\n".join(
+        f"""stage{n}_count = stage{n}_count {op} (SELECT COUNT(*) FROM word_progress wp
+            WHERE wp.word_id = {word_id} AND wp.user_id = word_stage_summary.user_id
+              AND wp.stage {cond})"""
+        for n, cond in conditions
+    )
+
+
+def _migrate_v6(cursor):
+    """
+    教材の差分同期用の列・テーブルを追加し、集計トリガーを廃止単語に対応させる
+    
+    - words / grammar_questions.content_hash: 内容のハッシュ（importer.content_hash）
+    - words / grammar_questions.retired: 教材ファイルから消えた行は削除せず 1 にする
+      （進捗・回答ログを残すため。出題・集計からは除く）
+    - content_sync_state: 教材ファイルごとの最後に同期したファイルハッシュ
+    """
+    for table in ("words", "grammar_questions"):
+        if not _column_exists(cursor, table, "content_hash"):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN content_hash TEXT")
+        if not _column_exists(cursor, table, "retired"):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN retired INTEGER NOT NULL DEFAULT 0")
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS content_sync_state (
+            source TEXT PRIMARY KEY,
+            file_hash TEXT NOT NULL,
+            synced_at TEXT NOT NULL
+        )
+    """)
+    
+    # 集計トリガーを「廃止されていない単語」だけ数えるものに作り直す
+    for trigger in (
+        "trg_word_progress_insert_summary",
+        "trg_word_progress_delete_summary",
+        "trg_word_progress_update_summary",
+        "trg_words_insert_summary",
+        "trg_words_delete_summary",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    
+    active = "EXISTS (SELECT 1 FROM words WHERE word_id = {} AND retired = 0)"
+    cursor.execute(f"""
+        CREATE TRIGGER trg_word_progress_insert_summary
+        AFTER INSERT ON word_progress
+        WHEN {active.format("NEW.word_id")}
+        BEGIN
+            INSERT INTO word_stage_summary (user_id) VALUES (NEW.user_id)
+            ON CONFLICT(user_id) DO NOTHING;
+            UPDATE word_stage_summary SET
+                {_stage_delta_sql("+", "NEW")}
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_word_progress_delete_summary
+        AFTER DELETE ON word_progress
+        WHEN {active.format("OLD.word_id")}
+        BEGIN
+            UPDATE word_stage_summary SET
+                {_stage_delta_sql("-", "OLD")}
+            WHERE user_id = OLD.user_id;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_word_progress_update_summary
+        AFTER UPDATE OF user_id, word_id, stage ON word_progress
+        BEGIN
+            UPDATE word_stage_summary SET
+                {_stage_delta_sql("-", "OLD")}
+            WHERE user_id = OLD.user_id AND {active.format("OLD.word_id")};
+            INSERT INTO word_stage_summary (user_id)
+            SELECT NEW.user_id WHERE {active.format("NEW.word_id")}
+            ON CONFLICT(user_id) DO NOTHING;
+            UPDATE word_stage_summary SET
+                {_stage_delta_sql("+", "NEW")}
+            WHERE user_id = NEW.user_id AND {active.format("NEW.word_id")};
+        END
+    """)
+    
+    # 単語が数える対象に入る（追加・廃止の取り消し）/ 外れる（削除・廃止）ときの処理
+    enter_body = f"""
+            UPDATE word_catalog_summary SET total_words = total_words + 1 WHERE id = 1;
+            INSERT INTO word_stage_summary (user_id)
+            SELECT user_id FROM word_progress WHERE word_id = NEW.word_id
+            ON CONFLICT(user_id) DO NOTHING;
+            UPDATE word_stage_summary SET
+                {_word_stage_delta_sql("+", "NEW.word_id")}
+            WHERE user_id IN (SELECT user_id FROM word_progress WHERE word_id = NEW.word_id);
+    """
+    leave_body = f"""
+            UPDATE word_catalog_summary SET total_words = total_words - 1 WHERE id = 1;
+            UPDATE word_stage_summary SET
+                {_word_stage_delta_sql("-", "OLD.word_id")}
+            WHERE user_id IN (SELECT user_id FROM word_progress WHERE word_id = OLD.word_id);
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER trg_words_insert_summary
+        AFTER INSERT ON words
+        WHEN NEW.retired = 0
+        BEGIN{enter_body}END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_words_delete_summary
+        AFTER DELETE ON words
+        WHEN OLD.retired = 0
+        BEGIN{leave_body}END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_words_retire_summary
+        AFTER UPDATE OF retired ON words
+        WHEN OLD.retired = 0 AND NEW.retired <> 0
+        BEGIN{leave_body}END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_words_restore_summary
+        AFTER UPDATE OF retired ON words
+        WHEN OLD.retired <> 0 AND NEW.retired = 0
+        BEGIN{enter_body}END
+    """)
+
+
+def _create_progress_summary_triggers(cursor, prefix="trg_word_progress", temp=False, when=None):
+    """
+    word_progress の変更を word_stage_summary に反映するトリガーを作る
+    （廃止されていない単語の進捗だけ数える）
+    
+    Args:
+        prefix: トリガー名の先頭
+        temp: True なら接続ごとの TEMP トリガーにする（コンテンツパック用。
+            本体の words の代わりに TEMP VIEW の words を見る）
+        when: 追加の発火条件
+    """
+    create = "CREATE TEMP TRIGGER" if temp else "CREATE TRIGGER"
+    table = "main.word_progress" if temp else "word_progress"
+    active = "EXISTS (SELECT 1 FROM words WHERE word_id = {} AND retired = 0)"
+    extra = f" AND {when}" if when else ""
+    cursor.execute(f"""
+        {create} {prefix}_insert_summary
+        AFTER INSERT ON {table}
+        WHEN {active.format("NEW.word_id")}{extra}
+        BEGIN
+            INSERT INTO word_stage_summary (user_id) VALUES (NEW.user_id)
+            ON CONFLICT(user_id) DO NOTHING;
+            UPDATE word_stage_summary SET
+                {_stage_delta_sql("+", "NEW")}
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    cursor.execute(f"""
+        {create} {prefix}_delete_summary
+        AFTER DELETE ON {table}
+        WHEN {active.format("OLD.word_id")}{extra}
+        BEGIN
+            UPDATE word_stage_summary SET
+                {_stage_delta_sql("-", "OLD")}
+            WHERE user_id = OLD.user_id;
+        END
+    """)
+    cursor.execute(f"""
+        {create} {prefix}_update_summary
+        AFTER UPDATE OF user_id, word_id, stage ON {table}
+        {f"WHEN {when}" if when else ""}
+        BEGIN
+            UPDATE word_stage_summary SET
+                {_stage_delta_sql("-", "OLD")}
+            WHERE user_id = OLD.user_id AND {active.format("OLD.word_id")};
+            INSERT INTO word_stage_summary (user_id)
+            SELECT NEW.user_id WHERE {active.format("NEW.word_id")}
+            ON CONFLICT(user_id) DO NOTHING;
+            UPDATE word_stage_summary SET
+                {_stage_delta_sql("+", "NEW")}
+            WHERE user_id = NEW.user_id AND {active.format("NEW.word_id")};
+        END
+    """)
+
+
+def _migrate_v7(cursor):
+    """
+    コンテンツパック（content_pack）用の状態テーブルを追加
+    
+    content_pack_state にはパックを使っている間だけ1行入る（パックのバージョン）。
+    その間、本体の words は使わないので、本体のトリガーでは進捗を数えず、
+    接続ごとの TEMP トリガー（create_pack_summary_triggers）で数える。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS content_pack_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            pack_version TEXT NOT NULL
+        )
+    """)
+    for trigger in (
+        "trg_word_progress_insert_summary",
+        "trg_word_progress_delete_summary",
+        "trg_word_progress_update_summary",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    _create_progress_summary_triggers(
+        cursor, when="NOT EXISTS (SELECT 1 FROM content_pack_state)"
+    )
+
+
+def _migrate_v8(cursor):
+    """
+    問題ごとの文法の進捗（grammar_question_progress）を追加
+    
+    grammar_progress はトピック単位のマスター度。出題の重み付け（grammar_sampler）には
+    問題ごとの正解・不正解・連続正解・最終回答日時を使う。
+    既存の回答は回答ログ（answer_events）から数えて入れておく
+    （grammar_service.rebuild_grammar_progress と同じ結果）。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS grammar_question_progress (
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            correct_count INTEGER NOT NULL DEFAULT 0,
+            wrong_count INTEGER NOT NULL DEFAULT 0,
+            correct_streak INTEGER NOT NULL DEFAULT 0,
+            last_answered_at TEXT,
+            PRIMARY KEY (user_id, question_id)
+        )
+    """)
+    
+    states: dict[tuple[int, int], list] = {}
+    cursor.execute("""
+        SELECT user_id, item_id, is_correct, answered_at
+        FROM answer_events
+        WHERE item_kind = 1
+        ORDER BY event_id
+    """)
+    for user_id, question_id, is_correct, answered_at in cursor.fetchall():
+        # [correct_count, wrong_count, correct_streak, answered_at]
+        state = states.setdefault((user_id, question_id), [0, 0, 0, 0])
+        if is_correct:
+            state[0] += 1
+            state[2] += 1
+        else:
+            state[1] += 1
+            state[2] = 0
+        state[3] = answered_at
+    cursor.executemany("""
+        INSERT INTO grammar_question_progress
+        (user_id, question_id, correct_count, wrong_count, correct_streak, last_answered_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (user_id, question_id, correct, wrong, streak,
+         datetime.fromtimestamp(answered_at / 1000).isoformat())
+        for (user_id, question_id), (correct, wrong, streak, answered_at) in states.items()
+    ])
+
+
+def _migrate_v9(cursor):
+    """
+    文法問題に answer_keys（採点で使う正解・別解の正規形。answer_normalizer）を追加
+    
+    値は教材のインポート時に入る。未設定の行は読み込み時に correct_answer から作る。
+    """
+    if not _column_exists(cursor, "grammar_questions", "answer_keys"):
+        cursor.execute("ALTER TABLE grammar_questions ADD COLUMN answer_keys TEXT")
+
+
+def _migrate_v10(cursor):
+    """
+    回答イベントに誤答の種類（error_kind）を追加
+    
+    単語のつづりの誤答の分類（vocabulary_index.ERROR_CODES）。正解・分類しない回答は NULL。
+    """
+    if not _column_exists(cursor, "answer_events", "error_kind"):
+        cursor.execute("ALTER TABLE answer_events ADD COLUMN error_kind INTEGER")
+
+
+def _migrate_v11(cursor):
+    """
+    紛らわしい単語のグラフ（word_confusables）を追加
+    
+    つづりが似ている・意味が同じ単語の組（confusable_words.build_edges）を両向きに入れる。
+    reason は confusable_words.REASON_* のビットの組み合わせ。
+    値は単語のインポート時に入る（既存の DB では import_words_from_json.py --force で作られる）。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS word_confusables (
+            word_id INTEGER NOT NULL,
+            other_word_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            reason INTEGER NOT NULL,
+            PRIMARY KEY (word_id, other_word_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migrate_v12(cursor):
+    """
+    本体の進捗集計トリガーの有効・無効を、接続ごとに切り替える
+    
+    v7 では content_pack_state に行がある（どこかの接続がパックを使っている）間は
+    本体のトリガーを止めていたが、パックを ATTACH していない接続（インポートスクリプトや
+    パックを開けなかった接続）の書き込みはどのトリガーにも数えられず、集計がずれていた。
+    その接続にパック（"content" スキーマ）が ATTACH されているかで切り替える
+    （ATTACH されている接続では TEMP トリガーが数える）。
+    """
+    for trigger in (
+        "trg_word_progress_insert_summary",
+        "trg_word_progress_delete_summary",
+        "trg_word_progress_update_summary",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    # 本体のトリガーから TEMP のオブジェクトは見えないので、接続の状態は pragma_database_list で見る
+    _create_progress_summary_triggers(
+        cursor,
+        when="NOT EXISTS (SELECT 1 FROM pragma_database_list WHERE name = 'content')",
+    )
+
+
+def create_pack_summary_triggers(cursor) -> None:
+    """コンテンツパックを ATTACH した接続に、進捗集計用の TEMP トリガーを作る"""
+    _create_progress_summary_triggers(cursor, prefix="trg_pack_word_progress", temp=True)
+
+
+def rebuild_word_summary(cursor) -> None:
+    """
+    word_catalog_summary / word_stage_summary を words と word_progress から作り直す
+    （コンテンツパックの切り替え時など。words はパックの TEMP VIEW でもよい）
+    """
+    cursor.execute("""
+        INSERT INTO word_catalog_summary (id, total_words)
+        SELECT 1, COUNT(*) FROM words WHERE retired = 0
+        ON CONFLICT(id) DO UPDATE SET total_words = excluded.total_words
+    """)
+    cursor.execute("DELETE FROM word_stage_summary")
+    cursor.execute("""
+        INSERT INTO word_stage_summary
+        (user_id, stage1_count, stage2_count, stage3_count, stage4_count)
+        SELECT
+            wp.user_id,
+            SUM(wp.stage <= 1),
+            SUM(wp.stage = 2),
+            SUM(wp.stage = 3),
+            SUM(wp.stage >= 4)
+        FROM word_progress wp
+        JOIN words w ON w.word_id = wp.word_id
+        WHERE w.retired = 0
+        GROUP BY wp.user_id
+    """)
+
+
+# (バージョン, マイグレーション関数) のリスト。バージョンは 1 から連番
+MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+    (7, _migrate_v7),
+    (8, _migrate_v8),
+    (9, _migrate_v9),
+    (10, _migrate_v10),
+    (11, _migrate_v11),
+    (12, _migrate_v12),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """DB のスキーマバージョン（PRAGMA user_version）を取得"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    未適用のマイグレーションを1トランザクションで適用する
+    
+    Args:
+        conn: DB 接続
+    
+    Returns:
+        適用したマイグレーションの数（最新なら 0）
+    """
+    # 高速パス: 最新なら PRAGMA 1回だけで終わる
+    if get_version(conn) >= LATEST_VERSION:
+        return 0
+    
+    cursor = conn.cursor()
+    # 他プロセスと同時に起動しても二重に適用しないよう、書き込みロックを取ってから読み直す
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        current = get_version(conn)
+        applied = 0
+        for version, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            migration(cursor)
+            applied += 1
+        if applied:
+            cursor.execute(f"PRAGMA user_version = {LATEST_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return applied
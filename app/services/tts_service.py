@@ -1,17 +1,61 @@
 """
 Windows SAPI による音声読み上げサービス
 完全オフライン対応
+
+音声は合成器（Synthesizer）で WAV に合成し、audio_cache のディスクキャッシュに
+(テキスト, ボイス, 速度) ごとに保存してから再生する。2回目以降は合成しない。
+合成器は差し替えられる（FakeSynthesizer は Windows 以外でキャッシュを試すためのもの）。
+
+音声パック（audio_pack.bin。scripts/build_audio_pack.py で作る）があれば、
+キャッシュより先にそこから取り出す（メモリマップなので合成もファイルの読み込みもない）。
+
+UI からは speak_async を使う。合成・再生は専用のワーカースレッド（PlaybackWorker）で行うので
+GUI スレッドは止まらない。新しい依頼は古い依頼を取り消す（単語が変わったときなど）。
 """
-from typing import Optional
+import array
+import atexit
+import hashlib
+import importlib.util
+import io
+import itertools
+import math
+import os
+import threading
+import time
+import wave
+from collections import deque
+from pathlib import Path
+from typing import Callable, Optional
+from app.services import db
+from app.services import audio_pack
+from app.services.audio_cache import AudioCache, MemoryAudioPool, make_key
 
-# SAPI SpVoice のインスタンスをキャッシュ
-_voice = None
+# 音声選択の候補リスト（表示名, voice ID）
+VOICE_CHOICES = [
+    ("Aria (US 女性)", "en-US-AriaNeural"),
+    ("Guy (US 男性)", "en-US-GuyNeural"),
+    ("Libby (UK 女性)", "en-GB-LibbyNeural"),
+]
 
-try:
-    import win32com.client
-    SAPI_AVAILABLE = True
-except ImportError:
-    SAPI_AVAILABLE = False
+# 合成器を選ぶ環境変数（"sapi" / "fake"。未設定なら SAPI が使えれば SAPI）
+TTS_BACKEND_ENV = "JHS_ENGLISH_TRAINER_TTS"
+
+# 合成する音声の形式（16kHz / 16bit / モノラル。単語の読み上げには十分で、ファイルが小さい）
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+# SAPI の SpeechAudioFormatType: SAFT16kHz16BitMono
+_SAPI_FORMAT_16KHZ_16BIT_MONO = 18
+
+# メモリ上に置いておく音声の合計サイズ（先に合成した出題候補・最近再生したもの）
+POOL_MAX_BYTES = 4 * 1024 * 1024
+
+# SAPI SpVoice のインスタンスをスレッドごとにキャッシュ（COM オブジェクトは作ったスレッドで使う）
+_local = threading.local()
+
+# win32com は読み込みに時間がかかるので、最初に音声を使うときに読み込む
+SAPI_AVAILABLE = importlib.util.find_spec("win32com") is not None
+if not SAPI_AVAILABLE:
     print("警告: win32com が利用できません。音声読み上げ機能は使用できません。")
 
 
@@ -25,6 +69,7 @@ def _create_voice():
     if not SAPI_AVAILABLE:
         raise RuntimeError("SAPI が利用できません")
     
+    import win32com.client
     voice = win32com.client.Dispatch("SAPI.SpVoice")
     
     try:
@@ -64,50 +109,513 @@ def _create_voice():
 
 def _get_voice():
     """
-    SAPI SpVoice のインスタンスを取得（キャッシュ済みの場合は再利用）
+    このスレッドの SAPI SpVoice のインスタンスを取得（キャッシュ済みの場合は再利用）
     
     Returns:
         win32com.client.Dispatch("SAPI.SpVoice") のインスタンス
     """
-    global _voice
-    if _voice is None:
-        _voice = _create_voice()
-    return _voice
+    voice = getattr(_local, "voice", None)
+    if voice is None:
+        voice = _local.voice = _create_voice()
+    return voice
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """16bit モノラルの PCM データに WAV ヘッダーを付ける"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(CHANNELS)
+        w.setsampwidth(SAMPLE_WIDTH)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class Synthesizer:
+    """
+    音声合成器のインターフェース
+    
+    synthesize は WAV（SAMPLE_RATE / 16bit / モノラル）のバイト列を返す。
+    """
+    
+    name = "base"
+    
+    def resolve_voice(self, voice: str) -> str:
+        """
+        キャッシュのキーに使うボイス名（実際に使われるボイス）
+        
+        SAPI のように指定を無視する合成器では、指定が違っても同じ音声になるので
+        実際のボイス名を返してキャッシュを共有する。
+        """
+        return voice
+    
+    def synthesize(self, text: str, voice: str, rate: int = 0) -> bytes:
+        raise NotImplementedError
+
+
+class SapiSynthesizer(Synthesizer):
+    """Windows SAPI でメモリ上に合成する"""
+    
+    name = "sapi"
+    
+    def resolve_voice(self, voice: str) -> str:
+        try:
+            return _get_voice().Voice.GetDescription()
+        except Exception:
+            return voice
+    
+    def synthesize(self, text: str, voice: str, rate: int = 0) -> bytes:
+        import win32com.client
+        sp_voice = _get_voice()
+        stream = win32com.client.Dispatch("SAPI.SpMemoryStream")
+        stream.Format.Type = _SAPI_FORMAT_16KHZ_16BIT_MONO
+        sp_voice.AudioOutputStream = stream
+        sp_voice.Rate = rate
+        sp_voice.Speak(text)
+        return pcm_to_wav(bytes(stream.GetData()))
+
+
+class FakeSynthesizer(Synthesizer):
+    """
+    決まった音（テキストから決まる高さの正弦波）を返す合成器（Windows 以外での確認・ベンチマーク用）
+    
+    同じ (テキスト, ボイス, 速度) なら同じバイト列になる。
+    """
+    
+    name = "fake"
+    
+    def __init__(self, delay_sec: float = 0.0, ms_per_char: int = 60):
+        """
+        Args:
+            delay_sec: 1回の合成にかける時間（SAPI の合成時間の代わり）
+            ms_per_char: 1文字あたりの音声の長さ
+        """
+        self.delay_sec = delay_sec
+        self.ms_per_char = ms_per_char
+        self.calls = 0
+        self._lock = threading.Lock()
+    
+    def synthesize(self, text: str, voice: str, rate: int = 0) -> bytes:
+        with self._lock:
+            self.calls += 1
+        if self.delay_sec:
+            time.sleep(self.delay_sec)
+        seed = hashlib.blake2b(f"{voice}|{text}".encode("utf-8"), digest_size=2).digest()
+        frequency = 220 + int.from_bytes(seed, "big") % 660
+        duration_ms = max(200, len(text) * self.ms_per_char) * 20 // (20 + rate)
+        n = SAMPLE_RATE * duration_ms // 1000
+        step = 2 * math.pi * frequency / SAMPLE_RATE
+        samples = array.array("h", (int(8000 * math.sin(i * step)) for i in range(n)))
+        return pcm_to_wav(samples.tobytes())
+
+
+# 再生（winsound は Windows のみ）
+PLAYBACK_AVAILABLE = importlib.util.find_spec("winsound") is not None
+
+_synthesizer: Synthesizer | None = None
+_synthesizer_ready = False
+_cache: AudioCache | None = None
+_cache_lock = threading.Lock()
+_pool = MemoryAudioPool(POOL_MAX_BYTES)
+_audio_pack: audio_pack.AudioPack | None = None
+_audio_pack_ready = False
+
+
+def _default_synthesizer() -> Synthesizer | None:
+    """環境変数・SAPI の有無から合成器を選ぶ"""
+    backend = os.getenv(TTS_BACKEND_ENV, "").lower()
+    if backend == "fake":
+        return FakeSynthesizer()
+    if SAPI_AVAILABLE:
+        return SapiSynthesizer()
+    return None
+
+
+def get_synthesizer() -> Synthesizer | None:
+    """使っている合成器（使えなければ None）"""
+    global _synthesizer, _synthesizer_ready
+    if not _synthesizer_ready:
+        _synthesizer = _default_synthesizer()
+        _synthesizer_ready = True
+    return _synthesizer
+
+
+def set_synthesizer(synthesizer: Synthesizer | None) -> None:
+    """合成器を差し替える（テスト・ベンチマーク用）"""
+    global _synthesizer, _synthesizer_ready
+    _synthesizer = synthesizer
+    _synthesizer_ready = True
+
+
+def get_cache_dir() -> str:
+    """音声キャッシュのフォルダ（app.db と同じフォルダの tts_cache）"""
+    return str(Path(db.get_db_path()).with_name("tts_cache"))
+
+
+def get_cache() -> AudioCache:
+    """音声キャッシュ（最初に使うときに index.json を読む）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache(get_cache_dir())
+            atexit.register(_cache.save_index)
+        return _cache
+
+
+def configure_cache(directory: str | None = None, max_bytes: int | None = None) -> AudioCache:
+    """
+    音声キャッシュの場所・上限を設定する
+    
+    Args:
+        directory: キャッシュのフォルダ。None なら get_cache_dir()
+        max_bytes: 合計サイズの上限。None なら既定値
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.save_index()
+        kwargs = {} if max_bytes is None else {"max_bytes": max_bytes}
+        _cache = AudioCache(directory or get_cache_dir(), **kwargs)
+        atexit.register(_cache.save_index)
+        return _cache
+
+
+def get_audio_pack() -> audio_pack.AudioPack | None:
+    """音声パック（最初に使うときに探してメモリマップする）。なければ None"""
+    global _audio_pack, _audio_pack_ready
+    with _cache_lock:
+        if not _audio_pack_ready:
+            _audio_pack_ready = True
+            path = audio_pack.find_pack()
+            if path is not None:
+                try:
+                    _audio_pack = audio_pack.AudioPack(path)
+                except audio_pack.AudioPackError as e:
+                    print(f"[TTSService] {e}")
+        return _audio_pack
+
+
+def set_audio_pack(path: str | None) -> None:
+    """
+    使う音声パックを指定する（None なら使わない）
+    
+    Raises:
+        audio_pack.AudioPackError: パックが読めない場合
+    """
+    global _audio_pack, _audio_pack_ready
+    pack = audio_pack.AudioPack(path) if path else None
+    with _cache_lock:
+        old = _audio_pack
+        _audio_pack = pack
+        _audio_pack_ready = True
+    if old is not None:
+        old.close()
+
+
+def get_audio(text: str, voice: str = "", rate: int = 0) -> bytes | None:
+    """
+    読み上げ音声（WAV）を取得する
+    
+    メモリ上のバッファ → 音声パック → ディスクキャッシュ → 合成 の順に探し、
+    キャッシュ・合成で取得したものはメモリ上のバッファにも置く。
+    
+    Returns:
+        WAV のバイト列。合成器が使えなければ None
+    """
+    synthesizer = get_synthesizer()
+    if synthesizer is None or not text:
+        return None
+    resolved = synthesizer.resolve_voice(voice)
+    key = make_key(text, resolved, rate)
+    data = _pool.get(key)
+    if data is None:
+        pack = get_audio_pack()
+        data = pack.get(key) if pack is not None else None
+        if data is None:
+            data = get_cache().get_or_create(text, resolved, rate, synthesizer.synthesize)
+            _pool.put(key, data)
+    return data
+
+
+def is_buffered(text: str, voice: str = "", rate: int = 0) -> bool:
+    """音声がメモリ上のバッファか音声パックにあるか（すぐ再生できるか）"""
+    synthesizer = get_synthesizer()
+    if synthesizer is None or not text:
+        return False
+    key = make_key(text, synthesizer.resolve_voice(voice), rate)
+    if key in _pool:
+        return True
+    pack = get_audio_pack()
+    return pack is not None and key in pack
+
+
+def get_pool() -> MemoryAudioPool:
+    """メモリ上の音声バッファ"""
+    return _pool
+
+
+def _play_wav(data: bytes) -> None:
+    """WAV を再生する（終わるまで戻らない）。再生できない環境では何もしない"""
+    if not PLAYBACK_AVAILABLE:
+        return
+    import winsound
+    winsound.PlaySound(data, winsound.SND_MEMORY)
+
+
+def _stop_playback() -> None:
+    """再生中の音を止める（別スレッドの PlaySound も止まる）"""
+    if not PLAYBACK_AVAILABLE:
+        return
+    import winsound
+    winsound.PlaySound(None, 0)
+
+
+def init_com():
+    """ワーカースレッドで SAPI（COM）を使えるようにする。戻り値の CoUninitialize() をスレッド終了時に呼ぶ。使えなければ None"""
+    if not SAPI_AVAILABLE:
+        return None
+    try:
+        import pythoncom
+        pythoncom.CoInitialize()
+        return pythoncom
+    except Exception:
+        return None
 
 
 def warmup() -> None:
-    """SAPIをあらかじめ初期化する。音は出さない。"""
+    """合成器と音声キャッシュをあらかじめ初期化する。音は出さない。"""
     try:
-        _ = _get_voice()
+        synthesizer = get_synthesizer()
+        if isinstance(synthesizer, SapiSynthesizer):
+            _ = _get_voice()
+        get_cache()
     except Exception:
         pass
 
 
-def speak(text: Optional[str]) -> None:
+def speak(text: Optional[str], voice: str = "", rate: int = 0) -> None:
     """
     渡されたテキストをその場で読み上げる（正解時に即時再生）。
     
     Args:
         text: 読み上げるテキスト（英語）
+        voice: ボイス（SAPI では未使用。キャッシュのキーには実際のボイスを使う）
+        rate: 読み上げ速度（SAPI の Rate。-10〜10）
     """
     if not text:
         return
     
     try:
-        voice = _get_voice()
-        voice.Speak(text)
+        audio = get_audio(text, voice, rate)
+        if audio is not None:
+            _play_wav(audio)
     except Exception:
         pass
 
 
+class _PlaybackRequest:
+    """再生依頼（kind は "speak" または "warmup"）"""
+    
+    __slots__ = ("request_id", "kind", "text", "voice", "rate", "on_done", "generation")
+    
+    def __init__(self, request_id, kind, text, voice, rate, on_done, generation):
+        self.request_id = request_id
+        self.kind = kind
+        self.text = text
+        self.voice = voice
+        self.rate = rate
+        self.on_done = on_done
+        self.generation = generation
+
+
+class PlaybackWorker:
+    """
+    音声の合成・再生を行う専用ワーカースレッド（UI 非依存）
+    
+    - speak() は依頼をキューに入れてすぐ戻る
+    - supersede=True（既定）の依頼は、それより前の依頼（待ち・再生中）を取り消す
+    - cancel() で待ち・再生中の依頼をすべて取り消す（タブ切り替え時など）
+    - 依頼が終わると on_done(request_id, completed) をワーカースレッドから呼ぶ
+      （completed は最後まで再生したら True、取り消し・失敗なら False）
+    
+    SAPI（COM）はこのスレッドだけで使う。
+    """
+    
+    def __init__(self, play: Callable[[bytes], None] | None = None,
+                 stop: Callable[[], None] | None = None):
+        """
+        Args:
+            play: WAV を再生する関数（終わるまで戻らない）。省略時は winsound
+            stop: 再生中の音を止める関数。省略時は winsound
+        """
+        self._play = play or _play_wav
+        self._stop = stop or _stop_playback
+        self._queue: deque[_PlaybackRequest] = deque()
+        self._ids = itertools.count(1)
+        # cancel / supersede のたびに増える。これより古い依頼は取り消し扱い
+        self._generation = 0
+        self._playing = False
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="TTSPlayback", daemon=True)
+        self._thread.start()
+    
+    def speak(
+        self,
+        text: str,
+        voice: str = "",
+        rate: int = 0,
+        on_done: Callable[[int, bool], None] | None = None,
+        supersede: bool = True,
+    ) -> int:
+        """
+        読み上げを依頼する（すぐ戻る）
+        
+        Returns:
+            依頼ID（on_done に渡される）
+        """
+        with self._cond:
+            if supersede:
+                self._cancel_locked()
+            request = _PlaybackRequest(
+                next(self._ids), "speak", text, voice, rate, on_done, self._generation
+            )
+            self._queue.append(request)
+            self._cond.notify()
+        return request.request_id
+    
+    def warmup(self) -> None:
+        """合成器・キャッシュの初期化をワーカースレッドで行う（取り消されない）"""
+        with self._cond:
+            self._queue.appendleft(
+                _PlaybackRequest(next(self._ids), "warmup", None, "", 0, None, None)
+            )
+            self._cond.notify()
+    
+    def cancel(self) -> None:
+        """待ち・再生中の依頼をすべて取り消す"""
+        with self._cond:
+            self._cancel_locked()
+    
+    def _cancel_locked(self) -> None:
+        # self._cond を保持した状態で呼ぶこと。
+        # 待ちの依頼はキューに残したまま取り消し扱いにし、on_done はワーカーから呼ぶ
+        self._generation += 1
+        if self._playing:
+            self._stop()
+    
+    def is_idle(self) -> bool:
+        """待ち・再生中の依頼がないか"""
+        with self._cond:
+            return not self._queue and not self._playing
+    
+    def shutdown(self) -> None:
+        """ワーカースレッドを停止する"""
+        with self._cond:
+            self._stopped = True
+            self._cancel_locked()
+            self._cond.notify()
+    
+    def _run(self) -> None:
+        """ワーカースレッド本体"""
+        com = init_com()
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopped and not self._queue:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    request = self._queue.popleft()
+                if request.kind == "warmup":
+                    warmup()
+                else:
+                    self._handle(request)
+        finally:
+            if com is not None:
+                com.CoUninitialize()
+    
+    def _is_current(self, request: _PlaybackRequest) -> bool:
+        return request.generation == self._generation and not self._stopped
+    
+    def _handle(self, request: _PlaybackRequest) -> None:
+        """1件の依頼を合成・再生する"""
+        completed = False
+        try:
+            with self._cond:
+                current = self._is_current(request)
+            audio = get_audio(request.text, request.voice, request.rate) if current else None
+            if audio is not None:
+                with self._cond:
+                    # 合成中に取り消されていたら再生しない
+                    current = self._is_current(request)
+                    self._playing = current
+                if current:
+                    self._play(audio)
+                    with self._cond:
+                        completed = self._is_current(request)
+        except Exception as e:
+            print(f"[TTSService] 再生エラー: {e}")
+        finally:
+            with self._cond:
+                self._playing = False
+        if request.on_done is not None:
+            try:
+                request.on_done(request.request_id, completed)
+            except Exception as e:
+                print(f"[TTSService] 完了通知エラー: {e}")
+
+
+_player: PlaybackWorker | None = None
+_player_lock = threading.Lock()
+
+
+def get_player() -> PlaybackWorker:
+    """共有の再生ワーカー（最初に使うときにスレッドを起動する）"""
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = PlaybackWorker()
+        return _player
+
+
+def speak_async(
+    text: Optional[str],
+    voice: str = "",
+    rate: int = 0,
+    on_done: Callable[[int, bool], None] | None = None,
+) -> int | None:
+    """
+    ワーカースレッドで読み上げる（すぐ戻る。前の読み上げは取り消す）
+    
+    Returns:
+        依頼ID。text が空なら None（on_done も呼ばない）
+    """
+    if not text:
+        return None
+    return get_player().speak(text, voice, rate, on_done)
+
+
+def cancel() -> None:
+    """待ち・再生中の読み上げを取り消す"""
+    if _player is not None:
+        _player.cancel()
+
+
+def warmup_async() -> None:
+    """合成器・キャッシュの初期化をワーカースレッドで行う（起動時に1回呼ぶ）"""
+    get_player().warmup()
+
+
 class TTSService:
     """
     後方互換性のためのラッパークラス
     """
     
-    def __init__(self, voice: str = "en-GB-LibbyNeural"):
+    def __init__(self, voice: str = "en-GB-LibbyNeural", rate: int = 0):
         # SAPI では voice パラメータは使用しないが、後方互換性のために保持
         self.voice = voice
+        self.rate = rate
 
     def set_voice(self, voice: str) -> None:
         """使用する TTS の voice を切り替える（SAPI では未使用だが後方互換性のため保持）。"""
@@ -123,9 +631,23 @@ class TTSService:
         """SAPIをあらかじめ初期化する（後方互換性のためのメソッド）。"""
         warmup()
 
+    def warmup_async(self) -> None:
+        """合成器・キャッシュの初期化をワーカースレッドで行う。"""
+        warmup_async()
+
     def speak(self, text: Optional[str]) -> None:
-        """テキストを音声で読み上げる（後方互換性のためのメソッド）。"""
-        speak(text)
+        """テキストを音声で読み上げる（終わるまで戻らない。後方互換性のためのメソッド）。"""
+        speak(text, self.voice, self.rate)
+
+    def speak_async(
+        self, text: Optional[str], on_done: Callable[[int, bool], None] | None = None
+    ) -> int | None:
+        """テキストをワーカースレッドで読み上げる（すぐ戻る）。"""
+        return speak_async(text, self.voice, self.rate, on_done)
+
+    def cancel(self) -> None:
+        """待ち・再生中の読み上げを取り消す。"""
+        cancel()
 
 
 # アプリ全体で共有して使うインスタンス（後方互換性のため）
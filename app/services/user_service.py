@@ -32,14 +32,13 @@ def create_user(name: str) -> Dict:
     created_at = datetime.now().isoformat()
     
     # ユーザーを追加
-    cursor.execute("""
-        INSERT INTO users (name, created_at)
-        VALUES (?, ?)
-    """, (name.strip(), created_at))
+    with conn:
+        cursor.execute("""
+            INSERT INTO users (name, created_at)
+            VALUES (?, ?)
+        """, (name.strip(), created_at))
     
     user_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
     
     # 追加されたユーザー情報を返す
     return {
@@ -67,7 +66,6 @@ def list_users() -> List[Dict]:
     """)
     
     rows = cursor.fetchall()
-    conn.close()
     
     # dict のリストに変換
     return [dict(row) for row in rows]
@@ -93,7 +91,6 @@ def get_user(user_id: int) -> Optional[Dict]:
     """, (user_id,))
     
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return dict(row)
@@ -115,13 +112,11 @@ def delete_user(user_id: int) -> None:
     conn = db.get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        DELETE FROM users
-        WHERE user_id = ?
-    """, (user_id,))
-    
-    conn.commit()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            DELETE FROM users
+            WHERE user_id = ?
+        """, (user_id,))
 
 
 def get_current_user_id() -> int:
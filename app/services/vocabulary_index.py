@@ -0,0 +1,187 @@
+"""
+単語のつづりの誤答を分類する語彙索引
+words.english（answer_normalizer.normalize した形）のハッシュ集合を持ち、
+誤答が「1文字ちがい」「となりの文字の入れ替え」「教材にある別の単語（weather / whether など）」
+「別の単語の1文字ちがい」「つづりの間違い」「関係のない解答」のどれかを判定する。
+
+別の単語に近いかどうかは、誤答から1回の編集（削除・入れ替え・置換・挿入）で作れる文字列を
+すべて作って集合を引く（件数は解答の長さ × 文字の種類程度）。
+単語数に比例する処理はないので、10 万語でも1回の判定は1ミリ秒かからない。
+
+分類は answer_events.error_kind に整数（ERROR_CODES）で保存する。
+"""
+from app.services import answer_normalizer
+
+
+# 誤答の種類
+ERROR_TYPO = "typo"                        # 1文字の脱字・余分な文字・打ち間違い
+ERROR_TRANSPOSITION = "transposition"      # となりの2文字の入れ替え
+ERROR_OTHER_WORD = "other_word"            # 教材にある別の単語そのもの
+ERROR_NEAR_OTHER_WORD = "near_other_word"  # 別の単語の1文字ちがい（正解よりそちらに近い）
+ERROR_MISSPELLING = "misspelling"          # 2文字以上のつづりの間違い
+ERROR_UNRELATED = "unrelated"              # 正解とも教材の単語とも離れている
+
+# answer_events.error_kind に保存する値（正解・未分類は NULL）
+ERROR_CODES = {
+    ERROR_TYPO: 1,
+    ERROR_TRANSPOSITION: 2,
+    ERROR_OTHER_WORD: 3,
+    ERROR_NEAR_OTHER_WORD: 4,
+    ERROR_MISSPELLING: 5,
+    ERROR_UNRELATED: 6,
+}
+
+
+def edit_distance(a: str, b: str, max_distance: int | None = None) -> int:
+    """
+    となりの入れ替えを1回と数える編集距離（OSA 距離）
+
+    Args:
+        max_distance: これを超えることが分かった時点で打ち切り、max_distance + 1 を返す
+    """
+    if a == b:
+        return 0
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if not a or not b:
+        return len(a) or len(b)
+
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, start=1):
+            value = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            )
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+    if max_distance is not None and previous[-1] > max_distance:
+        return max_distance + 1
+    return previous[-1]
+
+
+def is_transposition(a: str, b: str) -> bool:
+    """a が b のとなりの2文字を入れ替えただけのものか"""
+    if len(a) != len(b) or a == b:
+        return False
+    diff = [i for i, (ca, cb) in enumerate(zip(a, b)) if ca != cb]
+    return (
+        len(diff) == 2 and diff[1] == diff[0] + 1
+        and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    )
+
+
+def misspelling_limit(target: str) -> int:
+    """「つづりの間違い」とみなす距離の上限（長い単語ほど大きい）"""
+    return max(2, len(target) // 3)
+
+
+class VocabularyIndex:
+    """
+    教材の単語の索引（作ったあとは読み込み専用。複数のスレッドから使ってよい）
+    """
+
+    def __init__(self, words):
+        """
+        Args:
+            words: (english, japanese) のイテラブル
+        """
+        # 正規形 -> (english, japanese)
+        self._words: dict[str, tuple[str, str]] = {}
+        for english, japanese in words:
+            key = answer_normalizer.normalize(english)
+            if key:
+                self._words.setdefault(key, (english, japanese))
+        self._alphabet = "".join(sorted({c for key in self._words for c in key}))
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __contains__(self, text: str) -> bool:
+        return answer_normalizer.normalize(text) in self._words
+
+    def lookup(self, text: str) -> tuple[str, str] | None:
+        """教材の単語なら (english, japanese)"""
+        return self._words.get(answer_normalizer.normalize(text))
+
+    def _edits1(self, key: str):
+        """key から1回の編集で作れる文字列（重複を含む）"""
+        splits = [(key[:i], key[i:]) for i in range(len(key) + 1)]
+        for left, right in splits:
+            if right:
+                yield left + right[1:]
+                if len(right) > 1:
+                    yield left + right[1] + right[0] + right[2:]
+                for c in self._alphabet:
+                    if c != right[0]:
+                        yield left + c + right[1:]
+            for c in self._alphabet:
+                yield left + c + right
+
+    def neighbors(self, text: str) -> list[tuple[str, str]]:
+        """text から1回の編集で届く教材の単語（(english, japanese) のリスト）"""
+        key = answer_normalizer.normalize(text)
+        found = {}
+        for candidate in self._edits1(key):
+            word = self._words.get(candidate)
+            if word is not None and candidate != key:
+                found.setdefault(candidate, word)
+        return list(found.values())
+
+    def classify(self, answer: str, target: str) -> dict | None:
+        """
+        誤答を分類する
+
+        Args:
+            answer: 生徒の解答
+            target: 正解の英単語
+
+        Returns:
+            {"kind", "code", "distance", "confused_with", "confused_japanese"}。
+            正解（正規形が同じ）なら None
+        """
+        key = answer_normalizer.normalize(answer)
+        target_key = answer_normalizer.normalize(target)
+        if key == target_key:
+            return None
+
+        limit = misspelling_limit(target_key)
+        distance = edit_distance(key, target_key, limit)
+        confused = None
+
+        other = self._words.get(key)
+        if not key:
+            kind = ERROR_UNRELATED
+        elif other is not None:
+            kind = ERROR_OTHER_WORD
+            confused = other
+        elif is_transposition(key, target_key):
+            kind = ERROR_TRANSPOSITION
+        elif distance == 1:
+            kind = ERROR_TYPO
+        else:
+            # 正解より近い別の単語があるか（1文字ちがいまで）
+            near = [word for word in self.neighbors(key)
+                    if answer_normalizer.normalize(word[0]) != target_key]
+            if near:
+                kind = ERROR_NEAR_OTHER_WORD
+                confused = near[0]
+            elif distance <= limit:
+                kind = ERROR_MISSPELLING
+            else:
+                kind = ERROR_UNRELATED
+
+        return {
+            "kind": kind,
+            "code": ERROR_CODES[kind],
+            "distance": distance if distance <= limit else None,
+            "confused_with": confused[0] if confused else None,
+            "confused_japanese": confused[1] if confused else None,
+        }
@@ -0,0 +1,154 @@
+"""
+次の出題単語の先読みキュー
+ワーカースレッドで word_service.get_next_word を先に呼んでおき、
+次の問題を DB 待ちなしで表示できるようにする
+"""
+from collections import deque
+import threading
+from app.services import db
+from app.services import word_service
+
+
+# フィルタ条件 (grade_min, grade_max, unit, level_max)
+Filters = tuple[int | None, int | None, str | None, int | None]
+
+
+class WordPrefetchQueue:
+    """
+    先読みした出題単語を保持するキュー（UI 非依存）
+
+    - request_fill() でワーカースレッドが depth 件まで先読みする
+    - 回答を記録した単語は invalidate_word() で破棄する（スコアが変わるため）
+    - フィルタが変わったら clear() で全件破棄する
+    - 紛らわしい単語を続けて出せるよう、表示中の単語・キューの最後の単語を
+      get_next_word の previous に渡す（先読みしただけの単語は表示中とみなさない）
+    """
+
+    def __init__(self, user_id: int, depth: int = 3):
+        """
+        Args:
+            user_id: ユーザーID
+            depth: 先読みしておく単語数
+        """
+        self.user_id = user_id
+        self.depth = depth
+        self._queue: deque[dict] = deque()
+        self._filters: Filters | None = None
+        # いま表示している単語（キューが空のときの previous）
+        self._shown: dict | None = None
+        # clear / invalidate のたびに増える。計算中に変わった結果は捨てる
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._fill_requested = False
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="WordPrefetch", daemon=True
+        )
+        self._thread.start()
+
+    def request_fill(self, filters: Filters, shown: dict | None = None) -> None:
+        """
+        指定フィルタで depth 件まで先読みするようワーカーに依頼する（すぐ戻る）
+
+        Args:
+            filters: (grade_min, grade_max, unit, level_max)
+            shown: いま表示している単語（get_next_word の戻り値）
+        """
+        with self._cond:
+            if filters != self._filters:
+                self._reset(filters)
+            if shown is not None:
+                self._shown = shown
+            self._fill_requested = True
+            self._cond.notify()
+
+    def pop(self, filters: Filters) -> dict | None:
+        """
+        先読み済みの単語を1件取り出す（待たない）
+
+        Args:
+            filters: 現在のフィルタ。先読み時と違う場合はキューを破棄して None
+
+        Returns:
+            単語情報の辞書。先読みが間に合っていなければ None
+        """
+        with self._cond:
+            if filters != self._filters:
+                self._reset(filters)
+                return None
+            if not self._queue:
+                return None
+            self._shown = self._queue.popleft()
+            return self._shown
+
+    def peek(self) -> list[dict]:
+        """先読み済みの単語（次に出題する順）。取り出さない"""
+        with self._cond:
+            return list(self._queue)
+
+    def invalidate_word(self, word_id: int) -> None:
+        """回答を記録した単語の先読み結果を破棄する"""
+        with self._cond:
+            self._generation += 1
+            self._queue = deque(w for w in self._queue if w['word_id'] != word_id)
+
+    def clear(self) -> None:
+        """先読み結果をすべて破棄する（フィルタ変更時など）"""
+        with self._cond:
+            self._reset(self._filters)
+
+    def shutdown(self) -> None:
+        """ワーカースレッドを停止する"""
+        with self._cond:
+            self._stopped = True
+            self._queue.clear()
+            self._cond.notify()
+
+    def _reset(self, filters: Filters | None) -> None:
+        # self._cond を保持した状態で呼ぶこと
+        self._filters = filters
+        self._generation += 1
+        self._queue.clear()
+
+    def _run(self) -> None:
+        """ワーカースレッド本体"""
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopped and not self._fill_requested:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    self._fill_requested = False
+                self._fill()
+        finally:
+            # このスレッド専用の DB 接続を閉じる
+            db.close_connection()
+
+    def _fill(self) -> None:
+        """キューが depth 件になるまで先読みする"""
+        # 候補が少ないフィルタで同じ単語ばかり引いても止まるように試行回数を制限
+        for _ in range(self.depth * 3):
+            with self._cond:
+                if self._stopped or len(self._queue) >= self.depth:
+                    return
+                filters = self._filters
+                generation = self._generation
+                previous = self._queue[-1] if self._queue else self._shown
+
+            try:
+                word = word_service.get_next_word(self.user_id, *filters, previous=previous)
+            except Exception as e:
+                print(f"[WordPrefetch] 先読みエラー: {e}")
+                return
+            if word is None:
+                return
+
+            with self._cond:
+                if generation != self._generation:
+                    # 計算中にフィルタ変更・回答記録があったので捨てて取り直す
+                    continue
+                if any(w['word_id'] == word['word_id'] for w in self._queue):
+                    # 同じ単語が続けて出ないようにする
+                    continue
+                self._queue.append(word)
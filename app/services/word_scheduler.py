@@ -0,0 +1,400 @@
+"""
+単語出題スケジューラ（ユーザー・フィルタ単位のインメモリ優先度ヒープ）
+仕様: docs/spec_v1.md の優先度スコアに従う
+
+候補単語を一度だけ読み込み、優先度をインデックス付きヒープで保持する。
+回答後は該当単語のスコアだけを更新し、日付が変わったときだけ全件を再計算する。
+
+スコア計算のバックエンドは2種類:
+  "heap":  純Python のインデックス付きヒープ（WordScheduler）
+  "numpy": NumPy 配列でベクトル化したスコア計算（NumpyWordScheduler）
+"""
+from datetime import datetime, date
+import heapq
+import importlib.util
+import random
+
+# NumPy は読み込みに時間がかかるので、numpy バックエンドを使うときに読み込む
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+np = None
+
+
+def _load_numpy():
+    """NumPy を読み込む（2回目以降は読み込み済みのものを返す）"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+# 優先度スコアの定数
+STAGE_PENALTY = {1: 5, 2: 3, 3: 1, 4: 0}
+UNANSWERED_DAYS = 999  # 未回答の単語は優先度高
+TOP_N = 50  # 上位 N 件からランダムに選ぶ
+_EPOCH = date(1970, 1, 1)
+
+
+def parse_answered_date(last_answered_at: str | None) -> date | None:
+    """last_answered_at（ISO8601文字列）を日付に変換する。未回答なら None"""
+    if not last_answered_at:
+        return None
+    return datetime.fromisoformat(last_answered_at).date()
+
+
+def epoch_day(d: date) -> int:
+    """日付を 1970-01-01 からの日数（word_progress.last_answered_day の形式）に変換する"""
+    return (d - _EPOCH).days
+
+
+def days_since(last_date: date | None, today: date) -> int:
+    """最終回答日からの日数（最低1日）。未回答なら UNANSWERED_DAYS"""
+    if last_date is None:
+        return UNANSWERED_DAYS
+    return max(1, (today - last_date).days)
+
+
+def calc_priority(stage: int, total_wrong: int, correct_streak: int, days: int) -> float:
+    """
+    優先度スコアを計算する
+
+    priority = wrong_count * 3 + (1 / max(1, correct_streak)) * 4 + days * 1.5 + stage_penalty
+    """
+    correct_streak = max(1, correct_streak)
+    stage_penalty = STAGE_PENALTY.get(stage, 5)
+    return (
+        total_wrong * 3
+        + (1 / correct_streak) * 4
+        + days * 1.5
+        + stage_penalty
+    )
+
+
+class WordScheduler:
+    """
+    1ユーザー・1フィルタ条件ぶんの出題候補を保持するスケジューラ
+
+    ヒープは word_id のリストで、キーは (priority, -word_id)。
+    同点のときは word_id の小さい単語を優先する（従来のソート結果と同じ順序）。
+    """
+
+    def __init__(self, user_id: int, rows):
+        """
+        Args:
+            user_id: ユーザーID
+            rows: words LEFT JOIN word_progress の結果行
+                  （word_id, english, japanese, stage, total_wrong, correct_streak,
+                    avg_answer_time_sec, last_answered_at を含む）
+        """
+        self.user_id = user_id
+        self._today = date.today()
+        self._words: dict[int, dict] = {}
+        self._key: dict[int, tuple[float, int]] = {}
+        self._pos: dict[int, int] = {}
+        self._heap: list[int] = []
+
+        for row in rows:
+            word_id = row['word_id']
+            self._words[word_id] = {
+                'word_id': word_id,
+                'english': row['english'],
+                'japanese': row['japanese'],
+                'stage': row['stage'],
+                'total_wrong': row['total_wrong'],
+                'correct_streak': row['correct_streak'],
+                'avg_answer_time_sec': row['avg_answer_time_sec'],
+                'last_date': parse_answered_date(row['last_answered_at']),
+            }
+
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, word_id: int) -> bool:
+        return word_id in self._pos
+
+    # ---- スコア計算 ----
+
+    def _score(self, word: dict) -> tuple[float, int]:
+        priority = calc_priority(
+            word['stage'],
+            word['total_wrong'],
+            word['correct_streak'],
+            days_since(word['last_date'], self._today),
+        )
+        return (priority, -word['word_id'])
+
+    def _rebuild(self):
+        """全単語のスコアを再計算してヒープを作り直す（O(n)）"""
+        self._key = {word_id: self._score(word) for word_id, word in self._words.items()}
+        self._heap = list(self._words)
+        # 最大ヒープ化（末尾の親から順に sift down）
+        self._pos = {word_id: i for i, word_id in enumerate(self._heap)}
+        for i in reversed(range(len(self._heap) // 2)):
+            self._sift_down(i)
+
+    def _check_day(self):
+        """日付が変わっていれば全件を再スコアリングする"""
+        today = date.today()
+        if today != self._today:
+            self._today = today
+            self._rebuild()
+
+    # ---- インデックス付きヒープ操作 ----
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i]] = i
+        self._pos[heap[j]] = j
+
+    def _sift_up(self, i: int):
+        heap, key = self._heap, self._key
+        while i > 0:
+            parent = (i - 1) // 2
+            if key[heap[i]] <= key[heap[parent]]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        heap, key = self._heap, self._key
+        n = len(heap)
+        while True:
+            largest = i
+            left = 2 * i + 1
+            right = left + 1
+            if left < n and key[heap[left]] > key[heap[largest]]:
+                largest = left
+            if right < n and key[heap[right]] > key[heap[largest]]:
+                largest = right
+            if largest == i:
+                break
+            self._swap(i, largest)
+            i = largest
+
+    # ---- 公開 API ----
+
+    def top_candidates(self, n: int = TOP_N) -> list[dict]:
+        """
+        優先度の高い順に上位 n 件を返す（O(n log n) ではなく O(k log k)）
+
+        ヒープを壊さずに、子ノードを候補フロンティアに積みながら取り出す。
+        """
+        self._check_day()
+        heap, key = self._heap, self._key
+        if not heap:
+            return []
+
+        result = []
+        frontier = [(tuple(-k for k in key[heap[0]]), 0)]
+        while frontier and len(result) < n:
+            _, i = heapq.heappop(frontier)
+            result.append(self._words[heap[i]])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (tuple(-k for k in key[heap[child]]), child))
+        return result
+
+    def pick(self, top_n: int = TOP_N) -> dict | None:
+        """上位 top_n 件からランダムに1件選ぶ（完全に固定されないように）"""
+        candidates = self.top_candidates(top_n)
+        if not candidates:
+            return None
+        return random.choice(candidates)
+
+    def update(self, word_id: int, progress: dict):
+        """
+        回答後の進捗で1単語だけスコアを更新する（O(log n)）
+
+        Args:
+            word_id: 単語ID
+            progress: stage, total_wrong, correct_streak, avg_answer_time_sec,
+                      last_answered_at を含む辞書
+        """
+        if word_id not in self._pos:
+            return
+        self._check_day()
+
+        word = self._words[word_id]
+        word['stage'] = progress['stage']
+        word['total_wrong'] = progress['total_wrong']
+        word['correct_streak'] = progress['correct_streak']
+        word['avg_answer_time_sec'] = progress['avg_answer_time_sec']
+        word['last_date'] = parse_answered_date(progress['last_answered_at'])
+
+        old_key = self._key[word_id]
+        new_key = self._score(word)
+        self._key[word_id] = new_key
+
+        i = self._pos[word_id]
+        if new_key > old_key:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+
+class NumpyWordScheduler:
+    """
+    NumPy 版のスケジューラ（WordScheduler と同じインターフェース）
+
+    ステージ・不正解数・連続正解数・最終回答日を並列配列で保持し、
+    優先度は1本のベクトル式で計算する。上位 N 件は argpartition で取り出すので
+    全件ソートは行わない。結果（順序・同点時の扱い）は WordScheduler と同じ。
+    """
+
+    def __init__(self, user_id: int, rows):
+        """
+        Args:
+            user_id: ユーザーID
+            rows: words LEFT JOIN word_progress の結果行（word_id 昇順）
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy が利用できません")
+        _load_numpy()
+
+        self.user_id = user_id
+        self._today = date.today()
+
+        rows = list(rows)
+        self._english = [row['english'] for row in rows]
+        self._japanese = [row['japanese'] for row in rows]
+        self._index = {row['word_id']: i for i, row in enumerate(rows)}
+
+        self._word_ids = np.array([row['word_id'] for row in rows], dtype=np.int64)
+        self._stage = np.array([row['stage'] for row in rows], dtype=np.int64)
+        self._total_wrong = np.array([row['total_wrong'] for row in rows], dtype=np.int64)
+        self._correct_streak = np.array([row['correct_streak'] for row in rows], dtype=np.int64)
+        self._avg_time = np.array([row['avg_answer_time_sec'] for row in rows], dtype=np.float64)
+        # 未回答は -1
+        self._last_day = np.array(
+            [self._to_day(parse_answered_date(row['last_answered_at'])) for row in rows],
+            dtype=np.int64,
+        )
+
+        # ステージ → ペナルティの対応表（1〜4 以外は 5）
+        self._penalty_table = np.array(
+            [STAGE_PENALTY.get(stage, 5) for stage in range(5)], dtype=np.int64
+        )
+        self._priority = self._compute_all()
+
+    @staticmethod
+    def _to_day(d: date | None) -> int:
+        return -1 if d is None else epoch_day(d)
+
+    def __len__(self) -> int:
+        return len(self._word_ids)
+
+    def __contains__(self, word_id: int) -> bool:
+        return word_id in self._index
+
+    def _compute_all(self):
+        """全単語の優先度を1本のベクトル式で計算する（calc_priority と同じ評価順）"""
+        today = epoch_day(self._today)
+        days = np.where(
+            self._last_day < 0,
+            UNANSWERED_DAYS,
+            np.maximum(1, today - self._last_day),
+        )
+        stage = self._stage
+        valid_stage = (stage >= 1) & (stage <= 4)
+        penalty = np.where(valid_stage, self._penalty_table[np.clip(stage, 0, 4)], 5)
+        return (
+            self._total_wrong * 3
+            + (1 / np.maximum(1, self._correct_streak)) * 4
+            + days * 1.5
+            + penalty
+        )
+
+    def _check_day(self):
+        """日付が変わっていれば全件を再スコアリングする"""
+        today = date.today()
+        if today != self._today:
+            self._today = today
+            self._priority = self._compute_all()
+
+    def _word(self, i: int) -> dict:
+        return {
+            'word_id': int(self._word_ids[i]),
+            'english': self._english[i],
+            'japanese': self._japanese[i],
+            'stage': int(self._stage[i]),
+            'total_wrong': int(self._total_wrong[i]),
+            'correct_streak': int(self._correct_streak[i]),
+            'avg_answer_time_sec': float(self._avg_time[i]),
+        }
+
+    def top_candidates(self, n: int = TOP_N) -> list[dict]:
+        """優先度の高い順に上位 n 件を返す（同点は word_id の小さい順）"""
+        self._check_day()
+        priority = self._priority
+        total = len(priority)
+        if total == 0 or n <= 0:
+            return []
+
+        k = min(n, total)
+        if k < total:
+            part = np.argpartition(-priority, k - 1)[:k]
+            threshold = priority[part].min()
+            # 境界の同点は word_id の小さい方を採用（配列は word_id 昇順）
+            above = np.flatnonzero(priority > threshold)
+            ties = np.flatnonzero(priority == threshold)
+            selected = np.concatenate([above, ties[:k - len(above)]])
+        else:
+            selected = np.arange(total)
+
+        order = np.lexsort((self._word_ids[selected], -priority[selected]))
+        return [self._word(int(i)) for i in selected[order]]
+
+    def pick(self, top_n: int = TOP_N) -> dict | None:
+        """上位 top_n 件からランダムに1件選ぶ（完全に固定されないように）"""
+        candidates = self.top_candidates(top_n)
+        if not candidates:
+            return None
+        return random.choice(candidates)
+
+    def update(self, word_id: int, progress: dict):
+        """回答後の進捗で配列を書き換え、その単語の優先度だけ再計算する"""
+        i = self._index.get(word_id)
+        if i is None:
+            return
+        self._check_day()
+
+        self._stage[i] = progress['stage']
+        self._total_wrong[i] = progress['total_wrong']
+        self._correct_streak[i] = progress['correct_streak']
+        self._avg_time[i] = progress['avg_answer_time_sec']
+        last_date = parse_answered_date(progress['last_answered_at'])
+        self._last_day[i] = self._to_day(last_date)
+        self._priority[i] = calc_priority(
+            progress['stage'],
+            progress['total_wrong'],
+            progress['correct_streak'],
+            days_since(last_date, self._today),
+        )
+
+
+# バックエンド名 → スケジューラクラス
+SCHEDULER_BACKENDS = {
+    "heap": WordScheduler,
+    "numpy": NumpyWordScheduler,
+}
+
+
+def create_scheduler(backend: str, user_id: int, rows):
+    """
+    指定バックエンドのスケジューラを生成する
+
+    Args:
+        backend: "heap" または "numpy"
+        user_id: ユーザーID
+        rows: words LEFT JOIN word_progress の結果行
+
+    Raises:
+        ValueError: 未知のバックエンドの場合
+    """
+    scheduler_class = SCHEDULER_BACKENDS.get(backend)
+    if scheduler_class is None:
+        raise ValueError(f"未知のスケジューラバックエンドです: {backend}")
+    return scheduler_class(user_id, rows)
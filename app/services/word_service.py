@@ -5,58 +5,105 @@
 from datetime import datetime, date
 import random
 import sqlite3
+import threading
 from app.services import db
+from app.services import answer_buffer
+from app.services import answer_log
+from app.services import answer_normalizer
+from app.services import content_pack
+from app.services import vocabulary_index
+from app.services import word_scheduler
+from app.services.word_scheduler import TOP_N, UNANSWERED_DAYS, epoch_day
 
 
-def get_next_word(
-    user_id: int = 1,
-    grade_min: int | None = None,
-    grade_max: int | None = None,
-    unit: str | None = None,
-    level_max: int | None = None,
-) -> dict | None:
+# 出題単語の選び方
+#   "scheduler": インメモリの優先度ヒープ（word_scheduler）
+#   "sql":       優先度を SQLite 内で計算し、上位 TOP_N 件だけを取得
+SELECTION_MODES = ("scheduler", "sql")
+_selection_mode = "scheduler"
+
+# "scheduler" モードのスコア計算バックエンド（"heap" または "numpy"）
+_scheduler_backend = "heap"
+
+# ユーザー・フィルタ条件ごとの出題スケジューラ
+# キー: (user_id, grade_min, grade_max, unit, level_max)
+_schedulers: dict[tuple, object] = {}
+_scheduler_lock = threading.RLock()
+# スケジューラを作ったときの教材（content_pack.generation, content_pack.content_version）
+_scheduler_content = None
+# 破棄（invalidate_schedulers など）のたびに増える。読み込み中に破棄されたスケジューラは登録しない
+_scheduler_generation = 0
+# 読み込み中のスケジューラのキー -> 読み込み中に記録した回答 [(word_id, 進捗), ...]
+_loading: dict[tuple, list] = {}
+
+# 誤答の分類に使う語彙索引と、それを作ったときの教材のバージョン（content_pack.content_version）
+_vocabulary: vocabulary_index.VocabularyIndex | None = None
+_vocabulary_version = None
+_vocabulary_lock = threading.Lock()
+
+# 紛らわしい単語を続けて出すかどうか（word_confusables）
+_interleave_confusables = True
+# word_id -> 紛らわしい単語の word_id（スコアの高い順）と、それを読んだときの教材
+# （content_pack.generation, content_pack.content_version）
+_confusables: dict[int, tuple[int, ...]] | None = None
+_confusables_version = None
+_confusables_lock = threading.Lock()
+
+
+def _build_word_filter(
+    grade_min: int | None,
+    grade_max: int | None,
+    unit: str | None,
+    level_max: int | None,
+) -> tuple[str, list]:
     """
-    次の出題単語を取得（優先度スコアに基づく）
-    
-    Args:
-        user_id: ユーザーID（デフォルト: 1）
-        grade_min: 最小学年（None の場合は制限なし）
-        grade_max: 最大学年（None の場合は制限なし）
-        unit: ユニット名（None の場合は制限なし）
-        level_max: 最大レベル（None の場合は制限なし）
+    学年・ユニット・レベルのフィルタから WHERE 句とパラメータを組み立てる
     
     Returns:
-        単語情報とステージ情報を含む辞書、該当単語がなければ None
+        (where_clause, params) のタプル
     """
+    # 教材から外れた（廃止された）単語は出題しない
+    where_conditions = ["w.retired = 0"]
+    params = []
+    
+    if grade_min is not None:
+        where_conditions.append("w.grade >= ?")
+        params.append(grade_min)
+    
+    if grade_max is not None:
+        where_conditions.append("w.grade <= ?")
+        params.append(grade_max)
+    
+    if unit is not None:
+        where_conditions.append("w.unit = ?")
+        params.append(unit)
+    
+    if level_max is not None:
+        where_conditions.append("w.level <= ?")
+        params.append(level_max)
+    
+    where_clause = "WHERE " + " AND ".join(where_conditions)
+    
+    return where_clause, params
+
+
+def _load_candidates(
+    user_id: int,
+    grade_min: int | None,
+    grade_max: int | None,
+    unit: str | None,
+    level_max: int | None,
+) -> list:
+    """フィルタに合う全単語とその進捗を取得"""
+    # 書き込み待ちの回答があれば先に反映しておく
+    answer_buffer.flush()
+    
     conn = db.get_connection()
     cursor = conn.cursor()
     
     try:
-        # WHERE句を構築
-        where_conditions = []
-        params = [user_id]
-        
-        if grade_min is not None:
-            where_conditions.append("w.grade >= ?")
-            params.append(grade_min)
+        where_clause, filter_params = _build_word_filter(grade_min, grade_max, unit, level_max)
         
-        if grade_max is not None:
-            where_conditions.append("w.grade <= ?")
-            params.append(grade_max)
-        
-        if unit is not None:
-            where_conditions.append("w.unit = ?")
-            params.append(unit)
-        
-        if level_max is not None:
-            where_conditions.append("w.level <= ?")
-            params.append(level_max)
-        
-        where_clause = ""
-        if where_conditions:
-            where_clause = "WHERE " + " AND ".join(where_conditions)
-        
-        # 全単語とその進捗を取得
         query = f"""
             SELECT 
                 w.word_id,
@@ -74,77 +121,249 @@ def get_next_word(
             ORDER BY w.word_id
         """
         
-        cursor.execute(query, tuple(params))
-        
-        words = cursor.fetchall()
+        cursor.execute(query, tuple([user_id] + filter_params))
+        return cursor.fetchall()
     except sqlite3.OperationalError as e:
         # テーブルが存在しない場合
-        conn.close()
         raise RuntimeError(f"データベーステーブルが存在しません。先にデータをインポートしてください: {e}")
+
+
+def _get_scheduler(
+    user_id: int,
+    grade_min: int | None,
+    grade_max: int | None,
+    unit: str | None,
+    level_max: int | None,
+):
+    """
+    ユーザー・フィルタ単位のスケジューラを取得（初回のみ DB から読み込む）
     
-    if not words:
-        conn.close()
-        return None
+    読み込み（バッファの反映 + 候補の全件取得）は _scheduler_lock の外で行う
+    （先読みワーカーが読み込んでいる間も、GUI スレッドの record_answer を待たせない）。
+    読み込み中に記録された回答は、登録するときにスケジューラへ反映する。
+    """
+    key = (user_id, grade_min, grade_max, unit, level_max)
+    with _scheduler_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is not None:
+            return scheduler
+        updates = _loading.setdefault(key, [])
+        generation = _scheduler_generation
+        backend = _scheduler_backend
     
-    # 優先度スコアを計算
-    today = date.today()
-    word_scores = []
+    try:
+        rows = _load_candidates(user_id, grade_min, grade_max, unit, level_max)
+        loaded = word_scheduler.create_scheduler(backend, user_id, rows)
+    except BaseException:
+        with _scheduler_lock:
+            if _loading.get(key) is updates:
+                del _loading[key]
+        raise
     
-    for word in words:
-        stage = word['stage']
-        wrong_count = word['total_wrong']
-        correct_streak = max(1, word['correct_streak'])
-        last_answered = word['last_answered_at']
-        
-        # 日数計算
-        if last_answered:
-            last_date = datetime.fromisoformat(last_answered).date()
-            days = max(1, (today - last_date).days)
-        else:
-            days = 999  # 未回答の単語は優先度高
-        
-        # ステージペナルティ
-        stage_penalty = {1: 5, 2: 3, 3: 1, 4: 0}.get(stage, 5)
-        
-        # 優先度スコア計算
-        priority = (
-            wrong_count * 3
-            + (1 / correct_streak) * 4
-            + days * 1.5
-            + stage_penalty
-        )
-        
-        word_scores.append((priority, word))
+    with _scheduler_lock:
+        for word_id, progress in updates:
+            loaded.update(word_id, progress)
+        if _loading.get(key) is updates:
+            del _loading[key]
+        # 別のスレッドが先に登録していればそれを使う
+        scheduler = _schedulers.get(key)
+        if scheduler is not None:
+            return scheduler
+        if generation == _scheduler_generation:
+            _schedulers[key] = loaded
+        return loaded
+
+
+def _check_content_version(conn) -> None:
+    """
+    教材が変わっていれば、キャッシュ済みのスケジューラを捨てる（grammar_service と同じ判定）
     
-    # 優先度が高い順にソート（ランダム要素を追加）
-    word_scores.sort(key=lambda x: x[0], reverse=True)
+    同期で廃止・変更された単語や、切り替える前のパックの単語を出さないようにする。
+    """
+    global _scheduler_content
+    content = (content_pack.generation(), content_pack.content_version(conn))
+    with _scheduler_lock:
+        if content != _scheduler_content:
+            _scheduler_content = content
+            invalidate_schedulers()
+
+
+def invalidate_schedulers(user_id: int | None = None) -> None:
+    """
+    キャッシュ済みのスケジューラを破棄する（単語データを入れ替えたときなど）
     
-    # 上位50件からランダムに選択（完全に固定されないように）
-    TOP_N = 50
-    top_n = min(TOP_N, len(word_scores))
-    if top_n > 0:
-        selected = random.choice(word_scores[:top_n])[1]
-    else:
-        # フォールバック（万一候補ゼロなら完全ランダムで1件）
-        cursor.execute("SELECT word_id, english, japanese FROM words ORDER BY RANDOM() LIMIT 1")
-        fallback_row = cursor.fetchone()
-        if fallback_row:
-            # フォールバック用の辞書形式に変換
-            selected = {
-                'word_id': fallback_row['word_id'],
-                'english': fallback_row['english'],
-                'japanese': fallback_row['japanese'],
-                'stage': 1,
-                'correct_streak': 0,
-                'avg_answer_time_sec': 0.0
-            }
+    Args:
+        user_id: 指定した場合はそのユーザーの分だけ破棄する
+    """
+    global _scheduler_generation
+    with _scheduler_lock:
+        _scheduler_generation += 1
+        if user_id is None:
+            _schedulers.clear()
         else:
-            conn.close()
-            return None
+            for key in [k for k in _schedulers if k[0] == user_id]:
+                del _schedulers[key]
+
+
+def set_selection_mode(mode: str) -> None:
+    """
+    出題単語の選び方を切り替える
+    
+    Args:
+        mode: "scheduler" または "sql"
+    
+    Raises:
+        ValueError: 未知のモードの場合
+    """
+    global _selection_mode
+    if mode not in SELECTION_MODES:
+        raise ValueError(f"未知の出題モードです: {mode}")
+    _selection_mode = mode
+
+
+def get_selection_mode() -> str:
+    """現在の出題モードを取得"""
+    return _selection_mode
+
+
+def set_scheduler_backend(backend: str) -> None:
+    """
+    スケジューラのスコア計算バックエンドを切り替える
+    
+    切り替えるとキャッシュ済みのスケジューラは破棄され、次回出題時に読み込み直す。
+    
+    Args:
+        backend: "heap"（純Python）または "numpy"
+    
+    Raises:
+        ValueError: 未知のバックエンドの場合
+        RuntimeError: "numpy" を指定したが NumPy が利用できない場合
+    """
+    global _scheduler_backend
+    if backend not in word_scheduler.SCHEDULER_BACKENDS:
+        raise ValueError(f"未知のスケジューラバックエンドです: {backend}")
+    if backend == "numpy" and not word_scheduler.NUMPY_AVAILABLE:
+        raise RuntimeError("NumPy が利用できません")
+    with _scheduler_lock:
+        _scheduler_backend = backend
+        invalidate_schedulers()
+
+
+def set_confusable_interleaving(enabled: bool) -> None:
+    """紛らわしい単語を続けて出すかどうかを切り替える（シミュレーションの比較用など）"""
+    global _interleave_confusables
+    _interleave_confusables = enabled
+
+
+def get_confusables() -> dict[int, tuple[int, ...]]:
+    """
+    紛らわしい単語のグラフ（教材が変わったときだけ読み直す）
+    
+    Returns:
+        {word_id: 紛らわしい単語の word_id のタプル（スコアの高い順）}
+    """
+    global _confusables, _confusables_version
+    conn = db.get_connection()
+    # このプロセスのインポート（generation）と、別のプロセスの同期（content_version）
+    version = (content_pack.generation(), content_pack.content_version(conn))
+    with _confusables_lock:
+        if _confusables is None or version != _confusables_version:
+            graph: dict[int, list[int]] = {}
+            for word_id, other_word_id in conn.execute("""
+                SELECT word_id, other_word_id FROM word_confusables
+                ORDER BY word_id, score DESC, other_word_id
+            """):
+                graph.setdefault(word_id, []).append(other_word_id)
+            _confusables = {word_id: tuple(others) for word_id, others in graph.items()}
+            _confusables_version = version
+        return _confusables
+
+
+def _choose_candidate(candidates, previous: dict | None) -> tuple[dict, bool]:
+    """
+    上位候補から出題する1件を選ぶ
+    
+    直前の単語と紛らわしい単語が候補にあれば、それを続けて出す（見比べさせるため）。
+    続けて出した単語からはさらに続けない（紛らわしい単語ばかりが連鎖しないように）。
+    候補の外からは選ばないので、優先度の順位は崩れない。
+    
+    Args:
+        candidates: 上位候補
+        previous: 直前に出した単語（get_next_word の戻り値）。なければ None
+    
+    Returns:
+        (選んだ候補, 紛らわしい単語として続けて選んだか)
+    """
+    if _interleave_confusables and previous is not None and not previous.get('interleaved'):
+        partners = get_confusables().get(previous['word_id'])
+        if partners:
+            by_id = {row['word_id']: row for row in candidates}
+            selected = next((by_id[w] for w in partners if w in by_id), None)
+            if selected is not None:
+                return selected, True
+    return random.choice(candidates), False
+
+
+def _fetch_top_candidates_sql(
+    user_id: int,
+    grade_min: int | None,
+    grade_max: int | None,
+    unit: str | None,
+    level_max: int | None,
+    limit: int = TOP_N,
+) -> list:
+    """
+    優先度スコアを SQLite 内で計算し、上位 limit 件だけを取得する
+    
+    word_progress.last_answered_day（1970-01-01 からの日数）を使うので、
+    日付文字列の変換は行わない。
+    """
+    # 書き込み待ちの回答があれば先に反映しておく
+    answer_buffer.flush()
     
-    conn.close()
+    conn = db.get_connection()
+    cursor = conn.cursor()
     
-    # ステージに応じたヒントを生成
+    try:
+        where_clause, filter_params = _build_word_filter(grade_min, grade_max, unit, level_max)
+        
+        # 式は word_scheduler.calc_priority と同じ評価順（浮動小数点の結果を揃えるため）
+        query = f"""
+            SELECT 
+                w.word_id,
+                w.english,
+                w.japanese,
+                COALESCE(wp.stage, 1) as stage,
+                COALESCE(wp.correct_streak, 0) as correct_streak,
+                COALESCE(wp.avg_answer_time_sec, 0.0) as avg_answer_time_sec,
+                COALESCE(wp.total_wrong, 0) * 3
+                + (1.0 / MAX(1, COALESCE(wp.correct_streak, 0))) * 4
+                + (CASE
+                       WHEN wp.last_answered_day IS NULL THEN ?
+                       ELSE MAX(1, ? - wp.last_answered_day)
+                   END) * 1.5
+                + (CASE COALESCE(wp.stage, 1)
+                       WHEN 1 THEN 5 WHEN 2 THEN 3 WHEN 3 THEN 1 WHEN 4 THEN 0
+                       ELSE 5
+                   END) as priority
+            FROM words w
+            LEFT JOIN word_progress wp ON w.word_id = wp.word_id AND wp.user_id = ?
+            {where_clause}
+            ORDER BY priority DESC, w.word_id
+            LIMIT ?
+        """
+        
+        today = epoch_day(date.today())
+        params = [UNANSWERED_DAYS, today, user_id] + filter_params + [limit]
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+    except sqlite3.OperationalError as e:
+        # テーブル（または last_answered_day 列）が存在しない場合
+        raise RuntimeError(f"データベーステーブルが存在しません。先にデータをインポートしてください: {e}")
+
+
+def _make_question(selected: dict, interleaved: bool = False) -> dict:
+    """選ばれた単語から出題用の辞書（ステージに応じたヒント付き）を作る"""
     english = selected['english']
     stage = selected['stage']
     
@@ -166,38 +385,137 @@ def get_next_word(
         'japanese': selected['japanese'],
         'stage': stage,
         'hint': hint,
+        # 採点で比べる正規形（answer_normalizer.is_match に渡す）
+        'answer_keys': frozenset(answer_normalizer.accepted_keys(english)),
         'correct_streak': selected['correct_streak'],
-        'avg_answer_time_sec': selected['avg_answer_time_sec']
+        'avg_answer_time_sec': selected['avg_answer_time_sec'],
+        # 直前の単語と紛らわしい単語として続けて出したか（この次は続けない）
+        'interleaved': interleaved,
     }
 
 
-def record_answer(user_id: int, word_id: int, is_correct: bool, answer_time_sec: float):
+def get_next_word(
+    user_id: int = 1,
+    grade_min: int | None = None,
+    grade_max: int | None = None,
+    unit: str | None = None,
+    level_max: int | None = None,
+    previous: dict | None = None,
+) -> dict | None:
     """
-    回答を記録し、ステージを更新
+    次の出題単語を取得（優先度スコアに基づく）
+    
+    候補はユーザー・フィルタごとのスケジューラ（word_scheduler.WordScheduler）に
+    保持され、毎回の全件スキャン＆ソートは行わない。教材が変わったら作り直す。
+    set_selection_mode("sql") の場合は SQLite 内で優先度を計算する。
+    previous の単語と紛らわしい単語（word_confusables）が上位候補にあれば、それを続けて出す。
+    直前の単語は呼び出し側が渡す（先読みで選んだだけでまだ出していない単語と区別するため）。
     
     Args:
-        user_id: ユーザーID
-        word_id: 単語ID
-        is_correct: 正解かどうか
-        answer_time_sec: 回答時間（秒）
+        user_id: ユーザーID（デフォルト: 1）
+        grade_min: 最小学年（None の場合は制限なし）
+        grade_max: 最大学年（None の場合は制限なし）
+        unit: ユニット名（None の場合は制限なし）
+        level_max: 最大レベル（None の場合は制限なし）
+        previous: 直前に出した単語（get_next_word の戻り値）。None なら続けて出さない
+    
+    Returns:
+        単語情報とステージ情報を含む辞書、該当単語がなければ None
     """
-    conn = db.get_connection()
-    cursor = conn.cursor()
+    if _selection_mode == "sql":
+        # 上位50件だけを SQLite から受け取り、その中からランダムに選択
+        rows = _fetch_top_candidates_sql(user_id, grade_min, grade_max, unit, level_max)
+        if not rows:
+            return None
+        selected, interleaved = _choose_candidate(rows, previous)
+        return _make_question(dict(selected), interleaved)
     
-    try:
-        # 現在の進捗を取得
-        cursor.execute("""
-            SELECT stage, total_correct, total_wrong, correct_streak, avg_answer_time_sec
-            FROM word_progress
-            WHERE user_id = ? AND word_id = ?
-        """, (user_id, word_id))
-        
-        progress = cursor.fetchone()
-    except sqlite3.OperationalError as e:
-        # テーブルが存在しない場合
-        conn.close()
-        raise RuntimeError(f"データベーステーブルが存在しません。先にデータをインポートしてください: {e}")
+    _check_content_version(db.get_connection())
+    scheduler = _get_scheduler(user_id, grade_min, grade_max, unit, level_max)
+    with _scheduler_lock:
+        # 上位50件からランダムに選択（完全に固定されないように）。
+        # 候補の行は record_answer で書き換わるので、ロックの中で写しておく
+        candidates = [dict(row) for row in scheduler.top_candidates(TOP_N)]
+    if not candidates:
+        return None
+    selected, interleaved = _choose_candidate(candidates, previous)
+    
+    return _make_question(selected, interleaved)
+
+
+def get_upcoming_words(
+    user_id: int = 1,
+    grade_min: int | None = None,
+    grade_max: int | None = None,
+    unit: str | None = None,
+    level_max: int | None = None,
+    limit: int = TOP_N,
+) -> list[dict]:
+    """
+    次に出題されそうな単語（出題候補の上位 limit 件、優先度の高い順）
+    
+    get_next_word はこの中からランダムに選ぶ。音声の先読みなどに使う（出題状態は変えない）。
+    
+    Returns:
+        [{"word_id", "english", "stage"}, ...]
+    """
+    if _selection_mode == "sql":
+        rows = _fetch_top_candidates_sql(user_id, grade_min, grade_max, unit, level_max, limit)
+    else:
+        _check_content_version(db.get_connection())
+        scheduler = _get_scheduler(user_id, grade_min, grade_max, unit, level_max)
+        with _scheduler_lock:
+            rows = scheduler.top_candidates(limit)
+    return [
+        {'word_id': row['word_id'], 'english': row['english'], 'stage': row['stage']}
+        for row in rows
+    ]
+
+
+def peek_upcoming_words(
+    user_id: int = 1,
+    grade_min: int | None = None,
+    grade_max: int | None = None,
+    unit: str | None = None,
+    level_max: int | None = None,
+    limit: int = TOP_N,
+) -> list[dict]:
+    """
+    get_upcoming_words のうち、作成済みのスケジューラから分かる分だけ（DB は読まない）
+    
+    スケジューラがまだない・"sql" モードの場合は空のリスト。
+    GUI スレッドから音声の先読みの一覧を作るときに使う（バッファの反映・スケジューラの読み込みをしない）。
     
+    Returns:
+        [{"word_id", "english", "stage"}, ...]
+    """
+    if _selection_mode == "sql":
+        return []
+    with _scheduler_lock:
+        scheduler = _schedulers.get((user_id, grade_min, grade_max, unit, level_max))
+        if scheduler is None:
+            return []
+        return [
+            {'word_id': row['word_id'], 'english': row['english'], 'stage': row['stage']}
+            for row in scheduler.top_candidates(limit)
+        ]
+
+
+def apply_answer(progress, is_correct: bool, answer_time_sec: float) -> dict:
+    """
+    回答1件ぶんのステージ・回数の更新を計算する（DB には触れない）
+    
+    record_answer と、イベントログからの作り直し（rebuild_word_progress）で共通に使う。
+    
+    Args:
+        progress: 現在の進捗（stage, total_correct, total_wrong, correct_streak,
+                  avg_answer_time_sec を含む）。未回答なら None
+        is_correct: 正解かどうか
+        answer_time_sec: 回答時間（秒）
+    
+    Returns:
+        更新後の stage, total_correct, total_wrong, correct_streak, avg_answer_time_sec
+    """
     if progress:
         stage = progress['stage']
         total_correct = progress['total_correct']
@@ -245,24 +563,203 @@ def record_answer(user_id: int, word_id: int, is_correct: bool, answer_time_sec:
         # ステージ降格（既存仕様を維持）
         stage = max(1, stage - 1)
     
+    return {
+        'stage': stage,
+        'total_correct': total_correct,
+        'total_wrong': total_wrong,
+        'correct_streak': correct_streak,
+        'avg_answer_time_sec': avg_time,
+    }
+
+
+def get_vocabulary_index() -> vocabulary_index.VocabularyIndex:
+    """
+    教材の単語の語彙索引（教材のバージョンが変わったときだけ作り直す）
+    """
+    global _vocabulary, _vocabulary_version
+    conn = db.get_connection()
+    version = content_pack.content_version(conn)
+    with _vocabulary_lock:
+        if _vocabulary is None or version != _vocabulary_version:
+            rows = conn.execute("SELECT english, japanese FROM words WHERE retired = 0")
+            _vocabulary = vocabulary_index.VocabularyIndex(
+                (row['english'], row['japanese']) for row in rows
+            )
+            _vocabulary_version = version
+        return _vocabulary
+
+
+def check_spelling(word: dict, answer: str) -> dict:
+    """
+    つづりの解答を採点し、誤答なら種類を判定する（DB には書かない）
+    
+    Args:
+        word: get_next_word の戻り値
+        answer: 生徒の解答
+    
+    Returns:
+        {"is_correct", "error"}。error は vocabulary_index.VocabularyIndex.classify の結果
+        （正解なら None）
+    """
+    if answer_normalizer.is_match(answer, word['answer_keys']):
+        return {'is_correct': True, 'error': None}
+    return {
+        'is_correct': False,
+        'error': get_vocabulary_index().classify(answer, word['english']),
+    }
+
+
+def record_answer(
+    user_id: int,
+    word_id: int,
+    is_correct: bool,
+    answer_time_sec: float,
+    error_kind: int | None = None,
+):
+    """
+    回答を記録し、ステージを更新
+    
+    Args:
+        user_id: ユーザーID
+        word_id: 単語ID
+        is_correct: 正解かどうか
+        answer_time_sec: 回答時間（秒）
+        error_kind: 誤答の種類（check_spelling の error["code"]）。回答イベントに保存する
+    
+    Note:
+        answer_buffer が有効な場合は DB には書かず、バッファに入れる
+        （まとめて answer_buffer.flush() で書き込まれる）。
+    """
+    # 現在の進捗を取得（書き込み待ちのバッファにあればそれが最新）
+    progress = None
+    if answer_buffer.is_enabled():
+        progress = answer_buffer.get_word_progress(user_id, word_id)
+    
+    if progress is None:
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("""
+                SELECT stage, total_correct, total_wrong, correct_streak, avg_answer_time_sec
+                FROM word_progress
+                WHERE user_id = ? AND word_id = ?
+            """, (user_id, word_id))
+            
+            progress = cursor.fetchone()
+        except sqlite3.OperationalError as e:
+            # テーブルが存在しない場合
+            raise RuntimeError(f"データベーステーブルが存在しません。先にデータをインポートしてください: {e}")
+    
+    state = apply_answer(progress, is_correct, answer_time_sec)
+    
     # 進捗を更新または挿入
-    now = datetime.now().isoformat()
-    cursor.execute("""
-        INSERT INTO word_progress 
-        (user_id, word_id, stage, total_correct, total_wrong, correct_streak, 
-         avg_answer_time_sec, last_answered_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(user_id, word_id) DO UPDATE SET
-            stage = excluded.stage,
-            total_correct = excluded.total_correct,
-            total_wrong = excluded.total_wrong,
-            correct_streak = excluded.correct_streak,
-            avg_answer_time_sec = excluded.avg_answer_time_sec,
-            last_answered_at = excluded.last_answered_at
-    """, (user_id, word_id, stage, total_correct, total_wrong, correct_streak, avg_time, now))
-    
-    conn.commit()
-    conn.close()
+    now_dt = datetime.now()
+    now = now_dt.isoformat()
+    row = {
+        'user_id': user_id,
+        'word_id': word_id,
+        **state,
+        'last_answered_at': now,
+        'last_answered_day': epoch_day(now_dt.date()),
+    }
+    event = answer_log.make_event(
+        user_id, answer_log.KIND_WORD, word_id, is_correct, answer_time_sec, now_dt, error_kind
+    )
+    
+    if answer_buffer.is_enabled():
+        answer_buffer.put_word_progress(row)
+        answer_buffer.put_event(event)
+    else:
+        conn = db.get_connection()
+        with conn:
+            conn.execute("""
+                INSERT INTO word_progress 
+                (user_id, word_id, stage, total_correct, total_wrong, correct_streak, 
+                 avg_answer_time_sec, last_answered_at, last_answered_day)
+                VALUES (:user_id, :word_id, :stage, :total_correct, :total_wrong, :correct_streak,
+                        :avg_answer_time_sec, :last_answered_at, :last_answered_day)
+                ON CONFLICT(user_id, word_id) DO UPDATE SET
+                    stage = excluded.stage,
+                    total_correct = excluded.total_correct,
+                    total_wrong = excluded.total_wrong,
+                    correct_streak = excluded.correct_streak,
+                    avg_answer_time_sec = excluded.avg_answer_time_sec,
+                    last_answered_at = excluded.last_answered_at,
+                    last_answered_day = excluded.last_answered_day
+            """, row)
+            answer_log.insert_events(conn, [event])
+    
+    # 出題スケジューラ上のスコアをこの単語だけ更新（読み込み中のものには後で反映する）
+    with _scheduler_lock:
+        for key, scheduler in _schedulers.items():
+            if key[0] == user_id:
+                scheduler.update(word_id, row)
+        for key, updates in _loading.items():
+            if key[0] == user_id:
+                updates.append((word_id, row))
+
+
+def rebuild_word_progress(user_id: int | None = None) -> int:
+    """
+    word_progress を回答イベントログ（answer_events）から作り直す
+    
+    ログを記録順に1回だけ読み、(ユーザー, 単語) ごとの状態に apply_answer を順に適用する。
+    イベントが1件もない (ユーザー, 単語) の行はそのまま残す（ログを取り始める前の進捗を消さないため）。
+    
+    Args:
+        user_id: 指定した場合はそのユーザーの分だけ作り直す
+    
+    Returns:
+        作り直した word_progress の行数（残した行は含まない）
+    """
+    # 書き込み待ちのイベントを先にログへ反映しておく
+    answer_buffer.flush()
+    
+    conn = db.get_connection()
+    states: dict[tuple[int, int], dict] = {}
+    last_answered: dict[tuple[int, int], int] = {}
+    
+    for ev_user_id, word_id, is_correct, answer_ms, answered_at in answer_log.iter_events(
+        conn, answer_log.KIND_WORD, user_id
+    ):
+        key = (ev_user_id, word_id)
+        answer_time_sec = (answer_ms or 0) / 1000
+        states[key] = apply_answer(states.get(key), bool(is_correct), answer_time_sec)
+        last_answered[key] = answered_at
+    
+    rows = []
+    for (row_user_id, word_id), state in states.items():
+        answered_dt = answer_log.from_epoch_ms(last_answered[(row_user_id, word_id)])
+        rows.append({
+            'user_id': row_user_id,
+            'word_id': word_id,
+            **state,
+            'last_answered_at': answered_dt.isoformat(),
+            'last_answered_day': epoch_day(answered_dt.date()),
+        })
+    
+    # イベントのない (ユーザー, 単語) の行は消さずに残す
+    # （ログを取り始める前 = マイグレーション v3 より前の学習進捗）
+    with conn:
+        conn.executemany("""
+            INSERT INTO word_progress 
+            (user_id, word_id, stage, total_correct, total_wrong, correct_streak, 
+             avg_answer_time_sec, last_answered_at, last_answered_day)
+            VALUES (:user_id, :word_id, :stage, :total_correct, :total_wrong, :correct_streak,
+                    :avg_answer_time_sec, :last_answered_at, :last_answered_day)
+            ON CONFLICT(user_id, word_id) DO UPDATE SET
+                stage = excluded.stage,
+                total_correct = excluded.total_correct,
+                total_wrong = excluded.total_wrong,
+                correct_streak = excluded.correct_streak,
+                avg_answer_time_sec = excluded.avg_answer_time_sec,
+                last_answered_at = excluded.last_answered_at,
+                last_answered_day = excluded.last_answered_day
+        """, rows)
+    
+    invalidate_schedulers(user_id)
+    return len(rows)
 
 
 def get_word_stats(user_id: int) -> dict:
@@ -273,44 +770,41 @@ def get_word_stats(user_id: int) -> dict:
       Stage2クリア = stage>=3
       Stage3クリア = stage>=4
     word_progressが無い単語は stage=1 扱い。
+    
+    集計はトリガーで更新される word_stage_summary / word_catalog_summary の
+    主キー検索だけで行う（単語数に関係なく一定時間）。廃止された単語は数えない。
     """
+    # 書き込み待ちの回答があれば先に反映しておく
+    answer_buffer.flush()
+    
     conn = db.get_connection()
-    try:
-        sql = """
-        SELECT
-          COUNT(*) AS total,
-          SUM(CASE WHEN COALESCE(wp.stage, 1) >= 2 THEN 1 ELSE 0 END) AS cleared_s1,
-          SUM(CASE WHEN COALESCE(wp.stage, 1) >= 3 THEN 1 ELSE 0 END) AS cleared_s2,
-          SUM(CASE WHEN COALESCE(wp.stage, 1) >= 4 THEN 1 ELSE 0 END) AS cleared_s3
-        FROM words w
-        LEFT JOIN word_progress wp
-          ON wp.word_id = w.word_id AND wp.user_id = ?
-        """
-        cur = conn.cursor()
-        row = cur.execute(sql, (user_id,)).fetchone()
-
-        total = int(row[0] or 0)
-        s1 = int(row[1] or 0)
-        s2 = int(row[2] or 0)
-        s3 = int(row[3] or 0)
-
-        def pct(x: int) -> float:
-            return round((x * 100.0 / total), 1) if total > 0 else 0.0
-
-        return {
-            "total_words": total,
-            "stage1_cleared_pct": pct(s1),
-            "stage2_cleared_pct": pct(s2),
-            "stage3_cleared_pct": pct(s3),
-        }
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
-
-
-
+    sql = """
+    SELECT
+      c.total_words AS total,
+      COALESCE(s.stage2_count + s.stage3_count + s.stage4_count, 0) AS cleared_s1,
+      COALESCE(s.stage3_count + s.stage4_count, 0) AS cleared_s2,
+      COALESCE(s.stage4_count, 0) AS cleared_s3
+    FROM word_catalog_summary c
+    LEFT JOIN word_stage_summary s ON s.user_id = ?
+    WHERE c.id = 1
+    """
+    cur = conn.cursor()
+    row = cur.execute(sql, (user_id,)).fetchone()
+    
+    if row is None:
+        row = (0, 0, 0, 0)
 
+    total = int(row[0] or 0)
+    s1 = int(row[1] or 0)
+    s2 = int(row[2] or 0)
+    s3 = int(row[3] or 0)
 
+    def pct(x: int) -> float:
+        return round((x * 100.0 / total), 1) if total > 0 else 0.0
 
+    return {
+        "total_words": total,
+        "stage1_cleared_pct": pct(s1),
+        "stage2_cleared_pct": pct(s2),
+        "stage3_cleared_pct": pct(s3),
+    }
@@ -199,6 +199,9 @@ class GrammarTrainingTab(QWidget):
         )
         
         if not result:
+            # 教材の更新で問題が消えた（採点できない）
+            QMessageBox.warning(self, "エラー", "この問題は教材から削除されました。次の問題に進みます。")
+            self.load_next_question()
             return
         
         # 結果表示
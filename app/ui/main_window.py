@@ -1,16 +1,62 @@
 """
 メインウィンドウ（タブ管理）
 """
+from datetime import datetime
+import sqlite3
 from PyQt6.QtWidgets import (
     QMainWindow, QTabWidget, QWidget, QVBoxLayout, QLabel,
-    QMenuBar, QMessageBox, QDialog
+    QMenuBar, QMessageBox, QDialog, QFileDialog
 )
 from PyQt6.QtCore import Qt, QTimer
 from app.ui.home_tab import HomeTab
-from app.ui.word_training_tab import WordTrainingTab
-from app.ui.grammar_training_tab import GrammarTrainingTab
 from app.ui.user_select_dialog import UserSelectDialog
 from app.services import user_service
+from app.services import answer_buffer
+from app.utils import instrumentation
+from app.utils import startup_timing
+
+
+# 書き込み待ちの回答を DB に反映する間隔（ミリ秒）
+ANSWER_FLUSH_INTERVAL_MS = 5000
+
+
+def _create_word_tab(user_id: int) -> QWidget:
+    """単語トレーニングタブを作る（word_service / TTS はここで初めて読み込む）"""
+    from app.ui.word_training_tab import WordTrainingTab
+    return WordTrainingTab(user_id=user_id)
+
+
+def _create_grammar_tab(user_id: int) -> QWidget:
+    """文法トレーニングタブを作る（grammar_service はここで初めて読み込む）"""
+    from app.ui.grammar_training_tab import GrammarTrainingTab
+    return GrammarTrainingTab(user_id=user_id)
+
+
+class LazyTab(QWidget):
+    """
+    最初に表示されたときに中身を作るタブ
+    
+    起動時はタブの枠だけを置き、トピック一覧の読み込みや設定の読み出しは
+    そのタブが初めて選ばれたときに行う。
+    """
+    
+    def __init__(self, factory):
+        """
+        Args:
+            factory: 中身のウィジェットを作る関数（引数なし）
+        """
+        super().__init__()
+        self._factory = factory
+        self.widget: QWidget | None = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+    
+    def ensure_built(self) -> QWidget:
+        """中身を作って返す（作成済みならそれを返す）"""
+        if self.widget is None:
+            self.widget = self._factory()
+            self.layout().addWidget(self.widget)
+        return self.widget
 
 
 class MainWindow(QMainWindow):
@@ -33,6 +79,27 @@ class MainWindow(QMainWindow):
         self._init_tabs()
         
         self.setCentralWidget(self.tabs)
+        
+        # 書き込み待ちの回答を定期的に DB に反映
+        self._flush_timer = QTimer(self)
+        self._flush_timer.timeout.connect(self.flush_answers)
+        self._flush_timer.start(ANSWER_FLUSH_INTERVAL_MS)
+    
+    @property
+    def word_tab(self) -> QWidget | None:
+        """単語トレーニングタブ（まだ表示していなければ None）"""
+        return self._word_page.widget
+    
+    @property
+    def grammar_tab(self) -> QWidget | None:
+        """文法トレーニングタブ（まだ表示していなければ None）"""
+        return self._grammar_page.widget
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        # 最初の描画が終わったら起動時間を記録する
+        if startup_timing.first_frame():
+            QTimer.singleShot(0, startup_timing.report)
     
     def _ensure_default_user(self) -> int:
         """
@@ -71,6 +138,39 @@ class MainWindow(QMainWindow):
         
         select_user_action = user_menu.addAction("ユーザーを選択…")
         select_user_action.triggered.connect(self.change_user)
+        
+        # ツールメニュー（計測が有効なときだけ）
+        if instrumentation.is_enabled():
+            tools_menu = menubar.addMenu("ツール")
+            export_action = tools_menu.addAction("計測データを書き出す…")
+            export_action.triggered.connect(self.export_instrumentation)
+    
+    def export_instrumentation(self):
+        """サービス呼び出しの計測結果を JSON ファイルに保存する"""
+        default_name = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        path, _ = QFileDialog.getSaveFileName(
+            self, "計測データを書き出す", default_name, "JSON (*.json)"
+        )
+        if not path:
+            return
+        try:
+            instrumentation.export_json(path)
+        except OSError as e:
+            QMessageBox.warning(self, "エラー", f"書き出しに失敗しました: {e}")
+            return
+        QMessageBox.information(self, "計測データ", f"保存しました:\n{path}")
+    
+    def flush_answers(self):
+        """
+        書き込み待ちの回答を DB に反映する（タイマー・タブ切り替え・終了時に呼ぶ）
+        
+        DB がロックされているなどで書けなかった場合は、ログに出して続ける
+        （回答はバッファとジャーナルに残るので、次の反映で書き直す）。
+        """
+        try:
+            answer_buffer.flush()
+        except sqlite3.Error as e:
+            print(f"[MainWindow] 回答を DB に反映できませんでした（次回また試します）: {e}")
     
     def _init_tabs(self):
         """タブを初期化"""
@@ -84,28 +184,37 @@ class MainWindow(QMainWindow):
         )
         self.tabs.addTab(self.home_tab, "ホーム")
         
-        # 単語トレーニングタブ
-        self.word_tab = WordTrainingTab(user_id=self.current_user_id)
-        self.tabs.addTab(self.word_tab, "単語トレーニング")
-        
-        # 文法トレーニングタブ
-        self.grammar_tab = GrammarTrainingTab(user_id=self.current_user_id)
-        self.tabs.addTab(self.grammar_tab, "文法トレーニング")
+        # 単語・文法トレーニングタブ（最初に選ばれたときに作る）
+        self._add_learning_tabs()
         
         # タブ切り替え時に単語モードタブが表示されたら入力欄にフォーカス
         self.tabs.currentChanged.connect(self._on_tab_changed)
         self._last_tab = None
     
+    def _add_learning_tabs(self):
+        """単語・文法トレーニングタブの枠を追加する（current_user_id を使う）"""
+        user_id = self.current_user_id
+        self._word_page = LazyTab(lambda: _create_word_tab(user_id))
+        self.tabs.addTab(self._word_page, "単語トレーニング")
+        
+        self._grammar_page = LazyTab(lambda: _create_grammar_tab(user_id))
+        self.tabs.addTab(self._grammar_page, "文法トレーニング")
+    
     def _on_tab_changed(self, index: int):
         """タブが切り替わったときに呼ばれる"""
         new_tab = self.tabs.widget(index)
+        if isinstance(new_tab, LazyTab):
+            new_tab = new_tab.ensure_built()
+        
+        # タブ切り替えのタイミングで書き込み待ちの回答を DB に反映
+        self.flush_answers()
         
         # 前のタブに on_deactivated を通知（あれば）
         if self._last_tab is not None and hasattr(self._last_tab, "on_deactivated"):
             self._last_tab.on_deactivated()
         
         # 新しいタブが WordTrainingTab なら on_activated を呼ぶ
-        if new_tab is self.word_tab and hasattr(new_tab, "on_activated"):
+        if new_tab is not None and new_tab is self.word_tab and hasattr(new_tab, "on_activated"):
             new_tab.on_activated()
             # 少し遅延を入れてフォーカスを設定（タブ切り替えのアニメーション完了後）
             QTimer.singleShot(100, lambda: self.word_tab.input_field.setFocus())
@@ -131,20 +240,21 @@ class MainWindow(QMainWindow):
         """
         current_user_id を反映した WordTrainingTab / GrammarTrainingTab を作り直す
         """
+        # 古い単語タブの先読みワーカーを停止（作成済みの場合）
+        if self.word_tab is not None and hasattr(self.word_tab, "shutdown"):
+            self.word_tab.shutdown()
+        
         # 既存のタブを削除（ホームタブ以外）
         while self.tabs.count() > 1:
             self.tabs.removeTab(1)
         
-        # 新しいタブを追加
-        self.word_tab = WordTrainingTab(user_id=self.current_user_id)
-        self.tabs.addTab(self.word_tab, "単語トレーニング")
-        
-        self.grammar_tab = GrammarTrainingTab(user_id=self.current_user_id)
-        self.tabs.addTab(self.grammar_tab, "文法トレーニング")
+        # 新しいタブを追加（中身は選ばれたときに作る）
+        self._add_learning_tabs()
         
         # 現在単語モードタブが表示されている場合はフォーカスを設定
         if self.tabs.currentIndex() == 1:
             # 単語タブが選択されているので、WordTrainingTab に通知
+            self._word_page.ensure_built()
             if hasattr(self.word_tab, "on_activated"):
                 self.word_tab.on_activated()
             QTimer.singleShot(100, lambda: self.word_tab.input_field.setFocus())
@@ -5,20 +5,21 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
     QLineEdit, QPushButton, QMessageBox, QApplication, QComboBox
 )
-from PyQt6.QtCore import Qt, QTimer, QSettings
+from PyQt6.QtCore import Qt, QTimer, QSettings, QObject, pyqtSignal
 from PyQt6.QtGui import QFont
 import random
+import sqlite3
 from app.services import word_service
-from app.services.tts_service import tts_service
+from app.services import vocabulary_index
+from app.services.word_prefetch import WordPrefetchQueue
+from app.services.audio_prefetch import AudioPrefetcher
+from app.services.tts_service import tts_service, VOICE_CHOICES
 from app.services import db
 
 
-# 音声選択の候補リスト（表示名, voice ID）
-VOICE_CHOICES = [
-    ("Aria (US 女性)", "en-US-AriaNeural"),
-    ("Guy (US 男性)", "en-US-GuyNeural"),
-    ("Libby (UK 女性)", "en-GB-LibbyNeural"),
-]
+class _SpeechSignals(QObject):
+    """読み上げワーカーの完了通知を GUI スレッドに渡すためのシグナル"""
+    finished = pyqtSignal(int, bool)
 
 
 class WordTrainingTab(QWidget):
@@ -34,6 +35,11 @@ class WordTrainingTab(QWidget):
         self.is_active = False  # タブが選択されているとき True
         self.question_counter = 0  # 出題された問題数（セッション中）
         
+        # 次の出題単語をワーカースレッドで先読みしておくキュー
+        self.prefetch = WordPrefetchQueue(user_id=self.user_id)
+        # 次に出題されそうな単語の音声を優先度の低いワーカースレッドで先に合成しておく
+        self.audio_prefetch = AudioPrefetcher()
+        
         # QSettings で設定を保存/読み込み
         self.settings = QSettings("JHSEnglishTrainer", "EnglishApp")
         
@@ -41,6 +47,14 @@ class WordTrainingTab(QWidget):
         saved_voice = self.settings.value("tts_voice", "en-GB-LibbyNeural", type=str)
         tts_service.set_voice(saved_voice)
         
+        # 読み上げはワーカースレッドで行い、完了はシグナルで受け取る
+        self._speech_signals = _SpeechSignals()
+        self._speech_signals.finished.connect(self._on_speech_finished)
+        # 正解時の読み上げの依頼ID（完了したら次の単語へ進む）
+        self._correct_speech_id: int | None = None
+        # TTS の初期化はバックグラウンドで1回だけ行う
+        tts_service.warmup_async()
+        
         self.init_ui(saved_voice)
         # 初回出題は行わない（スタートボタンが押されるまで待つ）
         self._disable_ui()
@@ -227,6 +241,11 @@ class WordTrainingTab(QWidget):
         
         layout.addLayout(filter_layout)
         
+        # フィルタが変わったら先読み済みの単語は使えない
+        self.grade_combo.currentIndexChanged.connect(self._on_filter_changed)
+        self.unit_combo.currentIndexChanged.connect(self._on_filter_changed)
+        self.level_combo.currentIndexChanged.connect(self._on_filter_changed)
+        
         layout.addStretch()
         self.setLayout(layout)
     
@@ -337,21 +356,35 @@ class WordTrainingTab(QWidget):
         # フィルタパラメータを取得
         grade_min, grade_max, unit, level_max = self._get_filter_params()
         
-        # 新しい単語を取得
-        self.current_word = word_service.get_next_word(
-            user_id=self.user_id,
-            grade_min=grade_min,
-            grade_max=grade_max,
-            unit=unit,
-            level_max=level_max
-        )
+        # 新しい単語を取得（先読み済みならそれを使い、間に合っていなければその場で取得）
+        filters = (grade_min, grade_max, unit, level_max)
+        previous = self.current_word
+        self.current_word = self.prefetch.pop(filters)
+        if self.current_word is None:
+            # 書き込み待ちの回答の反映（answer_buffer.flush）で DB がロックされていた場合などは、
+            # ログに出してこの単語の読み込みだけやめる（回答はジャーナルに残り、次の反映で書き直す）
+            try:
+                self.current_word = word_service.get_next_word(
+                    user_id=self.user_id,
+                    grade_min=grade_min,
+                    grade_max=grade_max,
+                    unit=unit,
+                    level_max=level_max,
+                    previous=previous
+                )
+            except sqlite3.Error as e:
+                print(f"[WordTrainingTab] 次の単語を読み込めませんでした: {e}")
+                QMessageBox.warning(self, "エラー", "次の単語を読み込めませんでした。\nもう一度「次の単語」を押してください。")
+                self.next_button.setEnabled(True)
+                return
         
         if not self.current_word:
             QMessageBox.warning(self, "エラー", "単語データがありません。\n先にデータをインポートしてください。")
             return
         
-        # TTS を事前初期化（正解時の音声再生を即座に行うため）
-        tts_service.warmup()
+        # 前の単語の読み上げが残っていれば取り消す
+        self._correct_speech_id = None
+        tts_service.cancel()
         
         # 状態をリセット
         self.last_answer_correct = None
@@ -392,6 +425,12 @@ class WordTrainingTab(QWidget):
         # ★(3) 入力欄にフォーカスを当てる
         self.input_field.setFocus()
         
+        # 入力している間に次の単語と、その音声を先読みしておく
+        self.prefetch.request_fill(filters, self.current_word)
+        self.audio_prefetch.request(
+            self._upcoming_english(filters), tts_service.voice, tts_service.rate
+        )
+        
         # ★(4) ステージ4のときだけ、タブがアクティブなら音声を2秒後に再生
         # 表示ステージを取得
         actual_stage = self.current_word.get("stage", 1)
@@ -404,7 +443,7 @@ class WordTrainingTab(QWidget):
                     current_actual_stage = self.current_word.get("stage", 1)
                     current_display_stage = self._get_display_stage(current_actual_stage)
                     if current_display_stage == 4:
-                        tts_service.speak(self.current_word["english"])
+                        self._speak(self.current_word["english"])
             QTimer.singleShot(2000, _play)
     
     def check_answer(self):
@@ -412,21 +451,21 @@ class WordTrainingTab(QWidget):
         if not self.current_word:
             return
         
-        user_answer = self.input_field.text().strip().lower()
-        correct_answer = self.current_word['english'].lower()
-        
         import time
         answer_time = time.time() - self.start_time if self.start_time else 0.0
         
-        is_correct = user_answer == correct_answer
+        # 大文字小文字・空白・全角文字・文末のピリオドなどの違いは正解にする
+        # 不正解なら誤答の種類（1文字ちがい・入れ替え・別の単語など）も判定する
+        result = word_service.check_spelling(self.current_word, self.input_field.text())
+        is_correct = result['is_correct']
         
         # 判定結果を保存
         self.last_answer_correct = is_correct
         
         if is_correct:
             # (A) 正解の場合
-            # ★(1) 正解した瞬間に即座に音声再生（TTS は事前初期化済み）
-            tts_service.speak(self.current_word['english'])
+            # ★(1) 正解した瞬間に音声再生を依頼（ワーカースレッドで再生するので待たない）
+            self._correct_speech_id = self._speak(self.current_word['english'])
             
             # ★(2) ラベル更新を実行（即座に表示）
             self.result_label.setText(f"✓ 正解！\n正解: {self.current_word['english']}")
@@ -449,25 +488,34 @@ class WordTrainingTab(QWidget):
                 is_correct=True,
                 answer_time_sec=answer_time
             )
+            # この単語のスコアが変わったので先読み結果から外す
+            self.prefetch.invalidate_word(self.current_word['word_id'])
             
-            # ★(6) 正解音声を十分に聞いてから次の問題に移るため 2秒待つ
-            QTimer.singleShot(2000, self._load_next_word_after_correct)
+            # ★(6) 正解音声を十分に聞いてから次の問題に移るため、再生が終わってから 2秒待つ
+            #     （読み上げできない環境では今から 2秒）
+            if self._correct_speech_id is None:
+                self._schedule_next_after_correct()
         else:
             # (B) 不正解の場合
             # ラベル更新を最優先
             self.result_label.setText(
-                f"✗ 不正解です。もう一度入力してね。\n正解: {self.current_word['english']}"
+                f"✗ 不正解です。もう一度入力してね。\n"
+                f"{self._describe_error(result['error'])}"
+                f"正解: {self.current_word['english']}"
             )
             self.result_label.setStyleSheet("font-size: 16px; color: red; font-weight: bold;")
             QApplication.processEvents()
             
             # その後に重い処理（DB書き込み）
+            error = result['error']
             word_service.record_answer(
                 user_id=self.user_id,
                 word_id=self.current_word['word_id'],
                 is_correct=False,
-                answer_time_sec=answer_time
+                answer_time_sec=answer_time,
+                error_kind=error['code'] if error else None
             )
+            self.prefetch.invalidate_word(self.current_word['word_id'])
             
             # 同じ current_word を維持（get_next_word は呼ばない）
             # 「次の単語」ボタンは無効のまま
@@ -478,10 +526,65 @@ class WordTrainingTab(QWidget):
             self.input_field.setEnabled(True)
             self.input_field.setFocus()
     
+    @staticmethod
+    def _describe_error(error: dict | None) -> str:
+        """誤答の種類の説明（結果ラベルの1行。説明がなければ空文字）"""
+        if not error:
+            return ""
+        kind = error['kind']
+        if kind == vocabulary_index.ERROR_TYPO:
+            return "おしい！1文字ちがいです。\n"
+        if kind == vocabulary_index.ERROR_TRANSPOSITION:
+            return "おしい！となりの文字が入れかわっています。\n"
+        if kind == vocabulary_index.ERROR_OTHER_WORD:
+            return (
+                f"「{error['confused_with']}」は「{error['confused_japanese']}」という"
+                f"別の単語です。\n"
+            )
+        if kind == vocabulary_index.ERROR_NEAR_OTHER_WORD:
+            return (
+                f"「{error['confused_with']}」（{error['confused_japanese']}）と"
+                f"まちがえていませんか？\n"
+            )
+        if kind == vocabulary_index.ERROR_MISSPELLING:
+            return "つづりをもう一度確認しよう。\n"
+        return ""
+    
+    def _upcoming_english(self, filters) -> list[str]:
+        """
+        これから読み上げそうな英単語（今の単語 → 先読み済みの単語 → 出題候補の上位の順）
+        
+        GUI スレッドでメモリ上の情報だけから作る（DB は読まない。先読みワーカーには一覧を渡す）。
+        """
+        current = self.current_word
+        words = [current["english"]] if current else []
+        words += [w["english"] for w in self.prefetch.peek()]
+        words += [w["english"] for w in word_service.peek_upcoming_words(self.user_id, *filters)]
+        return words
+    
+    def _speak(self, text: str) -> int | None:
+        """ワーカースレッドで読み上げる（前の読み上げは取り消される）"""
+        return tts_service.speak_async(text, on_done=self._speech_signals.finished.emit)
+    
+    def _on_speech_finished(self, request_id: int, completed: bool):
+        """読み上げが終わった（取り消された）とき。GUI スレッドで呼ばれる"""
+        if request_id == self._correct_speech_id:
+            self._correct_speech_id = None
+            self._schedule_next_after_correct()
+    
+    def _schedule_next_after_correct(self):
+        """2秒後に次の単語へ進む（その間に単語が変わっていたら何もしない）"""
+        word = self.current_word
+        
+        def _next():
+            if self.current_word is word and self.last_answer_correct:
+                self._load_next_word_after_correct()
+        QTimer.singleShot(2000, _next)
+    
     def _load_next_word_after_correct(self):
         """
         正解表示後に次の単語を読み込むためのヘルパー。
-        正解時の2秒ディレイ後に呼ばれる。
+        正解時の読み上げが終わってから2秒後に呼ばれる。
         """
         # 結果ラベルをクリア
         self.result_label.clear()
@@ -513,7 +616,7 @@ class WordTrainingTab(QWidget):
                         current_actual_stage = self.current_word.get("stage", 1)
                         current_display_stage = self._get_display_stage(current_actual_stage)
                         if current_display_stage == 4:
-                            tts_service.speak(self.current_word["english"])
+                            self._speak(self.current_word["english"])
                 QTimer.singleShot(2000, _play)
     
     def on_deactivated(self):
@@ -521,6 +624,22 @@ class WordTrainingTab(QWidget):
         別タブに切り替わったときに呼ぶ想定。
         """
         self.is_active = False
+        # 読み上げ中・待ちの音声は止める
+        tts_service.cancel()
+    
+    def _on_filter_changed(self, index: int):
+        """学年・カテゴリ・レベルのフィルタ変更時のハンドラ"""
+        self.prefetch.clear()
+    
+    def shutdown(self):
+        """
+        タブを破棄する前に呼ぶ想定。
+        先読みワーカースレッド（単語・音声）を停止し、読み上げを取り消す。
+        """
+        self.prefetch.shutdown()
+        self.audio_prefetch.shutdown()
+        self._correct_speech_id = None
+        tts_service.cancel()
     
     def _on_voice_changed(self, index: int):
         """音声選択変更時のハンドラ"""
@@ -0,0 +1,329 @@
+"""
+サービス呼び出しの計測
+word_service / grammar_service / user_service / db の公開関数を包み、
+呼び出し回数・所要時間・取得行数・レイテンシのヒストグラムをプロセス内に記録する。
+
+無効のときは関数を包まない（元の関数がそのまま呼ばれる）のでオーバーヘッドはない。
+まだ読み込まれていないモジュールは、読み込まれたときに包む
+（word_service / grammar_service は最初にタブを開くまで読み込まないので、起動時間の計測を変えない）。
+環境変数 JHS_ENGLISH_TRAINER_PROFILE=1 で起動すると有効になり、
+メニュー「ツール → 計測データを書き出す…」または export_json() で JSON に書き出せる。
+"""
+import functools
+import importlib.abc
+import inspect
+import json
+import sys
+import threading
+import time
+import sqlite3
+from datetime import datetime
+
+from app.services import db
+from app.utils import startup_timing
+
+
+# この環境変数が空でなければ起動時に有効にする
+ENV_VAR = "JHS_ENGLISH_TRAINER_PROFILE"
+
+# 既定で計測するモジュール（名前で持ち、読み込まれるまで import しない）
+DEFAULT_MODULES = (
+    "app.services.word_service",
+    "app.services.grammar_service",
+    "app.services.user_service",
+    "app.services.db",
+)
+
+# ヒストグラムの精度。2 のべき乗ごとに 2**(SUB_BUCKET_BITS - 1) 個のバケットに分ける
+# （5 ならバケット幅は値の約 3% 以内）
+SUB_BUCKET_BITS = 5
+
+_lock = threading.Lock()
+_enabled = False
+# "モジュール名.関数名" -> CallStats
+_stats: dict[str, "CallStats"] = {}
+# 包む前の関数 (モジュール, 関数名, 元の関数)。disable() で戻す
+_originals: list[tuple[object, str, object]] = []
+# 読み込まれたら包むモジュール名
+_pending: set[str] = set()
+# スレッドごとの取得行数（row_factory で数える）
+_rows = threading.local()
+_started_at: datetime | None = None
+
+
+class LatencyHistogram:
+    """
+    HDR 形式（対数・線形）のレイテンシヒストグラム（マイクロ秒単位）
+
+    2**SUB_BUCKET_BITS 未満は 1μs 刻み、それ以上は 2 のべき乗ごとに
+    同じ数のバケットに分けるので、範囲によらず相対誤差が一定になる。
+    """
+
+    def __init__(self, sub_bucket_bits: int = SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self._half = 1 << (sub_bucket_bits - 1)
+        self._linear = 1 << sub_bucket_bits
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        if value < self._linear:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return shift * self._half + (value >> shift)
+
+    def _upper_bound(self, index: int) -> int:
+        """バケットに入る最大の値"""
+        if index < self._linear:
+            return index
+        shift = index // self._half - 1
+        mantissa = index - shift * self._half
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value_us: int) -> None:
+        """1回分の値を記録する"""
+        value_us = max(0, int(value_us))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        if self.min is None or value_us < self.min:
+            self.min = value_us
+        if value_us > self.max:
+            self.max = value_us
+
+    def percentile(self, p: float) -> int:
+        """
+        p パーセンタイルの値（μs）
+
+        バケットの上限を返す（ただし記録した最大値は超えない）。
+        """
+        if self.count == 0:
+            return 0
+        target = max(1, int(p / 100.0 * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def buckets(self) -> list[tuple[int, int]]:
+        """空でないバケットの (上限μs, 件数) のリスト"""
+        return [(self._upper_bound(i), self.counts[i]) for i in sorted(self.counts)]
+
+
+class CallStats:
+    """1つの関数の計測結果"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.rows = 0
+        self.histogram = LatencyHistogram()
+
+    def record(self, elapsed_ns: int, rows: int, failed: bool) -> None:
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        self.rows += rows
+        if failed:
+            self.errors += 1
+        self.histogram.record(elapsed_ns // 1000)
+
+    def to_dict(self) -> dict:
+        h = self.histogram
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_ns / 1e6, 3),
+            "mean_ms": round(self.total_ns / 1e6 / self.calls, 4) if self.calls else 0.0,
+            "rows_fetched": self.rows,
+            "min_ms": (h.min or 0) / 1000,
+            "p50_ms": h.percentile(50) / 1000,
+            "p90_ms": h.percentile(90) / 1000,
+            "p99_ms": h.percentile(99) / 1000,
+            "max_ms": h.max / 1000,
+            "histogram_us": h.buckets(),
+        }
+
+
+def _counting_row_factory(cursor, row):
+    """取得した行を数える row_factory（中身は sqlite3.Row のまま）"""
+    _rows.count = getattr(_rows, "count", 0) + 1
+    return sqlite3.Row(cursor, row)
+
+
+def _rows_fetched() -> int:
+    return getattr(_rows, "count", 0)
+
+
+def _wrap(name: str, func):
+    """関数を計測付きの関数で包む"""
+    with _lock:
+        stats = _stats.setdefault(name, CallStats())
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        rows_before = _rows_fetched()
+        failed = False
+        start = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            rows = _rows_fetched() - rows_before
+            with _lock:
+                stats.record(elapsed, rows, failed)
+
+    wrapper.__wrapped_by_instrumentation__ = True
+    return wrapper
+
+
+def _public_functions(module) -> list[tuple[str, object]]:
+    """モジュールで定義されている公開関数（_ で始まらないもの）"""
+    return [
+        (name, obj)
+        for name, obj in vars(module).items()
+        if not name.startswith("_")
+        and inspect.isfunction(obj)
+        and obj.__module__ == module.__name__
+        and not getattr(obj, "__wrapped_by_instrumentation__", False)
+    ]
+
+
+def _wrap_module(module) -> None:
+    """モジュールの公開関数を計測付きの関数に差し替える"""
+    short_name = module.__name__.rsplit(".", 1)[-1]
+    for name, func in _public_functions(module):
+        _originals.append((module, name, func))
+        setattr(module, name, _wrap(f"{short_name}.{name}", func))
+
+
+class _WrappingLoader(importlib.abc.Loader):
+    """元のローダーでモジュールを実行してから、公開関数を包む"""
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._loader.exec_module(module)
+        with _lock:
+            wrap = _enabled and module.__name__ in _pending
+            _pending.discard(module.__name__)
+        if wrap:
+            _wrap_module(module)
+
+
+class _WrapOnImport(importlib.abc.MetaPathFinder):
+    """_pending のモジュールが読み込まれるときに _WrappingLoader を差し込む"""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in _pending:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _WrappingLoader(spec.loader)
+                return spec
+        return None
+
+
+_finder = _WrapOnImport()
+
+
+def enable(modules: list | None = None) -> None:
+    """
+    計測を有効にする（対象モジュールの公開関数を包む）
+
+    読み込み済みのモジュールはすぐに包み、まだのモジュールは読み込まれたときに包む
+    （計測のためにモジュールを読み込むことはしない）。
+
+    Args:
+        modules: 対象のモジュール、またはモジュール名（省略時は DEFAULT_MODULES）
+    """
+    global _enabled, _started_at
+    if _enabled:
+        return
+    _enabled = True
+    for module in modules or DEFAULT_MODULES:
+        if isinstance(module, str):
+            if module not in sys.modules:
+                _pending.add(module)
+                continue
+            module = sys.modules[module]
+        _wrap_module(module)
+    if _pending:
+        sys.meta_path.insert(0, _finder)
+    db.set_row_factory(_counting_row_factory)
+    _started_at = datetime.now()
+
+
+def disable() -> None:
+    """計測を無効にして元の関数に戻す（記録した結果は残る）"""
+    global _enabled
+    if not _enabled:
+        return
+    if _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
+    with _lock:
+        _pending.clear()
+        _enabled = False
+    db.set_row_factory(None)
+    for module, name, func in reversed(_originals):
+        setattr(module, name, func)
+    _originals.clear()
+
+
+def is_enabled() -> bool:
+    """計測が有効かどうか"""
+    return _enabled
+
+
+def reset() -> None:
+    """記録した結果を消す"""
+    global _started_at
+    with _lock:
+        for stats in _stats.values():
+            stats.__init__()
+    _started_at = datetime.now() if _enabled else None
+
+
+def snapshot() -> dict:
+    """
+    現在の計測結果
+
+    Returns:
+        {"started_at", "created_at", "startup": [起動の各段階],
+         "functions": {"モジュール.関数": {...}}}
+        関数は合計時間の長い順
+    """
+    with _lock:
+        functions = {
+            name: stats.to_dict()
+            for name, stats in sorted(_stats.items(), key=lambda kv: -kv[1].total_ns)
+            if stats.calls
+        }
+    return {
+        "started_at": _started_at.isoformat(timespec="seconds") if _started_at else None,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "startup": startup_timing.phases(),
+        "functions": functions,
+    }
+
+
+def export_json(path: str) -> str:
+    """計測結果を JSON ファイルに書き出す"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+    return path
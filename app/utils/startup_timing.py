@@ -0,0 +1,128 @@
+"""
+起動時間の計測
+main.py の読み込み開始から最初の画面描画までの各段階の時刻を記録する。
+OS からプロセスの開始時刻が取れる場合は、インタプリタの起動（exe の展開を含む）も含める。
+
+環境変数 JHS_ENGLISH_TRAINER_STARTUP が空でなければ、最初の描画のあとで一覧を標準出力に表示する。
+計測（JHS_ENGLISH_TRAINER_PROFILE）が有効なときは計測データの JSON にも入る。
+"""
+import os
+import sys
+import time
+
+
+# この環境変数が空でなければ起動時間の一覧を表示する
+ENV_VAR = "JHS_ENGLISH_TRAINER_STARTUP"
+
+# このモジュールを読み込んだ時刻（main.py の先頭で読み込む）
+_origin = time.perf_counter()
+_origin_wall = time.time()
+# (段階名, _origin からの経過秒)
+_marks: list[tuple[str, float]] = []
+_first_frame_seen = False
+_reported = False
+
+
+def _process_start_time() -> float | None:
+    """
+    プロセスの開始時刻（UNIX 時刻）。取れない環境では None
+
+    Windows は GetProcessTimes、Linux は /proc から読む。
+    """
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            creation = wintypes.FILETIME()
+            unused = [wintypes.FILETIME() for _ in range(3)]
+            kernel32 = ctypes.windll.kernel32
+            ok = kernel32.GetProcessTimes(
+                kernel32.GetCurrentProcess(),
+                ctypes.byref(creation), *(ctypes.byref(ft) for ft in unused),
+            )
+            if not ok:
+                return None
+            ticks = (creation.dwHighDateTime << 32) | creation.dwLowDateTime
+            # FILETIME は 1601-01-01 からの 100ns 単位
+            return (ticks - 116444736000000000) / 1e7
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/stat", "r") as f:
+                # comm に空白が入ることがあるので ")" の後ろから数える
+                fields = f.read().rsplit(")", 1)[1].split()
+            started_after_boot = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+            with open("/proc/uptime", "r") as f:
+                uptime = float(f.read().split()[0])
+            return time.time() - (uptime - started_after_boot)
+    except Exception:
+        return None
+    return None
+
+
+def mark(name: str) -> None:
+    """段階の終わりを記録する"""
+    _marks.append((name, time.perf_counter() - _origin))
+
+
+def first_frame() -> bool:
+    """
+    画面を描画するたびに呼ぶ。最初の1回だけ "first_frame" を記録する
+
+    Returns:
+        最初の描画なら True
+    """
+    global _first_frame_seen
+    if _first_frame_seen:
+        return False
+    _first_frame_seen = True
+    mark("first_frame")
+    return True
+
+
+def elapsed_ms() -> float:
+    """main.py の読み込み開始からの経過時間（ミリ秒）"""
+    return (time.perf_counter() - _origin) * 1000.0
+
+
+def phases() -> list[dict]:
+    """
+    記録した段階の一覧
+
+    Returns:
+        [{"name", "at_ms", "duration_ms"}, ...]
+        at_ms はプロセス開始（取れなければ main.py の読み込み開始）からの時刻
+    """
+    result = []
+    offset_ms = 0.0
+    process_start = _process_start_time()
+    if process_start is not None and process_start <= _origin_wall:
+        offset_ms = (_origin_wall - process_start) * 1000.0
+        result.append({"name": "interpreter", "at_ms": round(offset_ms, 1),
+                       "duration_ms": round(offset_ms, 1)})
+    previous = 0.0
+    for name, at in _marks:
+        result.append({
+            "name": name,
+            "at_ms": round(offset_ms + at * 1000.0, 1),
+            "duration_ms": round((at - previous) * 1000.0, 1),
+        })
+        previous = at
+    return result
+
+
+def format_report() -> str:
+    """起動時間の一覧（表示用）"""
+    lines = ["[Startup] 起動時間", f"  {'段階':<24}{'所要(ms)':>10}{'経過(ms)':>10}"]
+    for phase in phases():
+        lines.append(f"  {phase['name']:<24}{phase['duration_ms']:>10.1f}{phase['at_ms']:>10.1f}")
+    return "\n".join(lines)
+
+
+def report() -> None:
+    """最初の描画のあとで1回だけ呼ぶ。環境変数が設定されていれば一覧を表示する"""
+    global _reported
+    if _reported:
+        return
+    _reported = True
+    if os.getenv(ENV_VAR):
+        print(format_report())
@@ -0,0 +1,303 @@
+"""
+主要な処理の所要時間を測るベンチマーク
+合成データ（synthetic_data）を入れた一時 DB で各処理を繰り返し実行し、
+パーセンタイル（p50/p90/p99）を表示する。
+
+結果を JSON に保存しておき、次回 --baseline で比較すると遅くなった処理が分かる。
+
+例:
+    python scripts/benchmark.py --scales 1000,10000 --output bench.json
+    python scripts/benchmark.py --baseline bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import db
+from app.services import answer_buffer
+from app.services import word_service
+from app.services import grammar_service
+from app.services import importer
+from scripts import synthetic_data
+
+
+def percentile(sorted_samples: list[float], p: float) -> float:
+    """昇順に並んだサンプルのパーセンタイル（nearest-rank 法）"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(p / 100.0 * len(sorted_samples) + 0.5)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples: list[float]) -> dict:
+    """ミリ秒のサンプルから統計値を作る"""
+    s = sorted(samples)
+    return {
+        "count": len(s),
+        "mean_ms": round(sum(s) / len(s), 4) if s else 0.0,
+        "p50_ms": round(percentile(s, 50), 4),
+        "p90_ms": round(percentile(s, 90), 4),
+        "p99_ms": round(percentile(s, 99), 4),
+        "max_ms": round(s[-1], 4) if s else 0.0,
+    }
+
+
+def measure(func, iterations: int, before=None) -> dict:
+    """
+    func を iterations 回実行して所要時間を測る
+
+    Args:
+        func: 測る処理（引数なし）
+        iterations: 実行回数
+        before: 毎回 func の前に呼ぶ準備処理（時間には含めない）
+    """
+    samples = []
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+
+def bench_services(word_count: int, args, workdir: Path) -> dict:
+    """合成データを入れた DB で各サービス関数を測る"""
+    db.configure(db_path=str(workdir / "bench.db"), content_pack_path=False)
+    db.init_db()
+    counts = synthetic_data.populate(
+        db.get_connection(),
+        word_count=word_count,
+        user_count=args.users,
+        progress_per_user=args.progress_per_user,
+        topic_count=args.topics,
+        questions_per_topic=args.questions_per_topic,
+        seed=args.seed,
+    )
+    print(f"  データ: {counts}")
+
+    conn = db.get_connection()
+    user_ids = [row[0] for row in conn.execute("SELECT user_id FROM users")]
+    word_ids = [row[0] for row in conn.execute("SELECT word_id FROM words")]
+    topic_ids = [row[0] for row in conn.execute("SELECT grammar_id FROM grammar_topics")]
+    questions = [
+        (row[0], row[1])
+        for row in conn.execute("SELECT question_id, correct_answer FROM grammar_questions")
+    ]
+    rng = random.Random(args.seed)
+    n = args.iterations
+    results = {}
+
+    # 出題（スケジューラを作るところから）
+    results["get_next_word (cold)"] = measure(
+        lambda: word_service.get_next_word(rng.choice(user_ids)),
+        args.cold_iterations,
+        before=word_service.invalidate_schedulers,
+    )
+    # 出題（同じユーザーで繰り返し）
+    user_id = user_ids[0]
+    word_service.get_next_word(user_id)
+    results["get_next_word"] = measure(lambda: word_service.get_next_word(user_id), n)
+    results["get_next_word (filtered)"] = measure(
+        lambda: word_service.get_next_word(user_id, grade_min=1, grade_max=2, level_max=2), n
+    )
+
+    # 回答の記録（DB へ直接書き込む）
+    results["record_answer"] = measure(
+        lambda: word_service.record_answer(
+            user_id, rng.choice(word_ids), rng.random() < 0.7, rng.uniform(1.0, 10.0)
+        ),
+        n,
+    )
+    # 回答の記録（write-behind バッファ経由。アプリと同じ構成）
+    answer_buffer.enable(journal_path=str(workdir / "answer_journal.jsonl"))
+    try:
+        results["record_answer (buffered)"] = measure(
+            lambda: word_service.record_answer(
+                user_id, rng.choice(word_ids), rng.random() < 0.7, rng.uniform(1.0, 10.0)
+            ),
+            n,
+        )
+        results["answer_buffer.flush"] = measure(
+            answer_buffer.flush,
+            max(1, n // 10),
+            before=lambda: [
+                word_service.record_answer(user_id, rng.choice(word_ids), True, 3.0)
+                for _ in range(10)
+            ],
+        )
+    finally:
+        answer_buffer.disable()
+    word_service.invalidate_schedulers()
+
+    results["get_word_stats"] = measure(
+        lambda: word_service.get_word_stats(rng.choice(user_ids)), n
+    )
+
+    results["grammar.get_next_question"] = measure(
+        lambda: grammar_service.get_next_question(rng.choice(user_ids), rng.choice(topic_ids)), n
+    )
+
+    def check_random_answer():
+        question_id, correct_answer = rng.choice(questions)
+        answer = correct_answer if rng.random() < 0.7 else "wrong answer"
+        grammar_service.check_answer(rng.choice(user_ids), question_id, answer)
+
+    results["grammar.check_answer"] = measure(check_random_answer, n)
+
+    db.close_all()
+    return results
+
+
+def bench_imports(word_count: int, args, workdir: Path) -> dict:
+    """教材の取り込み（importer）を空の DB に対して測る（2回目は変更なしの同期）"""
+    words = synthetic_data.generate_words(word_count, args.seed)
+    topics, questions = synthetic_data.generate_grammar(
+        args.topics, args.questions_per_topic, args.seed
+    )
+
+    db.configure(db_path=str(workdir / "import.db"), content_pack_path=False)
+    db.init_db()
+    conn = db.get_connection()
+
+    def import_grammar():
+        importer.import_grammar_topics(topics, conn=conn)
+        importer.sync_grammar_questions(questions, conn=conn)
+
+    results = {
+        "import_words": measure(lambda: importer.sync_words(words, conn=conn), 1),
+        "import_words (rerun)": measure(lambda: importer.sync_words(words, conn=conn), 1),
+        "import_grammar": measure(import_grammar, 1),
+        "import_grammar (rerun)": measure(import_grammar, 1),
+    }
+    db.close_all()
+    return results
+
+
+def print_results(word_count: int, results: dict) -> None:
+    """結果を表で表示する"""
+    print(f"\n=== 単語数 {word_count} ===")
+    print(f"{'処理':<30}{'回数':>6}{'p50(ms)':>12}{'p90(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+    for name, s in results.items():
+        print(
+            f"{name:<30}{s['count']:>6}{s['p50_ms']:>12.3f}{s['p90_ms']:>12.3f}"
+            f"{s['p99_ms']:>12.3f}{s['max_ms']:>12.3f}"
+        )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    ベースラインと比べて遅くなった処理を探す
+
+    Returns:
+        「規模 / 処理: 前回 → 今回」の文字列のリスト（p50 が tolerance を超えて悪化したもの）
+    """
+    regressions = []
+    for scale, ops in results.items():
+        base_ops = baseline.get("results", {}).get(scale, {})
+        for name, s in ops.items():
+            base = base_ops.get(name)
+            if not base:
+                continue
+            if s["p50_ms"] > base["p50_ms"] * (1.0 + tolerance):
+                regressions.append(
+                    f"{scale} / {name}: p50 {base['p50_ms']:.3f}ms → {s['p50_ms']:.3f}ms"
+                )
+    return regressions
+
+
+def run(args) -> int:
+    """ベンチマーク本体。悪化があれば 1 を返す"""
+    word_service.set_selection_mode(args.selection_mode)
+    word_service.set_scheduler_backend(args.backend)
+
+    all_results = {}
+    for word_count in args.scales:
+        print(f"\n単語数 {word_count} で計測中...")
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            results = bench_services(word_count, args, workdir)
+            if not args.skip_imports:
+                results.update(bench_imports(word_count, args, workdir))
+        db.configure()
+        all_results[str(word_count)] = results
+        print_results(word_count, results)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "users": args.users,
+            "progress_per_user": args.progress_per_user,
+            "iterations": args.iterations,
+            "selection_mode": args.selection_mode,
+            "backend": args.backend,
+            "seed": args.seed,
+        },
+        "results": all_results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(all_results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n遅くなった処理（許容 +{args.tolerance:.0%}）:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nベースラインからの悪化はありません")
+
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="主要な処理のベンチマーク")
+    parser.add_argument(
+        "--scales", default="1000,10000,100000",
+        help="単語数（カンマ区切り）。既定: 1000,10000,100000",
+    )
+    parser.add_argument("--users", type=int, default=1000, help="ユーザー数")
+    parser.add_argument(
+        "--progress-per-user", type=int, default=200, help="1ユーザーあたりの回答済み単語数"
+    )
+    parser.add_argument("--topics", type=int, default=20, help="文法トピック数")
+    parser.add_argument("--questions-per-topic", type=int, default=50, help="1トピックの問題数")
+    parser.add_argument("--iterations", type=int, default=200, help="各処理の実行回数")
+    parser.add_argument(
+        "--cold-iterations", type=int, default=5, help="スケジューラ作成を含む出題の実行回数"
+    )
+    parser.add_argument(
+        "--selection-mode", choices=word_service.SELECTION_MODES, default="scheduler"
+    )
+    parser.add_argument("--backend", choices=("heap", "numpy"), default="heap")
+    parser.add_argument("--skip-imports", action="store_true", help="インポートの計測を省く")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--output", help="結果を保存する JSON ファイル")
+    parser.add_argument("--baseline", help="比較するベースラインの JSON ファイル")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="悪化とみなす p50 の増加率（既定 0.2 = 20%%）"
+    )
+    args = parser.parse_args(argv)
+    args.scales = [int(x) for x in args.scales.split(",") if x.strip()]
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+単語の音声をまとめて合成し、音声パック（audio_pack.bin）を作る
+
+words のすべての英単語を VOICE_CHOICES の各ボイスで合成する（プロセスプールで並列）。
+キーは (テキスト, ボイス, 速度) の内容ハッシュなので、作り直すときは
+前回のパックにある音声を使い回し、増えた・変わった単語だけを合成する。
+
+合成した音声は出力先の横の .partial ファイルに順に追記するので、
+途中で止めても次回はそこから再開できる。
+
+例:
+    python scripts/build_audio_pack.py
+    python scripts/build_audio_pack.py --synth fake --jobs 4 --output /tmp/audio_pack.bin
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import audio_pack
+from app.services import db
+from app.services import tts_service
+from app.services.audio_cache import make_key
+
+
+SYNTHESIZERS = {
+    "sapi": tts_service.SapiSynthesizer,
+    "fake": tts_service.FakeSynthesizer,
+}
+
+# .partial ファイルの1件分のヘッダー（キーの長さ, 音声の長さ）
+_RECORD = struct.Struct("<HI")
+
+# ワーカープロセスの合成器
+_worker_synthesizer = None
+
+
+def _init_worker(synth_name: str) -> None:
+    """ワーカープロセスの初期化（合成器はプロセスごとに1つ）"""
+    global _worker_synthesizer
+    tts_service.init_com()
+    _worker_synthesizer = SYNTHESIZERS[synth_name]()
+
+
+def _render(task: tuple) -> tuple[str, bytes]:
+    """1件を合成する（ワーカープロセスで実行）"""
+    key, text, voice, rate = task
+    return key, _worker_synthesizer.synthesize(text, voice, rate)
+
+
+def load_words(words_path: str | None = None) -> list[str]:
+    """
+    合成する英単語
+
+    Args:
+        words_path: words.json 形式のファイル。None なら DB（コンテンツパックがあればそれ）の words
+    """
+    if words_path:
+        with open(words_path, "r", encoding="utf-8") as f:
+            words = [w["english"] for w in json.load(f)]
+    else:
+        db.init_db()
+        conn = db.get_connection()
+        words = [row[0] for row in conn.execute("SELECT english FROM words WHERE retired = 0")]
+    # 重複を除き、順序は保つ
+    return list(dict.fromkeys(w for w in words if w))
+
+
+def plan(words: list[str], voices: list[str], rate: int, synthesizer) -> dict[str, tuple]:
+    """
+    合成する音声の一覧
+
+    ボイスはアプリと同じく resolve_voice で実際のボイスに直してからキーにする
+    （SAPI のように指定を無視する合成器では、ボイスが違っても同じ音声を1回だけ合成する）。
+
+    Returns:
+        {キー: (テキスト, ボイス, 速度)}
+    """
+    tasks = {}
+    for voice in voices:
+        resolved = synthesizer.resolve_voice(voice)
+        for text in words:
+            tasks.setdefault(make_key(text, resolved, rate), (text, resolved, rate))
+    return tasks
+
+
+def read_partial(path: Path) -> dict[str, bytes]:
+    """前回の途中までの .partial ファイルを読む（最後の書きかけの1件は捨てる）"""
+    recovered = {}
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return recovered
+    pos = 0
+    while pos + _RECORD.size <= len(data):
+        key_length, audio_length = _RECORD.unpack_from(data, pos)
+        end = pos + _RECORD.size + key_length + audio_length
+        if end > len(data):
+            break
+        key = data[pos + _RECORD.size:pos + _RECORD.size + key_length].decode("ascii")
+        recovered[key] = data[pos + _RECORD.size + key_length:end]
+        pos = end
+    return recovered
+
+
+def build(
+    output: Path,
+    words: list[str],
+    voices: list[str],
+    rate: int = 0,
+    synth_name: str = "sapi",
+    jobs: int | None = None,
+    force: bool = False,
+) -> dict:
+    """
+    音声パックを作る
+
+    Returns:
+        {"entries", "reused", "resumed", "synthesized", "seconds"}
+    """
+    started = time.perf_counter()
+    output = Path(output)
+    partial_path = output.with_name(output.name + ".partial")
+
+    tts_service.init_com()
+    tasks = plan(words, voices, rate, SYNTHESIZERS[synth_name]())
+
+    old = None
+    if output.exists() and not force:
+        try:
+            old = audio_pack.AudioPack(output)
+            if old.meta.get("synthesizer") != synth_name:
+                print("前回のパックは合成器が違うため使い回しません")
+                old.close()
+                old = None
+        except audio_pack.AudioPackError as e:
+            print(f"前回のパックは使えません: {e}")
+    if force and partial_path.exists():
+        partial_path.unlink()
+    recovered = read_partial(partial_path)
+
+    todo = [
+        (key, *task) for key, task in tasks.items()
+        if key not in recovered and (old is None or key not in old)
+    ]
+    reused = sum(1 for key in tasks if old is not None and key in old)
+    resumed = sum(1 for key in tasks if key in recovered)
+    print(
+        f"単語 {len(words)} / ボイス {len(voices)} → 音声 {len(tasks)} 件"
+        f"（前回のパック {reused} / 再開 {resumed} / 合成 {len(todo)}）"
+    )
+
+    if todo:
+        jobs = jobs or os.cpu_count() or 1
+        chunksize = max(1, min(64, len(todo) // (jobs * 8)))
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(synth_name,)
+        )
+        try:
+            with open(partial_path, "ab") as partial:
+                for done, (key, data) in enumerate(
+                    executor.map(_render, todo, chunksize=chunksize), start=1
+                ):
+                    encoded = key.encode("ascii")
+                    partial.write(_RECORD.pack(len(encoded), len(data)) + encoded + data)
+                    recovered[key] = data
+                    if done % 500 == 0 or done == len(todo):
+                        partial.flush()
+                        print(f"  合成 {done}/{len(todo)}")
+        except KeyboardInterrupt:
+            # 残りの合成は待たない（合成済みの分は .partial に残り、次回はそこから再開する）
+            executor.shutdown(wait=False, cancel_futures=True)
+            if old is not None:
+                old.close()
+            print(f"\n中断しました（途中経過: {partial_path}）")
+            raise
+        executor.shutdown()
+
+    def blobs():
+        # 前回のパックはメモリマップしているので、読み終わったら閉じてから置き換える
+        try:
+            for key in tasks:
+                data = recovered.get(key)
+                yield key, data if data is not None else old.get(key)
+        finally:
+            if old is not None:
+                old.close()
+
+    meta = {
+        "synthesizer": synth_name,
+        "rate": rate,
+        "voices": voices,
+        "words": len(words),
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    entries = audio_pack.write_pack(output, blobs(), meta)
+    if partial_path.exists():
+        partial_path.unlink()
+
+    return {
+        "entries": entries,
+        "reused": reused,
+        "resumed": resumed,
+        "synthesized": len(todo),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="単語の音声をまとめて合成し、音声パックを作る")
+    parser.add_argument(
+        "--output", default=str(audio_pack.default_pack_path()), help="出力先（audio_pack.bin）"
+    )
+    parser.add_argument("--words", help="words.json 形式のファイル（省略時は DB の単語）")
+    parser.add_argument(
+        "--voices", help="ボイス（カンマ区切り）。省略時は VOICE_CHOICES のすべて"
+    )
+    parser.add_argument("--rate", type=int, default=0, help="読み上げ速度（-10〜10）")
+    parser.add_argument(
+        "--synth", choices=tuple(SYNTHESIZERS), default="sapi",
+        help="合成器（fake は確認用の決まった音）",
+    )
+    parser.add_argument("--jobs", type=int, help="並列数（既定: CPU 数）")
+    parser.add_argument("--force", action="store_true", help="前回のパック・途中経過を使わずに作り直す")
+    args = parser.parse_args()
+
+    if args.synth == "sapi" and not tts_service.SAPI_AVAILABLE:
+        print("SAPI が利用できません（--synth fake で確認用のパックを作れます）")
+        return 1
+
+    voices = (
+        [v.strip() for v in args.voices.split(",") if v.strip()]
+        if args.voices else [voice_id for _, voice_id in tts_service.VOICE_CHOICES]
+    )
+    try:
+        result = build(
+            Path(args.output),
+            load_words(args.words),
+            voices,
+            rate=args.rate,
+            synth_name=args.synth,
+            jobs=args.jobs,
+            force=args.force,
+        )
+    except KeyboardInterrupt:
+        return 130
+    print(f"\n完了: {args.output}（{result['entries']} 件、{result['seconds']} 秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+教材 JSON からコンテンツパック（読み込み専用の content.db）を作る
+
+前回のパックがあれば引き継いで差分同期するので、word_id / question_id は変わらない
+（ファイルから消えた単語・問題は廃止扱いで残る）。
+初めて作るときに --id-source で既存の app.db を指定すると、その ID を引き継ぐ。
+
+例:
+    python scripts/build_content_pack.py
+    python scripts/build_content_pack.py --id-source %APPDATA%/JHSEnglishTrainer/data/app.db
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import content_pack
+from app.services import importer
+
+
+def _copy_ids_from(conn: sqlite3.Connection, source: Path) -> None:
+    """既存の app.db の教材を ID ごとコピーする（新しいパックを作るときだけ）"""
+    conn.execute("ATTACH DATABASE ? AS src", (Path(source).resolve().as_uri() + "?mode=ro",))
+    src_columns = {row[1] for row in conn.execute("PRAGMA src.table_info(words)")}
+    retired = "retired" if "retired" in src_columns else "0"
+    content_hash = "content_hash" if "content_hash" in src_columns else "NULL"
+    with conn:
+        conn.execute(f"""
+            INSERT INTO words
+            (word_id, english, japanese, grade, unit, level, created_at, content_hash, retired)
+            SELECT word_id, english, japanese, grade, unit, level, created_at,
+                   {content_hash}, {retired}
+            FROM src.words
+        """)
+        conn.execute("""
+            INSERT INTO grammar_topics
+            (grammar_id, title, description, level, related_units, created_at)
+            SELECT grammar_id, title, description, level, related_units, created_at
+            FROM src.grammar_topics
+        """)
+        conn.execute(f"""
+            INSERT INTO grammar_questions
+            (question_id, grammar_id, question_type, prompt_text, choice1, choice2, choice3,
+             choice4, correct_answer, explanation, content_hash, retired)
+            SELECT question_id, grammar_id, question_type, prompt_text, choice1, choice2,
+                   choice3, choice4, correct_answer, explanation, {content_hash}, {retired}
+            FROM src.grammar_questions
+        """)
+    conn.execute("DETACH DATABASE src")
+
+
+def build_pack(
+    output: Path,
+    words_path: Path,
+    topics_path: Path,
+    questions_path: Path,
+    id_source: Path | None = None,
+    verbose: bool = False,
+) -> dict:
+    """
+    コンテンツパックを作る（一時ファイルに作ってから置き換える）
+
+    Returns:
+        pack_info の内容
+    """
+    log = print if verbose else None
+    output = Path(output)
+    tmp = output.with_name(output.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+
+    previous = {}
+    if output.exists():
+        with sqlite3.connect(output) as old:
+            previous = content_pack.read_info(old)
+        # 古いスキーマのパックも create_schema が列を足すので引き継げる
+        if previous.get("schema_version") in {
+            str(v) for v in range(1, content_pack.PACK_SCHEMA_VERSION + 1)
+        }:
+            shutil.copyfile(output, tmp)
+        else:
+            print("前回のパックはスキーマが合わないため引き継ぎません（ID が変わります）")
+            previous = {}
+
+    conn = sqlite3.connect(tmp)
+    conn.row_factory = sqlite3.Row
+    try:
+        content_pack.create_schema(conn)
+        if not previous and id_source:
+            _copy_ids_from(conn, id_source)
+            print(f"ID を引き継ぎました: {id_source}")
+
+        file_hashes = {}
+        paths = {"words": words_path, "grammar_topics": topics_path,
+                 "grammar_questions": questions_path}
+        data = {}
+        for name, path in paths.items():
+            raw = Path(path).read_bytes()
+            file_hashes[name] = hashlib.blake2b(raw, digest_size=16).hexdigest()
+            data[name] = json.loads(raw.decode("utf-8"))
+
+        topics = importer.import_grammar_topics(data["grammar_topics"], log=log, conn=conn)
+        words = importer.sync_words(data["words"], log=log, conn=conn)
+        questions = importer.sync_grammar_questions(data["grammar_questions"], log=log, conn=conn)
+
+        # 同じ内容なら同じバージョンになる（アプリ側の集計の作り直しを避ける）
+        version = hashlib.blake2b(
+            json.dumps([content_pack.PACK_SCHEMA_VERSION, file_hashes], sort_keys=True).encode(),
+            digest_size=8,
+        ).hexdigest()
+        info = {
+            "schema_version": str(content_pack.PACK_SCHEMA_VERSION),
+            "version": version,
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+            "source_hashes": json.dumps(file_hashes),
+        }
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pack_info (key, value) VALUES (?, ?)", info.items()
+            )
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    os.replace(tmp, output)
+
+    print(
+        f"単語: 追加 {words['inserted']} / 更新 {words['updated']} / 廃止 {words['retired']} / "
+        f"変更なし {words['unchanged']}"
+    )
+    if words["confusables"] is not None:
+        print(f"紛らわしい単語の組: {words['confusables'] // 2}")
+    print(f"トピック: 追加 {topics['inserted']} / 更新 {topics['updated']}")
+    print(
+        f"問題: 追加 {questions['inserted']} / 更新 {questions['updated']} / "
+        f"廃止 {questions['retired']} / 変更なし {questions['unchanged']}"
+    )
+    return info
+
+
+if __name__ == "__main__":
+    data_dir = project_root / "data"
+    parser = argparse.ArgumentParser(description="教材 JSON からコンテンツパックを作る")
+    parser.add_argument(
+        "--output", default=str(content_pack.default_pack_path()), help="出力先（content.db）"
+    )
+    parser.add_argument("--words", default=str(data_dir / "words.json"))
+    parser.add_argument("--topics", default=str(data_dir / "grammar_topics.json"))
+    parser.add_argument("--questions", default=str(data_dir / "grammar_questions.json"))
+    parser.add_argument(
+        "--id-source", help="新しくパックを作るときに ID を引き継ぐ app.db"
+    )
+    parser.add_argument("--verbose", action="store_true", help="詳細ログを出す")
+    args = parser.parse_args()
+    info = build_pack(
+        Path(args.output),
+        Path(args.words),
+        Path(args.topics),
+        Path(args.questions),
+        id_source=Path(args.id_source) if args.id_source else None,
+        verbose=args.verbose,
+    )
+    print(f"\n完了: {args.output}（バージョン {info['version']}）")
@@ -1,7 +1,10 @@
 """
 grammar_topics.json と grammar_questions.json から文法データをインポート
+
+問題は既定で教材ファイルとの差分同期を行う（ファイルから消えた問題は廃止扱い）。
+トピックは追加・更新のみ。
 """
-import json
+import argparse
 import sys
 from pathlib import Path
 
@@ -10,107 +13,106 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from app.services import db
+from app.services import importer
+
 
+# content_sync_state に記録する名前
+TOPICS_SOURCE = "grammar_topics"
+QUESTIONS_SOURCE = "grammar_questions"
 
-def import_grammar():
-    """文法トピックと問題をインポート"""
-    topics_path = project_root / "data" / "grammar_topics.json"
-    questions_path = project_root / "data" / "grammar_questions.json"
+
+def import_grammar(
+    topics_path: Path | None = None,
+    questions_path: Path | None = None,
+    verbose: bool = False,
+    chunk_size: int = importer.CHUNK_SIZE,
+    append: bool = False,
+    force: bool = False,
+):
+    """
+    文法トピックと問題をインポート
+    
+    Args:
+        topics_path: トピックの JSON（省略時は data/grammar_topics.json）
+        questions_path: 問題の JSON（省略時は data/grammar_questions.json）
+        verbose: True なら重複・進捗などの詳細ログを出す
+        chunk_size: 1トランザクションで書き込む件数
+        append: True なら問題の追加・更新だけ行い、ファイルにない問題を廃止しない
+        force: True ならファイルが前回の同期から変わっていなくても処理する
+    """
+    topics_path = Path(topics_path) if topics_path else project_root / "data" / "grammar_topics.json"
+    questions_path = (
+        Path(questions_path) if questions_path else project_root / "data" / "grammar_questions.json"
+    )
+    log = print if verbose else None
     
-    conn = db.get_connection()
-    cursor = conn.cursor()
+    # 教材は app.db に入れる（コンテンツパックは使わない。DB の場所は configure() の指定のまま）
+    db.set_content_pack(False)
+    db.init_db()
     
-    # トピックをインポート
+    # トピックをインポート（問題のトピック名を解決するので先に行う）
     if topics_path.exists():
-        with open(topics_path, 'r', encoding='utf-8') as f:
-            topics = json.load(f)
-        
-        topic_map = {}  # title -> grammar_id
-        
-        for topic in topics:
-            # 既存チェック
-            cursor.execute("SELECT grammar_id FROM grammar_topics WHERE title = ?", (topic['title'],))
-            existing = cursor.fetchone()
-            
-            if existing:
-                grammar_id = existing['grammar_id']
-                print(f"スキップ（トピック）: {topic['title']} (既に存在)")
-            else:
-                cursor.execute("""
-                    INSERT INTO grammar_topics (title, description, level, related_units)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    topic['title'],
-                    topic.get('description'),
-                    topic.get('level'),
-                    json.dumps(topic.get('related_units', []), ensure_ascii=False)
-                ))
-                grammar_id = cursor.lastrowid
-                print(f"インポート（トピック）: {topic['title']}")
-            
-            topic_map[topic['title']] = grammar_id
-        
-        conn.commit()
+        topics, digest = importer.load_if_changed(topics_path, TOPICS_SOURCE, force=force)
+        if topics is None:
+            print("トピック: 変更なし")
+        else:
+            result = importer.import_grammar_topics(topics, chunk_size=chunk_size, log=log)
+            importer.mark_synced(TOPICS_SOURCE, digest)
+            print(
+                f"トピック: 追加 {result['inserted']}件 / 更新 {result['updated']}件 / "
+                f"変更なし {result['unchanged']}件"
+            )
     
     # 問題をインポート
     if questions_path.exists():
-        with open(questions_path, 'r', encoding='utf-8') as f:
-            questions = json.load(f)
-        
-        imported = 0
-        for q in questions:
-            grammar_title = q['grammar_title']
-            grammar_id = topic_map.get(grammar_title)
-            
-            if not grammar_id:
-                print(f"エラー: トピック '{grammar_title}' が見つかりません")
-                continue
-            
-            # 既存チェック（prompt_textで判定）
-            cursor.execute("""
-                SELECT question_id FROM grammar_questions 
-                WHERE grammar_id = ? AND prompt_text = ?
-            """, (grammar_id, q['prompt_text']))
-            
-            if cursor.fetchone():
-                print(f"スキップ（問題）: {q['prompt_text']} (既に存在)")
-                continue
-            
-            cursor.execute("""
-                INSERT INTO grammar_questions 
-                (grammar_id, question_type, prompt_text, choice1, choice2, choice3, choice4, 
-                 correct_answer, explanation)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                grammar_id,
-                q['question_type'],
-                q['prompt_text'],
-                q.get('choice1'),
-                q.get('choice2'),
-                q.get('choice3'),
-                q.get('choice4'),
-                q['correct_answer'],
-                q.get('explanation')
-            ))
-            imported += 1
-            print(f"インポート（問題）: {q['prompt_text']}")
-        
-        conn.commit()
-        print(f"\n完了: {imported}件の問題をインポートしました")
+        questions, digest = importer.load_if_changed(
+            questions_path, QUESTIONS_SOURCE, force=force or append
+        )
+        if questions is None:
+            print("問題: 変更なし")
+        elif append:
+            result = importer.import_grammar_questions(questions, chunk_size=chunk_size, log=log)
+            _print_missing(result)
+            print(
+                f"\n完了: {result['inserted']}件の問題をインポートしました"
+                f"（更新 {result['updated']}件 / 変更なし {result['unchanged']}件）"
+            )
+        else:
+            result = importer.sync_grammar_questions(
+                questions, source=QUESTIONS_SOURCE, digest=digest, log=log
+            )
+            _print_missing(result)
+            print(
+                f"\n完了: 問題 追加 {result['inserted']}件 / 更新 {result['updated']}件 / "
+                f"廃止 {result['retired']}件 / 変更なし {result['unchanged']}件"
+            )
     
-    conn.close()
-
-
-if __name__ == "__main__":
-    import_grammar()
-
-
-
-
-
-
-
+    db.close_connection()
 
 
+def _print_missing(result: dict):
+    if result['missing_topic']:
+        print(f"エラー: トピックが見つからない問題が {result['missing_topic']}件ありました")
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="文法トピックと問題をインポート")
+    parser.add_argument("--topics", help="トピックの JSON（省略時は data/grammar_topics.json）")
+    parser.add_argument("--questions", help="問題の JSON（省略時は data/grammar_questions.json）")
+    parser.add_argument("--verbose", action="store_true", help="詳細ログを出す")
+    parser.add_argument(
+        "--append", action="store_true", help="ファイルにない問題を廃止せず、追加・更新だけ行う"
+    )
+    parser.add_argument("--force", action="store_true", help="ファイルが変わっていなくても同期する")
+    parser.add_argument(
+        "--chunk-size", type=int, default=importer.CHUNK_SIZE, help="1トランザクションの件数"
+    )
+    args = parser.parse_args()
+    import_grammar(
+        args.topics,
+        args.questions,
+        verbose=args.verbose,
+        chunk_size=args.chunk_size,
+        append=args.append,
+        force=args.force,
+    )
@@ -1,7 +1,10 @@
 """
 words.json から単語データをインポート
+
+既定では教材ファイルとの差分同期を行う（追加・変更された単語だけを書き込み、
+ファイルから消えた単語は廃止扱いにする）。学習進捗はそのまま残る。
 """
-import json
+import argparse
 import sys
 from pathlib import Path
 
@@ -10,59 +13,92 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from app.services import db
+from app.services import importer
+
+
+# content_sync_state に記録する名前
+SYNC_SOURCE = "words"
+
+
+def _print_confusables(result: dict) -> None:
+    """作り直した紛らわしい単語のグラフの件数を表示する"""
+    if result["confusables"] is not None:
+        print(f"紛らわしい単語の組: {result['confusables'] // 2}組")
 
 
-def import_words():
-    """words.jsonから単語をインポート"""
-    json_path = project_root / "data" / "words.json"
+def import_words(
+    json_path: Path | None = None,
+    verbose: bool = False,
+    chunk_size: int = importer.CHUNK_SIZE,
+    append: bool = False,
+    force: bool = False,
+):
+    """
+    words.jsonから単語をインポート
+    
+    Args:
+        json_path: 読み込む JSON（省略時は data/words.json）
+        verbose: True なら重複・進捗などの詳細ログを出す
+        chunk_size: 1トランザクションで書き込む件数（append のとき）
+        append: True なら追加・更新だけ行い、ファイルにない単語を廃止しない
+        force: True ならファイルが前回の同期から変わっていなくても処理する
+    """
+    json_path = Path(json_path) if json_path else project_root / "data" / "words.json"
     
     if not json_path.exists():
         print(f"エラー: {json_path} が見つかりません")
         return
     
-    with open(json_path, 'r', encoding='utf-8') as f:
-        words = json.load(f)
+    # 教材は app.db に入れる（コンテンツパックは使わない。DB の場所は configure() の指定のまま）
+    db.set_content_pack(False)
+    db.init_db()
+    log = print if verbose else None
     
-    conn = db.get_connection()
-    cursor = conn.cursor()
+    if append:
+        words, _ = importer.load_if_changed(json_path, SYNC_SOURCE, force=True)
+        result = importer.import_words(words, chunk_size=chunk_size, log=log)
+        db.close_connection()
+        print(
+            f"\n完了: {result['inserted']}件の単語をインポートしました"
+            f"（更新 {result['updated']}件 / 変更なし {result['unchanged']}件 / "
+            f"ファイル内の重複 {result['duplicates']}件）"
+        )
+        _print_confusables(result)
+        return
     
-    imported = 0
-    for word in words:
-        # 既存チェック（englishで判定）
-        cursor.execute("SELECT word_id FROM words WHERE english = ?", (word['english'],))
-        if cursor.fetchone():
-            print(f"スキップ: {word['english']} (既に存在)")
-            continue
-        
-        cursor.execute("""
-            INSERT INTO words (english, japanese, grade, unit, level)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            word['english'],
-            word['japanese'],
-            word.get('grade'),
-            word.get('unit'),
-            word.get('level')
-        ))
-        imported += 1
-        print(f"インポート: {word['english']} - {word['japanese']}")
+    words, digest = importer.load_if_changed(json_path, SYNC_SOURCE, force=force)
+    if words is None:
+        db.close_connection()
+        print("変更なし: 前回の同期からファイルが変わっていません")
+        return
     
-    conn.commit()
-    conn.close()
+    result = importer.sync_words(words, source=SYNC_SOURCE, digest=digest, log=log)
+    db.close_connection()
     
-    print(f"\n完了: {imported}件の単語をインポートしました")
+    print(
+        f"\n完了: 追加 {result['inserted']}件 / 更新 {result['updated']}件 / "
+        f"廃止 {result['retired']}件 / 変更なし {result['unchanged']}件"
+        f"（ファイル内の重複 {result['duplicates']}件）"
+    )
+    _print_confusables(result)
 
 
 if __name__ == "__main__":
-    import_words()
-
-
-
-
-
-
-
-
-
-
-
+    parser = argparse.ArgumentParser(description="words.json から単語データをインポート")
+    parser.add_argument("json_path", nargs="?", help="読み込む JSON（省略時は data/words.json）")
+    parser.add_argument("--verbose", action="store_true", help="詳細ログを出す")
+    parser.add_argument(
+        "--append", action="store_true", help="ファイルにない単語を廃止せず、追加・更新だけ行う"
+    )
+    parser.add_argument("--force", action="store_true", help="ファイルが変わっていなくても同期する")
+    parser.add_argument(
+        "--chunk-size", type=int, default=importer.CHUNK_SIZE, help="1トランザクションの件数"
+    )
+    args = parser.parse_args()
+    import_words(
+        args.json_path,
+        verbose=args.verbose,
+        chunk_size=args.chunk_size,
+        append=args.append,
+        force=args.force,
+    )
@@ -0,0 +1,34 @@
+"""
+回答イベントログ（answer_events）から word_progress / grammar_progress を作り直す
+イベントのない単語・トピックの進捗（ログを取り始める前の学習）はそのまま残る。
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import db
+from app.services import word_service
+from app.services import grammar_service
+
+
+def rebuild_progress(user_id: int | None = None):
+    """進捗テーブルをイベントログから作り直す"""
+    db.init_db()
+    
+    word_rows = word_service.rebuild_word_progress(user_id)
+    grammar_rows = grammar_service.rebuild_grammar_progress(user_id)
+    
+    db.close_connection()
+    
+    print(f"完了: word_progress {word_rows}件 / grammar_progress {grammar_rows}件を作り直しました")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="イベントログから学習進捗を作り直す")
+    parser.add_argument("--user-id", type=int, default=None, help="このユーザーの分だけ作り直す")
+    args = parser.parse_args()
+    rebuild_progress(args.user_id)
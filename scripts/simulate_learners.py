@@ -0,0 +1,321 @@
+"""
+学習者シミュレーター（Qt なしの負荷テスト）
+多数の生徒が1つの DB ファイルを同時に使う状況を、プロセスプールで再現する。
+
+各生徒は正答率・回答時間のプロファイルを持ち、単語（get_next_word → record_answer）と
+文法（get_next_question → check_answer）を交互に解く。
+生徒はプロセスごとに分担し、全員が1問ずつ解く「ラウンド」を繰り返す。
+
+結果として以下を表示する:
+- 1秒あたりの回答数
+- ロック競合（database is locked / busy）のエラー数
+- 回答履歴が増えるにつれて出題の p99 レイテンシがどう伸びるか
+
+例:
+    python scripts/simulate_learners.py --students 2000 --words 5000 --processes 4
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import db
+from app.services import answer_buffer
+from app.services import word_service
+from app.services import grammar_service
+from scripts import synthetic_data
+from scripts.benchmark import percentile
+
+
+# 生徒のプロファイル: (正答率, 平均回答時間(秒))
+PROFILES = {
+    "struggling": (0.55, 8.0),
+    "average": (0.75, 5.0),
+    "strong": (0.92, 3.0),
+}
+DEFAULT_PROFILE_MIX = "struggling=0.3,average=0.5,strong=0.2"
+
+
+def parse_profile_mix(text: str) -> list[tuple[str, float]]:
+    """ "name=割合,..." を [(name, 割合), ...] にする（割合は合計 1 に正規化）"""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in PROFILES:
+            raise ValueError(f"未知のプロファイルです: {name}（{', '.join(PROFILES)}）")
+        mix.append((name, float(weight or 1)))
+    total = sum(w for _, w in mix)
+    return [(name, w / total) for name, w in mix]
+
+
+def _is_lock_error(e: sqlite3.OperationalError) -> bool:
+    message = str(e).lower()
+    return "locked" in message or "busy" in message
+
+
+def prepare_database(args) -> dict:
+    """DB ファイルを初期化し、空なら合成データ（単語・文法・生徒）を入れる"""
+    db.configure(db_path=args.db, content_pack_path=False)
+    db.init_db()
+    conn = db.get_connection()
+    if conn.execute("SELECT COUNT(*) FROM words").fetchone()[0] == 0:
+        counts = synthetic_data.populate(
+            conn,
+            word_count=args.words,
+            user_count=args.students,
+            progress_per_user=0,
+            topic_count=args.topics,
+            questions_per_topic=args.questions_per_topic,
+            seed=args.seed,
+        )
+        print(f"合成データを作成しました: {counts}")
+    user_ids = [row[0] for row in conn.execute("SELECT user_id FROM users ORDER BY user_id")]
+    topic_ids = [row[0] for row in conn.execute("SELECT grammar_id FROM grammar_topics")]
+    db.close_all()
+    return {"user_ids": user_ids[:args.students], "topic_ids": topic_ids}
+
+
+def run_worker(task: dict) -> dict:
+    """
+    1プロセス分の生徒を動かす（プロセスプールから呼ばれる）
+
+    Args:
+        task: worker, db, students [(user_id, 正答率, 平均回答時間)], topic_ids, 設定値
+
+    Returns:
+        回答数・エラー数・ラウンド区間ごとの出題レイテンシ(ms) など
+    """
+    db.configure(db_path=task["db"], content_pack_path=False)
+    word_service.set_selection_mode(task["selection_mode"])
+    rng = random.Random(task["seed"] * 1000 + task["worker"])
+
+    if task["buffered"]:
+        journal = Path(tempfile.gettempdir()) / f"sim_journal_{os.getpid()}.jsonl"
+        answer_buffer.enable(journal_path=str(journal))
+
+    result = {
+        "word_answers": 0,
+        "grammar_answers": 0,
+        "lock_errors": 0,
+        "other_errors": 0,
+        "select_ms": {},  # ラウンド区間 -> [ms, ...]
+        "record_ms": [],
+    }
+    rounds = task["rounds"]
+    bucket_size = task["bucket_size"]
+    since_flush = 0
+    # 生徒ごとの直前の単語（紛らわしい単語を続けて出すために get_next_word に渡す）
+    previous_words: dict[int, dict] = {}
+
+    start = time.perf_counter()
+    for round_no in range(rounds):
+        bucket = str(round_no // bucket_size * bucket_size)
+        select_samples = result["select_ms"].setdefault(bucket, [])
+        for user_id, accuracy, mean_time in task["students"]:
+            answer_time = rng.lognormvariate(math.log(mean_time), 0.4)
+            try:
+                if task["topic_ids"] and rng.random() < task["grammar_ratio"]:
+                    t0 = time.perf_counter()
+                    question = grammar_service.get_next_question(
+                        user_id, rng.choice(task["topic_ids"])
+                    )
+                    select_samples.append((time.perf_counter() - t0) * 1000.0)
+                    if question is None:
+                        continue
+                    answer = (
+                        question["correct_answer"] if rng.random() < accuracy else "wrong"
+                    )
+                    t0 = time.perf_counter()
+                    grammar_service.check_answer(user_id, question["question_id"], answer)
+                    result["record_ms"].append((time.perf_counter() - t0) * 1000.0)
+                    result["grammar_answers"] += 1
+                else:
+                    t0 = time.perf_counter()
+                    word = word_service.get_next_word(user_id, previous=previous_words.get(user_id))
+                    select_samples.append((time.perf_counter() - t0) * 1000.0)
+                    if word is None:
+                        continue
+                    previous_words[user_id] = word
+                    # 上のステージほど少しだけ正答率が上がる
+                    p = min(0.98, accuracy + 0.03 * (word["stage"] - 1))
+                    t0 = time.perf_counter()
+                    word_service.record_answer(
+                        user_id, word["word_id"], rng.random() < p, answer_time
+                    )
+                    result["record_ms"].append((time.perf_counter() - t0) * 1000.0)
+                    result["word_answers"] += 1
+
+                if task["buffered"]:
+                    since_flush += 1
+                    if since_flush >= task["flush_every"]:
+                        since_flush = 0
+                        answer_buffer.flush()
+            except sqlite3.OperationalError as e:
+                if _is_lock_error(e):
+                    result["lock_errors"] += 1
+                else:
+                    result["other_errors"] += 1
+
+    if task["buffered"]:
+        try:
+            answer_buffer.disable()
+        except sqlite3.OperationalError as e:
+            result["lock_errors" if _is_lock_error(e) else "other_errors"] += 1
+        journal.unlink(missing_ok=True)
+    result["elapsed_sec"] = time.perf_counter() - start
+    db.close_all()
+    return result
+
+
+def simulate(args) -> dict:
+    """シミュレーション本体"""
+    prepared = prepare_database(args)
+    user_ids = prepared["user_ids"]
+    if not user_ids:
+        raise RuntimeError("生徒（users）がいません")
+
+    rng = random.Random(args.seed)
+    mix = parse_profile_mix(args.profiles)
+    names = [name for name, _ in mix]
+    weights = [w for _, w in mix]
+    students = []
+    for user_id in user_ids:
+        base_accuracy, base_time = PROFILES[rng.choices(names, weights)[0]]
+        # 同じプロファイルでも生徒ごとに少しばらつかせる
+        accuracy = min(0.99, max(0.05, rng.gauss(base_accuracy, 0.05)))
+        mean_time = max(0.5, rng.gauss(base_time, base_time * 0.2))
+        students.append((user_id, accuracy, mean_time))
+
+    tasks = [
+        {
+            "worker": i,
+            "db": args.db,
+            "students": students[i::args.processes],
+            "topic_ids": prepared["topic_ids"],
+            "rounds": args.rounds,
+            "bucket_size": args.bucket_size,
+            "grammar_ratio": args.grammar_ratio,
+            "selection_mode": args.selection_mode,
+            "buffered": args.buffered,
+            "flush_every": args.flush_every,
+            "seed": args.seed,
+        }
+        for i in range(args.processes)
+    ]
+
+    print(
+        f"生徒 {len(students)} 人 × {args.rounds} ラウンドを "
+        f"{args.processes} プロセスで実行中..."
+    )
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        results = list(pool.map(run_worker, tasks))
+    elapsed = time.perf_counter() - start
+
+    select_by_bucket: dict[str, list[float]] = {}
+    record_ms = []
+    for r in results:
+        for bucket, samples in r["select_ms"].items():
+            select_by_bucket.setdefault(bucket, []).extend(samples)
+        record_ms.extend(r["record_ms"])
+    record_ms.sort()
+
+    answers = sum(r["word_answers"] + r["grammar_answers"] for r in results)
+    growth = []
+    for bucket in sorted(select_by_bucket, key=int):
+        samples = sorted(select_by_bucket[bucket])
+        growth.append({
+            "from_round": int(bucket),
+            "samples": len(samples),
+            "p50_ms": round(percentile(samples, 50), 4),
+            "p99_ms": round(percentile(samples, 99), 4),
+        })
+
+    return {
+        "students": len(students),
+        "processes": args.processes,
+        "rounds": args.rounds,
+        "selection_mode": args.selection_mode,
+        "buffered": args.buffered,
+        "elapsed_sec": round(elapsed, 3),
+        "word_answers": sum(r["word_answers"] for r in results),
+        "grammar_answers": sum(r["grammar_answers"] for r in results),
+        "answers_per_sec": round(answers / elapsed, 1) if elapsed > 0 else 0.0,
+        "lock_errors": sum(r["lock_errors"] for r in results),
+        "other_errors": sum(r["other_errors"] for r in results),
+        "record_p50_ms": round(percentile(record_ms, 50), 4),
+        "record_p99_ms": round(percentile(record_ms, 99), 4),
+        "selection_latency_growth": growth,
+    }
+
+
+def print_report(report: dict) -> None:
+    """結果を表示する"""
+    print(f"\n所要時間: {report['elapsed_sec']:.1f} 秒")
+    print(
+        f"回答数: 単語 {report['word_answers']} / 文法 {report['grammar_answers']}"
+        f"（{report['answers_per_sec']:.1f} 回答/秒）"
+    )
+    print(f"ロック競合エラー: {report['lock_errors']} / その他のエラー: {report['other_errors']}")
+    print(f"記録: p50 {report['record_p50_ms']:.3f}ms / p99 {report['record_p99_ms']:.3f}ms")
+    print("\n出題レイテンシ（回答履歴の増加に対して）")
+    print(f"{'ラウンド':>10}{'件数':>10}{'p50(ms)':>12}{'p99(ms)':>12}")
+    for row in report["selection_latency_growth"]:
+        print(f"{row['from_round']:>10}{row['samples']:>10}{row['p50_ms']:>12.3f}{row['p99_ms']:>12.3f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="学習者シミュレーター（負荷テスト）")
+    parser.add_argument(
+        "--db", help="共有する DB ファイル（省略時は一時ファイルに合成データを作る）"
+    )
+    parser.add_argument("--students", type=int, default=2000, help="生徒数")
+    parser.add_argument("--words", type=int, default=5000, help="合成する単語数（DB が空の場合）")
+    parser.add_argument("--topics", type=int, default=20, help="合成する文法トピック数")
+    parser.add_argument("--questions-per-topic", type=int, default=20, help="1トピックの問題数")
+    parser.add_argument("--rounds", type=int, default=50, help="1人あたりの回答数")
+    parser.add_argument("--bucket-size", type=int, default=10, help="レイテンシを集計するラウンド幅")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="プロセス数")
+    parser.add_argument("--grammar-ratio", type=float, default=0.2, help="文法問題を解く割合")
+    parser.add_argument(
+        "--profiles", default=DEFAULT_PROFILE_MIX,
+        help=f"プロファイルの割合（{', '.join(PROFILES)}）。既定: {DEFAULT_PROFILE_MIX}",
+    )
+    parser.add_argument(
+        "--selection-mode", choices=word_service.SELECTION_MODES, default="sql",
+        help="出題方式。scheduler は生徒ごとに全単語をメモリに持つので生徒数が多いと重い",
+    )
+    parser.add_argument("--buffered", action="store_true", help="write-behind バッファを使う")
+    parser.add_argument("--flush-every", type=int, default=50, help="バッファを反映する回答数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--output", help="結果を保存する JSON ファイル")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.db:
+            args.db = str(Path(tmp) / "simulation.db")
+        report = simulate(args)
+        db.configure()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+ベンチマーク・シミュレーション用の合成データを作る
+単語・文法トピック・文法問題・ユーザー・学習進捗を、指定した規模でまとめて生成する。
+同じ seed なら同じデータになる。
+"""
+import json
+import random
+import string
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.services import answer_log
+from app.services import word_scheduler
+
+UNITS = [
+    "pronoun", "family", "school", "food", "animal", "time", "weather",
+    "sports", "hobby", "town", "body", "nature", "job", "feeling", "travel",
+]
+QUESTION_TYPES = ["mcq", "mcq", "mcq", "fill"]
+
+
+def _random_word(rng: random.Random, i: int) -> str:
+    """重複しない英単語風の文字列（末尾に通し番号を付ける）"""
+    length = rng.randint(3, 9)
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length)) + str(i)
+
+
+def generate_words(count: int, seed: int = 0) -> list[dict]:
+    """
+    words.json と同じ形式の単語リストを作る
+
+    Args:
+        count: 単語数
+        seed: 乱数シード
+
+    Returns:
+        {"english", "japanese", "grade", "unit", "level"} の辞書のリスト
+    """
+    rng = random.Random(seed)
+    words = []
+    for i in range(count):
+        words.append({
+            "english": _random_word(rng, i),
+            "japanese": f"意味{i}",
+            "grade": rng.randint(1, 3),
+            "unit": rng.choice(UNITS),
+            "level": rng.randint(1, 3),
+        })
+    return words
+
+
+def generate_grammar(
+    topic_count: int,
+    questions_per_topic: int,
+    seed: int = 0,
+) -> tuple[list[dict], list[dict]]:
+    """
+    grammar_topics.json / grammar_questions.json と同じ形式のデータを作る
+
+    Args:
+        topic_count: トピック数
+        questions_per_topic: 1トピックあたりの問題数
+        seed: 乱数シード
+
+    Returns:
+        (トピックのリスト, 問題のリスト)
+    """
+    rng = random.Random(seed)
+    topics = []
+    questions = []
+    for t in range(topic_count):
+        title = f"文法トピック{t + 1}"
+        topics.append({
+            "title": title,
+            "description": f"{title}を学習します。",
+            "level": rng.randint(1, 3),
+            "related_units": [rng.choice(UNITS)],
+        })
+        for q in range(questions_per_topic):
+            answer = f"This is answer {t}-{q}."
+            question = {
+                "grammar_title": title,
+                "question_type": rng.choice(QUESTION_TYPES),
+                "prompt_text": f"「問題 {t}-{q}」",
+                "correct_answer": answer,
+                "explanation": f"解説 {t}-{q}",
+            }
+            if question["question_type"] == "mcq":
+                choices = [answer] + [f"Wrong answer {t}-{q}-{k}." for k in range(3)]
+                rng.shuffle(choices)
+                for k, choice in enumerate(choices, start=1):
+                    question[f"choice{k}"] = choice
+            questions.append(question)
+    return topics, questions
+
+
+def write_json(data, path: Path) -> Path:
+    """インポートスクリプトに渡せる JSON ファイルを書く"""
+    path = Path(path)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    return path
+
+
+def populate(
+    conn,
+    word_count: int,
+    user_count: int,
+    progress_per_user: int = 200,
+    topic_count: int = 20,
+    questions_per_topic: int = 50,
+    seed: int = 0,
+) -> dict:
+    """
+    初期化済みの DB に合成データを直接書き込む（executemany でまとめて INSERT）
+
+    Args:
+        conn: DB 接続（db.init_db() 済み）
+        word_count: 単語数
+        user_count: ユーザー数
+        progress_per_user: 1ユーザーあたりの回答済み単語数
+        topic_count: 文法トピック数
+        questions_per_topic: 1トピックあたりの文法問題数
+        seed: 乱数シード
+
+    Returns:
+        作成した件数の辞書
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    words = generate_words(word_count, seed)
+    topics, questions = generate_grammar(topic_count, questions_per_topic, seed)
+
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO words (english, japanese, grade, unit, level)
+            VALUES (:english, :japanese, :grade, :unit, :level)
+        """, words)
+        word_ids = [row[0] for row in cursor.execute("SELECT word_id FROM words")]
+
+        cursor.executemany(
+            "INSERT INTO users (name, created_at) VALUES (?, ?)",
+            [(f"user{i + 1}", now.isoformat()) for i in range(user_count)],
+        )
+        user_ids = [row[0] for row in cursor.execute("SELECT user_id FROM users")]
+
+        topic_ids = {}
+        for topic in topics:
+            cursor.execute("""
+                INSERT INTO grammar_topics (title, description, level, related_units)
+                VALUES (?, ?, ?, ?)
+            """, (
+                topic["title"],
+                topic["description"],
+                topic["level"],
+                json.dumps(topic["related_units"], ensure_ascii=False),
+            ))
+            topic_ids[topic["title"]] = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO grammar_questions
+            (grammar_id, question_type, prompt_text, choice1, choice2, choice3, choice4,
+             correct_answer, explanation)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                topic_ids[q["grammar_title"]], q["question_type"], q["prompt_text"],
+                q.get("choice1"), q.get("choice2"), q.get("choice3"), q.get("choice4"),
+                q["correct_answer"], q.get("explanation"),
+            )
+            for q in questions
+        ])
+
+        progress_rows = []
+        events = []
+        answered = min(progress_per_user, len(word_ids))
+        for user_id in user_ids:
+            for word_id in rng.sample(word_ids, answered):
+                correct = rng.randint(0, 8)
+                wrong = rng.randint(0, 4)
+                answered_at = now - timedelta(days=rng.randint(0, 60), seconds=rng.randint(0, 86399))
+                progress_rows.append((
+                    user_id,
+                    word_id,
+                    rng.randint(1, 4),
+                    correct,
+                    wrong,
+                    rng.randint(0, correct),
+                    round(rng.uniform(1.0, 10.0), 2),
+                    answered_at.isoformat(),
+                    word_scheduler.epoch_day(answered_at.date()),
+                ))
+                events.append(answer_log.make_event(
+                    user_id, answer_log.KIND_WORD, word_id,
+                    rng.random() < 0.7, rng.uniform(1.0, 10.0), answered_at,
+                ))
+        cursor.executemany("""
+            INSERT INTO word_progress
+            (user_id, word_id, stage, total_correct, total_wrong, correct_streak,
+             avg_answer_time_sec, last_answered_at, last_answered_day)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, progress_rows)
+        answer_log.insert_events(cursor, events)
+
+    return {
+        "words": len(word_ids),
+        "users": len(user_ids),
+        "grammar_topics": len(topic_ids),
+        "grammar_questions": len(questions),
+        "word_progress": len(progress_rows),
+    }
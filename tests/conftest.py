@@ -0,0 +1,39 @@
+"""
+テスト共通の設定
+各テストは一時ディレクトリの app.db を使う（本物の学習データには触れない）。
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import db
+from app.services import answer_buffer
+from app.services import grammar_service
+from app.services import word_service
+
+
+def reset_caches() -> None:
+    """サービスのメモリ上のキャッシュを捨てる（DB を切り替えたとき）"""
+    word_service.invalidate_schedulers()
+    # 教材のバージョン（content_version）が同じ別の DB でも読み直すように
+    word_service._vocabulary = None
+    word_service._confusables = None
+    grammar_service.invalidate_samplers()
+    grammar_service.invalidate_question_index()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """一時ディレクトリの app.db を使うように設定し、終わったら元に戻す"""
+    path = tmp_path / "app.db"
+    db.configure(db_path=str(path), content_pack_path=False)
+    reset_caches()
+    yield path
+    answer_buffer.disable()
+    db.configure()
+    reset_caches()
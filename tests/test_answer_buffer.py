@@ -0,0 +1,77 @@
+"""
+回答の write-behind バッファ（answer_buffer）
+"""
+import sqlite3
+
+import pytest
+
+from app.services import answer_buffer
+from app.services import db
+from app.services import word_service
+
+
+def _setup(db_path) -> None:
+    db.init_db()
+    conn = db.get_connection()
+    with conn:
+        conn.execute("INSERT INTO users (user_id, name) VALUES (1, 'test')")
+        conn.execute(
+            "INSERT INTO words (word_id, english, japanese, grade, unit, level) "
+            "VALUES (1, 'apple', 'りんご', 1, 'u', 1)"
+        )
+
+
+def test_flush_keeps_the_buffer_and_journal_when_the_db_is_locked(db_path):
+    _setup(db_path)
+    journal = db_path.with_name("answer_journal.jsonl")
+    answer_buffer.enable(str(journal))
+    word_service.record_answer(1, 1, True, 2.0)
+    pending = answer_buffer.pending_count()
+    assert pending > 0
+
+    # 別の接続が書き込み中（ロックを待たずに失敗させる）
+    db.get_connection().execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(db_path)
+    other.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError):
+        answer_buffer.flush()
+    assert answer_buffer.pending_count() == pending
+    assert '"kind": "word"' in journal.read_text(encoding="utf-8")
+
+    # ロックが外れたら、次の flush で書き込まれる
+    other.rollback()
+    other.close()
+    assert answer_buffer.flush() == pending
+    assert answer_buffer.pending_count() == 0
+    assert '"kind": "word"' not in journal.read_text(encoding="utf-8")
+    row = db.get_connection().execute(
+        "SELECT total_correct FROM word_progress WHERE user_id = 1 AND word_id = 1"
+    ).fetchone()
+    assert row[0] == 1
+
+
+def test_enable_registers_the_exit_flush_once(db_path, monkeypatch):
+    _setup(db_path)
+    registered = []
+    monkeypatch.setattr(answer_buffer.atexit, "register", registered.append)
+    monkeypatch.setattr(answer_buffer, "_atexit_registered", False)
+    for _ in range(3):
+        answer_buffer.enable(str(db_path.with_name("answer_journal.jsonl")))
+        answer_buffer.disable()
+    assert registered == [answer_buffer.disable]
+
+
+def test_in_memory_db_buffers_without_a_journal(db_path, tmp_path):
+    db.configure(in_memory=True, content_pack_path=False)
+    assert answer_buffer.get_journal_path() is None
+    _setup(db_path)
+    answer_buffer.enable()
+    word_service.record_answer(1, 1, True, 2.0)
+    assert answer_buffer.pending_count() > 0
+    assert answer_buffer.flush() > 0
+    answer_buffer.disable()
+    assert list(tmp_path.glob("*.jsonl")) == []
+    row = db.get_connection().execute(
+        "SELECT total_correct FROM word_progress WHERE user_id = 1 AND word_id = 1"
+    ).fetchone()
+    assert row[0] == 1
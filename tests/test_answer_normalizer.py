@@ -0,0 +1,42 @@
+"""
+解答の正規化（NFKC・短縮形・句読点）と許容する解答の照合
+"""
+from app.services import answer_normalizer
+from app.services.answer_normalizer import decode_answer_keys, encode_answer_keys, is_match, normalize
+
+
+def test_normalize_folds_full_width_input_and_case():
+    assert normalize("Ｉ　ａｍ　Ｋｅｎ") == "i am ken"
+    assert normalize("  She   is\tkind ") == "she is kind"
+    assert normalize("ＡＢＣ１２３") == "abc123"
+
+
+def test_normalize_expands_contractions():
+    assert normalize("I'm a student.") == "i am a student"
+    assert normalize("He doesn’t like it") == "he does not like it"
+    assert normalize("I can't swim") == normalize("I cannot swim") == normalize("I can not swim")
+    assert normalize("I won't go") == "i will not go"
+    assert normalize("They're here") == "they are here"
+    assert normalize("It's mine") == "it is mine"
+    # 所有格の 's はそのまま
+    assert normalize("Ken's bag") == "ken's bag"
+
+
+def test_normalize_drops_trailing_and_spaced_punctuation():
+    assert normalize("Is this your pen ?") == "is this your pen"
+    assert normalize("Yes , it is。") == "yes, it is"
+    assert normalize("Wow!!") == "wow"
+    assert normalize("well-known") == normalize("well—known")
+
+
+def test_answer_keys_round_trip_and_rebuild_on_version_change():
+    stored = encode_answer_keys("I am Ken.", ["I'm Ken"])
+    keys = decode_answer_keys(stored, "I am Ken.")
+    assert keys == {"i am ken"}
+    assert is_match("ｉ’ｍ ken", keys)
+    assert not is_match("I was Ken", keys)
+
+    old = stored.replace(f'"version":{answer_normalizer.NORMALIZER_VERSION}', '"version":0')
+    assert decode_answer_keys(old, "I am Ken.") == keys
+    assert decode_answer_keys(None, "You are kind") == {"you are kind"}
+    assert decode_answer_keys("not json", "You are kind") == {"you are kind"}
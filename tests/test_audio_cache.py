@@ -0,0 +1,69 @@
+"""
+読み上げ音声のディスクキャッシュ（LRU の追い出し・index.json の読み直し）
+"""
+import json
+
+from app.services.audio_cache import INDEX_FILENAME, AudioCache, MemoryAudioPool, make_key
+
+
+def test_put_evicts_the_least_recently_used_entries(tmp_path):
+    cache = AudioCache(tmp_path, max_bytes=30)
+    for key in ("a", "b", "c"):
+        cache.put(key, b"x" * 10)
+    assert cache.get("a") == b"x" * 10  # a を使ったので、いちばん古いのは b
+
+    cache.put("d", b"y" * 10)
+    assert not cache.contains("b")
+    assert not (tmp_path / "b.wav").exists()
+    assert [cache.contains(key) for key in ("a", "c", "d")] == [True, True, True]
+    assert cache.stats()["bytes"] == 30
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_reload_keeps_the_lru_order_and_repairs_the_index(tmp_path):
+    cache = AudioCache(tmp_path, max_bytes=100)
+    for key in ("a", "b", "c"):
+        cache.put(key, b"x" * 10)
+    cache.get("a")
+    cache.save_index()
+    # index にないファイル（index を保存する前に終了した）と、外から消されたファイル
+    (tmp_path / "orphan.wav").write_bytes(b"z" * 5)
+    (tmp_path / "c.wav").unlink()
+
+    reloaded = AudioCache(tmp_path, max_bytes=100)
+    assert list(reloaded._entries) == ["b", "a", "orphan"]
+    assert reloaded.stats()["bytes"] == 25
+    assert reloaded.get("orphan") == b"z" * 5
+    assert not reloaded.contains("c")
+
+    # 上限を下げて開き直すと、前回の LRU 順で古いものから消す
+    reloaded.save_index()
+    small = AudioCache(tmp_path, max_bytes=15)
+    assert list(small._entries) == ["a", "orphan"]
+    assert not (tmp_path / "b.wav").exists()
+
+
+def test_index_with_another_format_version_is_rebuilt_from_the_files(tmp_path):
+    cache = AudioCache(tmp_path)
+    cache.put(make_key("apple", "v", 150), b"wav")
+    cache.save_index()
+    (tmp_path / INDEX_FILENAME).write_text(json.dumps({"version": -1, "entries": []}), encoding="utf-8")
+
+    reloaded = AudioCache(tmp_path)
+    calls = []
+    data = reloaded.get_or_create("apple", "v", 150, lambda *args: calls.append(args) or b"new")
+    assert data == b"wav"
+    assert calls == []
+
+
+def test_memory_pool_drops_the_oldest_buffers():
+    pool = MemoryAudioPool(max_bytes=20)
+    pool.put("a", b"1" * 10)
+    pool.put("b", b"2" * 10)
+    pool.get("a")
+    pool.put("c", b"3" * 10)
+    assert "b" not in pool and "a" in pool and "c" in pool
+    # 上限より大きい1件は捨てずに持つ
+    pool.put("big", b"4" * 50)
+    assert pool.stats()["entries"] == 1
@@ -0,0 +1,81 @@
+"""
+ベンチマーク（scripts/benchmark.py）のスモークテスト
+小さい合成データで各計測を1回ずつ通し、結果の保存・ベースラインとの比較まで確かめる。
+"""
+import json
+
+import pytest
+
+from app.services import db
+from app.services import word_scheduler
+from app.services import word_service
+from scripts import benchmark
+
+
+SMALL = [
+    "--scales", "200",
+    "--users", "3",
+    "--progress-per-user", "20",
+    "--topics", "2",
+    "--questions-per-topic", "5",
+    "--iterations", "3",
+    "--cold-iterations", "1",
+]
+
+SERVICE_RESULTS = {
+    "get_next_word (cold)", "get_next_word", "get_next_word (filtered)",
+    "record_answer", "record_answer (buffered)", "answer_buffer.flush",
+    "get_word_stats", "grammar.get_next_question", "grammar.check_answer",
+}
+IMPORT_RESULTS = {
+    "import_words", "import_words (rerun)", "import_grammar", "import_grammar (rerun)",
+}
+
+
+@pytest.fixture
+def default_db(tmp_path, monkeypatch, db_path):
+    """benchmark.run() が最後に戻す既定の DB も一時ディレクトリにする"""
+    path = tmp_path / "default" / "app.db"
+    monkeypatch.setenv(db.DB_PATH_ENV, str(path))
+    yield path
+    word_service.set_selection_mode("scheduler")
+    word_service.set_scheduler_backend("heap")
+
+
+@pytest.mark.parametrize("selection_mode, backend", [
+    ("scheduler", "heap"),
+    ("sql", "heap"),
+    pytest.param(
+        "scheduler", "numpy",
+        marks=pytest.mark.skipif(not word_scheduler.NUMPY_AVAILABLE, reason="NumPy がない"),
+    ),
+])
+def test_benchmark_runs_every_measurement(tmp_path, default_db, selection_mode, backend):
+    output = tmp_path / "bench.json"
+    argv = SMALL + ["--selection-mode", selection_mode, "--backend", backend, "--output", str(output)]
+
+    assert benchmark.main(argv) == 0
+
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert report["meta"]["selection_mode"] == selection_mode
+    results = report["results"]["200"]
+    assert set(results) == SERVICE_RESULTS | IMPORT_RESULTS
+    for name, stats in results.items():
+        assert stats["count"] > 0, name
+    # 計測は一時ディレクトリの DB で行い、既定の DB は作らない
+    assert not default_db.exists()
+
+
+def test_benchmark_reports_regressions_against_a_baseline(tmp_path, default_db):
+    output = tmp_path / "bench.json"
+    assert benchmark.main(SMALL + ["--skip-imports", "--output", str(output)]) == 0
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert set(report["results"]["200"]) == SERVICE_RESULTS
+
+    # 前回がずっと速かったことにする
+    for stats in report["results"]["200"].values():
+        stats["p50_ms"] = 0.0
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(report), encoding="utf-8")
+
+    assert benchmark.main(SMALL + ["--skip-imports", "--baseline", str(baseline)]) == 1
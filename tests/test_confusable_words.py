@@ -0,0 +1,146 @@
+"""
+紛らわしい単語のグラフ（confusable_words）と、同期での差分の作り直し
+"""
+import math
+import random
+
+import pytest
+
+from app.services import confusable_words
+from app.services import db
+from app.services import importer
+
+
+BACKENDS = [
+    pytest.param(True, id="numpy", marks=pytest.mark.skipif(
+        not confusable_words.NUMPY_AVAILABLE, reason="NumPy が必要"
+    )),
+    pytest.param(False, id="python"),
+]
+
+
+def _vocabulary(rng: random.Random, count: int) -> list[tuple[int, str, str]]:
+    """つづりの似た語（1文字違い・1文字足し）と同じ訳の語が混ざった単語 (word_id, english, japanese)"""
+    letters = "abcdefghilmnoprstuw"
+    words = {}
+    while len(words) < count:
+        if words and rng.random() < 0.5:
+            base = list(rng.choice(list(words)))
+            k = rng.randrange(len(base))
+            if rng.random() < 0.5:
+                base[k] = rng.choice(letters)
+            else:
+                base.insert(k, rng.choice(letters))
+            english = "".join(base)
+        else:
+            english = "".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+        words.setdefault(english, "、".join(
+            f"訳{rng.randrange(count // 4)}" for _ in range(rng.randint(1, 2))
+        ))
+    return [(i + 1, english, japanese) for i, (english, japanese) in enumerate(words.items())]
+
+
+def _with_backend(monkeypatch, numpy: bool) -> None:
+    monkeypatch.setattr(confusable_words, "NUMPY_AVAILABLE", numpy)
+
+
+@pytest.mark.parametrize("numpy", BACKENDS)
+def test_spelling_neighbors_match_a_brute_force_comparison(monkeypatch, numpy):
+    _with_backend(monkeypatch, numpy)
+    words = _vocabulary(random.Random(1), 800)
+    grams = [confusable_words.bigrams(english) for _, english, _ in words]
+    table = confusable_words._GramTable(grams)
+
+    expected = {}
+    for i in range(len(words)):
+        found = []
+        for j in range(len(words)):
+            score = round(len(grams[i] & grams[j]) / math.sqrt(len(grams[i]) * len(grams[j])), 4)
+            if i != j and score >= confusable_words.SPELLING_THRESHOLD:
+                found.append((-score, j))
+        if found:
+            expected[i] = {j: -score for score, j in sorted(found)[:confusable_words.MAX_PARTNERS]}
+
+    assert expected
+    assert confusable_words.spelling_neighbors(table) == expected
+
+
+@pytest.mark.skipif(not confusable_words.NUMPY_AVAILABLE, reason="NumPy が必要")
+def test_numpy_and_python_build_the_same_edges(monkeypatch):
+    words = _vocabulary(random.Random(2), 3000)
+    edges = confusable_words.build_edges(words)
+    monkeypatch.setattr(confusable_words, "NUMPY_AVAILABLE", False)
+    assert confusable_words.build_edges(words) == edges
+    assert {reason for *_, reason in edges} == {
+        confusable_words.REASON_SPELLING,
+        confusable_words.REASON_MEANING,
+        confusable_words.REASON_SPELLING | confusable_words.REASON_MEANING,
+    }
+
+
+@pytest.mark.parametrize("numpy", BACKENDS)
+def test_update_edges_matches_a_full_rebuild(monkeypatch, numpy):
+    _with_backend(monkeypatch, numpy)
+    rng = random.Random(3)
+    pool = _vocabulary(rng, 1500)
+    current = {word_id: (english, japanese) for word_id, english, japanese in pool[:1000]}
+    graph = {(a, b): (s, r) for a, b, s, r in confusable_words.build_edges(pool[:1000])}
+    added = iter(pool[1000:])
+
+    for _ in range(10):
+        previous = dict(current)
+        for _ in range(rng.randint(1, 20)):
+            op = rng.random()
+            if op < 0.3:
+                word_id, english, japanese = next(added)
+                current[word_id] = (english, japanese)
+            elif op < 0.6:
+                current.pop(rng.choice(sorted(current)))
+            else:
+                word_id = rng.choice(sorted(current))
+                current[word_id] = (current[word_id][0], f"訳{rng.randrange(250)}")
+        words = [(word_id, *current[word_id]) for word_id in sorted(current)]
+
+        dirty, edges = confusable_words.update_edges(words, previous)
+        assert dirty is not None
+        graph = {pair: edge for pair, edge in graph.items() if not set(pair) & dirty}
+        graph.update({(a, b): (s, r) for a, b, s, r in edges})
+        assert graph == {(a, b): (s, r) for a, b, s, r in confusable_words.build_edges(words)}
+
+    assert confusable_words.update_edges(words, dict(current)) == (set(), [])
+
+
+def _edges(conn) -> set:
+    return set(conn.execute("SELECT word_id, other_word_id, score, reason FROM word_confusables"))
+
+
+def test_sync_words_rewrites_only_the_edges_around_changed_words(db_path):
+    db.init_db()
+    conn = db.get_connection()
+    words = [
+        {"english": english, "japanese": japanese, "grade": 1, "unit": "u", "level": 1}
+        for _, english, japanese in _vocabulary(random.Random(4), 400)
+    ]
+    importer.sync_words(words)
+    word_ids = dict(conn.execute("SELECT english, word_id FROM words"))
+    with conn:
+        # 辺に印を付けておく（作り直した辺は印が消える）
+        conn.execute("UPDATE word_confusables SET reason = reason | 64")
+    total = len(_edges(conn))
+
+    changed = word_ids[words[0]["english"]]
+    retired = word_ids[words[-1]["english"]]
+    words[0] = {**words[0], "japanese": "訳0"}
+    result = importer.sync_words(words[:-1])
+    assert (result["updated"], result["retired"]) == (1, 1)
+
+    marked = {(a, b) for a, b, _, reason in _edges(conn) if reason & 64}
+    assert 0 < result["confusables"] < total // 2
+    assert len(marked) > total // 2
+    assert not {changed, retired} & {word_id for pair in marked for word_id in pair}
+
+    with conn:
+        conn.execute("UPDATE word_confusables SET reason = reason & ~64")
+    incremental = _edges(conn)
+    importer.rebuild_confusables(conn)
+    assert incremental == _edges(conn)
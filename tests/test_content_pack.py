@@ -0,0 +1,92 @@
+"""
+コンテンツパックの ATTACH（壊れた・古いパックのときは app.db の教材で動く）
+"""
+import sqlite3
+
+import pytest
+
+from app.services import content_pack
+from app.services import db
+
+
+def _write_pack(path, schema_version: str) -> None:
+    """指定したスキーマバージョンの、単語が1つだけのパックを作る"""
+    conn = sqlite3.connect(path)
+    content_pack.create_schema(conn)
+    conn.execute(
+        "INSERT INTO words (english, japanese, content_hash) VALUES ('pack', 'パック', 'x')"
+    )
+    conn.executemany(
+        "INSERT INTO pack_info (key, value) VALUES (?, ?)",
+        [("schema_version", schema_version), ("version", "v-test")],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _use_pack(tmp_path, pack_path) -> None:
+    db.configure(db_path=str(tmp_path / "app.db"), content_pack_path=str(pack_path))
+    db.init_db()
+    conn = db.get_connection()
+    with conn:
+        conn.execute("INSERT INTO words (english, japanese) VALUES ('local', 'ローカル')")
+
+
+def test_current_pack_is_attached(db_path, tmp_path):
+    pack_path = tmp_path / "content.db"
+    _write_pack(pack_path, str(content_pack.PACK_SCHEMA_VERSION))
+    db.configure(db_path=str(db_path), content_pack_path=str(pack_path))
+    db.init_db()
+    conn = db.get_connection()
+    assert content_pack.is_attached(conn)
+    assert [row[0] for row in conn.execute("SELECT english FROM words")] == ["pack"]
+
+
+@pytest.mark.parametrize("broken", ["stale", "corrupt"])
+def test_unusable_pack_falls_back_to_app_db(db_path, tmp_path, capsys, broken):
+    pack_path = tmp_path / "content.db"
+    if broken == "stale":
+        _write_pack(pack_path, str(content_pack.PACK_SCHEMA_VERSION - 1))
+    else:
+        pack_path.write_bytes(b"not a sqlite database" * 100)
+
+    _use_pack(tmp_path, pack_path)
+    conn = db.get_connection()
+    assert not content_pack.is_attached(conn)
+    assert [row[0] for row in conn.execute("SELECT english FROM words")] == ["local"]
+    assert "コンテンツパック" in capsys.readouterr().out
+
+    # 以降の接続はパックを開き直さない
+    assert db.get_content_pack_path() is None
+    db.close_all()
+    conn = db.get_connection()
+    assert not content_pack.is_attached(conn)
+    assert capsys.readouterr().out == ""
+
+
+def test_stage_summary_counts_writes_from_connections_without_the_pack(db_path, tmp_path):
+    pack_path = tmp_path / "content.db"
+    _write_pack(pack_path, str(content_pack.PACK_SCHEMA_VERSION))
+    db.configure(db_path=str(db_path), content_pack_path=str(pack_path))
+    db.init_db()
+    conn = db.get_connection()
+    with conn:
+        conn.execute("INSERT INTO users (user_id, name) VALUES (1, 'test')")
+        conn.execute("INSERT INTO main.words (word_id, english, japanese) VALUES (1, 'pack', 'パック')")
+        conn.execute("INSERT INTO word_progress (user_id, word_id, stage) VALUES (1, 1, 2)")
+
+    def stages():
+        return tuple(conn.execute(
+            "SELECT stage1_count, stage2_count, stage3_count, stage4_count "
+            "FROM word_stage_summary WHERE user_id = 1"
+        ).fetchone())
+
+    # パックの接続では TEMP トリガーだけが数える（二重に数えない）
+    assert stages() == (0, 1, 0, 0)
+
+    # パックを ATTACH していない接続（インポートスクリプトなど）の書き込みも数える
+    other = sqlite3.connect(db_path)
+    with other:
+        other.execute("UPDATE word_progress SET stage = 3 WHERE user_id = 1 AND word_id = 1")
+    other.close()
+    assert stages() == (0, 0, 1, 0)
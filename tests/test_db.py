@@ -0,0 +1,110 @@
+"""
+DB 接続（スレッドごとの接続・configure での切り替え・インメモリ DB）
+"""
+import sqlite3
+import threading
+
+import pytest
+
+from app.services import db
+
+
+class _Worker:
+    """1本のスレッドで関数を順に実行する（スレッドごとの接続を確かめるため）"""
+
+    def __init__(self):
+        self._tasks = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def call(self, func):
+        done = threading.Event()
+        result = {}
+
+        def task():
+            try:
+                result["value"] = func()
+            except Exception as e:
+                result["error"] = e
+            done.set()
+
+        with self._cond:
+            self._tasks.append(task)
+            self._cond.notify()
+        assert done.wait(10)
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+    def stop(self):
+        self.call(lambda: None)
+        with self._cond:
+            self._tasks.append(None)
+            self._cond.notify()
+        self._thread.join(10)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._cond.wait()
+                task = self._tasks.pop(0)
+            if task is None:
+                return
+            task()
+
+
+def _database_file():
+    return db.get_connection().execute("PRAGMA database_list").fetchone()["file"]
+
+
+def test_worker_threads_reopen_their_connection_after_configure(tmp_path, db_path):
+    worker = _Worker()
+    try:
+        first = worker.call(db.get_connection)
+        assert worker.call(_database_file) == str(db_path)
+
+        other = tmp_path / "other.db"
+        db.configure(db_path=str(other), content_pack_path=False)
+
+        assert worker.call(_database_file) == str(other)
+        assert worker.call(db.get_connection) is not first
+        # 古い接続はそのスレッドが閉じた（古い DB のファイルを開いたままにしない）
+        assert first not in db._connections
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            worker.call(lambda: first.execute("SELECT 1"))
+        worker.call(db.close_connection)
+    finally:
+        worker.stop()
+
+
+def test_in_memory_db_waits_for_a_writer_instead_of_failing(db_path):
+    db.configure(in_memory=True, content_pack_path=False)
+    conn = db.get_connection()
+    with conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+
+    errors = []
+
+    def write():
+        try:
+            worker_conn = db.get_connection()
+            with worker_conn:
+                worker_conn.execute("INSERT INTO t VALUES (2)")
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close_connection()
+
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("INSERT INTO t VALUES (1)")
+    writer = threading.Thread(target=write)
+    writer.start()
+    # 書き込み中のトランザクションが終わるまで、別スレッドは busy_timeout で待ってから書く
+    writer.join(0.2)
+    conn.commit()
+    writer.join(10)
+
+    assert errors == []
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
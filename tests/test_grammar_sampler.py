@@ -0,0 +1,93 @@
+"""
+文法問題の出題サンプラー（Fenwick 木の重み・直前の問題の除外）
+"""
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from app.services import grammar_sampler
+from app.services.grammar_sampler import FenwickTree, QuestionSampler, calc_weight
+
+
+def _row(question_id, correct=0, wrong=0, streak=0, days_ago=None) -> dict:
+    answered = None
+    if days_ago is not None:
+        answered = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    return {
+        "question_id": question_id,
+        "correct_count": correct,
+        "wrong_count": wrong,
+        "correct_streak": streak,
+        "last_answered_at": answered,
+    }
+
+
+def _prefix_find(weights, value):
+    total = 0.0
+    for i, w in enumerate(weights):
+        total += w
+        if total > value:
+            return i
+    return len(weights) - 1
+
+
+def test_fenwick_tree_matches_prefix_sums_after_updates():
+    rng = random.Random(1)
+    weights = [rng.choice([0.0, 0.5, 1.0, 6.0]) + rng.random() for _ in range(37)]
+    tree = FenwickTree(weights)
+    for _ in range(200):
+        i = rng.randrange(len(weights))
+        delta = rng.uniform(-weights[i], 3.0)
+        weights[i] += delta
+        tree.add(i, delta)
+        assert abs(tree.total() - sum(weights)) < 1e-9
+        value = rng.random() * sum(weights)
+        assert tree.find(value) == _prefix_find(weights, value)
+
+
+def test_calc_weight_prefers_missed_and_stale_questions():
+    assert calc_weight(0, 0, 0, None) == grammar_sampler.UNANSWERED_WEIGHT
+    fresh = calc_weight(3, 0, 3, 0)
+    assert fresh == grammar_sampler.BASE_WEIGHT
+    assert calc_weight(3, 1, 0, 0) > calc_weight(3, 1, 2, 0) > fresh
+    assert calc_weight(3, 0, 3, 10) > fresh
+    # 不正解数・日数は頭打ち
+    assert calc_weight(3, 50, 0, 0) == calc_weight(3, 5, 0, 0)
+    assert calc_weight(3, 0, 3, 300) == calc_weight(3, 0, 3, 30)
+
+
+def test_pick_follows_the_weights():
+    rows = [_row(1)] + [_row(i, correct=3, streak=3, days_ago=0) for i in range(2, 12)]
+    sampler = QuestionSampler(1, 1, rows, rng=random.Random(2))
+    assert sampler.weight(1) == grammar_sampler.UNANSWERED_WEIGHT
+    assert sampler.weight(2) == grammar_sampler.BASE_WEIGHT
+
+    counts = Counter(sampler.pick() for _ in range(8000))
+    # 重みは 6 : 1。直前の問題を除くので厳密な比ではないが、重い問題ほど多く出る
+    fresh = [counts[i] for i in range(2, 12)]
+    assert min(fresh) > 0
+    assert counts[1] > 3 * max(fresh)
+
+
+def test_pick_never_repeats_the_previous_question():
+    rows = [_row(i) for i in range(1, 6)]
+    sampler = QuestionSampler(1, 1, rows, rng=random.Random(3))
+    previous = None
+    for step in range(500):
+        question_id = sampler.pick()
+        assert question_id != previous
+        previous = question_id
+        if step % 7 == 0:
+            # 直前の問題の重みを変えても、除外が外れたときに正しい重みで戻る
+            sampler.update(question_id, {
+                "correct_count": 1, "wrong_count": step % 3, "correct_streak": 0,
+                "last_answered_at": datetime.now().isoformat(),
+            })
+    expected = [0.0 if i in sampler._recent else w for i, w in enumerate(sampler._weights)]
+    assert abs(sampler._tree.total() - sum(expected)) < 1e-9
+
+
+def test_single_question_topic_can_repeat():
+    sampler = QuestionSampler(1, 1, [_row(7)])
+    assert [sampler.pick() for _ in range(3)] == [7, 7, 7]
+    assert QuestionSampler(1, 1, []).pick() is None
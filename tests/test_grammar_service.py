@@ -0,0 +1,84 @@
+"""
+文法の採点（check_answer）と教材の同期
+"""
+from app.services import db
+from app.services import grammar_service
+from app.services import importer
+
+
+TOPICS = [{"title": "be動詞", "description": "", "level": 1}]
+
+
+def _question(prompt: str, answer: str) -> dict:
+    return {
+        "grammar_title": "be動詞",
+        "question_type": "fill",
+        "prompt_text": prompt,
+        "correct_answer": answer,
+        "explanation": f"{answer} を使う",
+    }
+
+
+def _sync(questions: list[dict], digest: str) -> None:
+    conn = db.get_connection()
+    importer.import_grammar_topics(TOPICS, conn=conn)
+    importer.sync_grammar_questions(questions, source="grammar_questions", digest=digest, conn=conn)
+
+
+def _init_db() -> None:
+    db.init_db()
+    conn = db.get_connection()
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO users (user_id, name) VALUES (1, 'test')")
+
+
+def test_check_answer_grades_a_question_retired_after_it_was_shown(db_path):
+    _init_db()
+    questions = [_question("I ___ a student.", "am"), _question("You ___ kind.", "are")]
+    _sync(questions, "v1")
+    grammar_id = grammar_service.list_topics()[0]["grammar_id"]
+
+    shown = grammar_service.get_next_question(1, grammar_id)
+    assert shown is not None
+
+    # 出したあとで、その問題が教材から外された（次の問題を出すときに索引を読み直す）
+    _sync([q for q in questions if q["prompt_text"] != shown["prompt_text"]], "v2")
+    for _ in range(5):
+        assert grammar_service.get_next_question(1, grammar_id)["question_id"] != shown["question_id"]
+
+    result = grammar_service.check_answer(1, shown["question_id"], shown["correct_answer"])
+    assert result is not None
+    assert result["is_correct"]
+    assert result["correct_answer"] == shown["correct_answer"]
+
+
+def test_check_answer_sees_questions_updated_by_a_sync(db_path):
+    _init_db()
+    _sync([_question("I ___ a student.", "am")], "v1")
+    grammar_id = grammar_service.list_topics()[0]["grammar_id"]
+    question_id = grammar_service.get_next_question(1, grammar_id)["question_id"]
+    assert grammar_service.check_answer(1, question_id, "am")["is_correct"]
+
+    # 同じ問題の正解が直った（同期で content_version が変わる）
+    _sync([_question("I ___ a student.", "was")], "v2")
+
+    assert grammar_service.check_answer(1, question_id, "was")["is_correct"]
+    assert not grammar_service.check_answer(1, question_id, "am")["is_correct"]
+    assert grammar_service.check_answer(1, question_id + 1000, "am") is None
+
+
+def test_check_answer_does_not_query_the_content_version(db_path):
+    _init_db()
+    _sync([_question("I ___ a student.", "am")], "v1")
+    grammar_id = grammar_service.list_topics()[0]["grammar_id"]
+    question_id = grammar_service.get_next_question(1, grammar_id)["question_id"]
+
+    statements = []
+    db.get_connection().set_trace_callback(statements.append)
+    try:
+        assert grammar_service.check_answer(1, question_id, "am")["is_correct"]
+    finally:
+        db.get_connection().set_trace_callback(None)
+    # 採点は索引だけで行い、書き込むのは進捗と回答イベントだけ
+    assert statements
+    assert not [sql for sql in statements if "content_" in sql or "grammar_questions" in sql]
@@ -0,0 +1,36 @@
+"""
+教材の一括インポート（importer）
+"""
+import pytest
+
+from app.services import db
+from app.services import importer
+
+
+def _words(*entries) -> list[dict]:
+    return [
+        {"english": english, "japanese": japanese, "grade": 1, "unit": "u", "level": 1}
+        for english, japanese in entries
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [2, importer.CHUNK_SIZE])
+def test_import_words_counts_inserted_updated_and_unchanged_rows(db_path, chunk_size):
+    db.init_db()
+    first = _words(("apple", "りんご"), ("book", "本"), ("cat", "ねこ"))
+    result = importer.import_words(first, chunk_size=chunk_size)
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (3, 0, 0)
+
+    # 1語は訳を変え、1語は同じまま、2語を追加（チャンクの中で更新と追加が混ざる）
+    second = _words(("apple", "リンゴ"), ("book", "本"), ("dog", "いぬ"), ("egg", "たまご"))
+    result = importer.import_words(second, chunk_size=chunk_size)
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (2, 1, 1)
+
+    result = importer.import_words(second, chunk_size=chunk_size)
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (0, 0, 4)
+
+    conn = db.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM words").fetchone()[0] == 5
+    assert conn.execute(
+        "SELECT japanese FROM words WHERE english = 'apple'"
+    ).fetchone()[0] == "リンゴ"
@@ -0,0 +1,40 @@
+"""
+サービス呼び出しの計測（instrumentation）
+"""
+import subprocess
+import sys
+
+from app.utils import instrumentation
+
+
+def test_enable_wraps_a_module_when_it_is_first_imported(tmp_path, monkeypatch):
+    (tmp_path / "lazy_service.py").write_text("def lookup(x):\n    return x * 2\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_service", raising=False)
+
+    instrumentation.enable(["lazy_service"])
+    try:
+        # 計測のために読み込むことはしない
+        assert "lazy_service" not in sys.modules
+        import lazy_service
+
+        assert lazy_service.lookup(3) == 6
+        assert instrumentation.snapshot()["functions"]["lazy_service.lookup"]["calls"] == 1
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    assert instrumentation._finder not in sys.meta_path
+    assert not hasattr(lazy_service.lookup, "__wrapped__")
+
+
+def test_enable_does_not_import_the_tab_services():
+    code = (
+        "import sys\n"
+        "from app.utils import instrumentation\n"
+        "instrumentation.enable()\n"
+        "assert 'app.services.word_service' not in sys.modules\n"
+        "assert 'app.services.grammar_service' not in sys.modules\n"
+        "from app.services import word_service\n"
+        "assert hasattr(word_service.get_next_word, '__wrapped__')\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,98 @@
+"""
+スキーマのマイグレーション（空の DB・マイグレーション導入前の DB からの移行）
+"""
+import sqlite3
+
+from app.services import migrations
+
+
+def _schema(conn) -> set[tuple[str, str]]:
+    return {
+        (row[0], row[1])
+        for row in conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"
+        )
+    }
+
+
+def _columns(conn, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _create_baseline_db(path) -> None:
+    """
+    マイグレーション導入前（user_version = 0）の、学習済みの DB を作る
+    （テーブル構成は v1 と同じ。重複した単語・トピックが入っている）
+    """
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    migrations._migrate_v1(cursor)
+    cursor.executemany("INSERT INTO users (user_id, name) VALUES (?, ?)", [(1, "a"), (2, "b")])
+    cursor.executemany(
+        "INSERT INTO words (word_id, english, japanese, grade, unit, level) VALUES (?, ?, ?, 1, 'u', 1)",
+        [(1, "apple", "りんご"), (2, "book", "本"), (3, "apple", "りんご")],
+    )
+    cursor.executemany("""
+        INSERT INTO word_progress
+        (user_id, word_id, stage, total_correct, total_wrong, correct_streak,
+         avg_answer_time_sec, last_answered_at)
+        VALUES (?, ?, ?, 1, 0, 1, 2.0, '2024-01-02T09:00:00')
+    """, [(1, 1, 2), (1, 2, 4), (1, 3, 3), (2, 3, 1)])
+    cursor.executemany(
+        "INSERT INTO grammar_topics (grammar_id, title, level) VALUES (?, ?, 1)",
+        [(1, "be動詞"), (2, "be動詞")],
+    )
+    cursor.execute("""
+        INSERT INTO grammar_questions (question_id, grammar_id, question_type, prompt_text, correct_answer)
+        VALUES (1, 2, 'fill', 'I ___ a student.', 'am')
+    """)
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_an_empty_db_to_the_latest_version(tmp_path):
+    conn = sqlite3.connect(tmp_path / "app.db")
+    assert migrations.get_version(conn) == 0
+    assert migrations.migrate(conn) == len(migrations.MIGRATIONS)
+    assert migrations.get_version(conn) == migrations.LATEST_VERSION
+    # 最新なら何もしない
+    assert migrations.migrate(conn) == 0
+
+    schema = _schema(conn)
+    for table in ("words", "word_progress", "answer_events", "word_stage_summary",
+                  "content_sync_state", "content_pack_state", "grammar_question_progress",
+                  "word_confusables"):
+        assert ("table", table) in schema
+    assert ("trigger", "trg_word_progress_update_summary") in schema
+    assert ("trigger", "trg_words_retire_summary") in schema
+    assert {"last_answered_day"} <= set(_columns(conn, "word_progress"))
+    assert {"content_hash", "retired"} <= set(_columns(conn, "words"))
+    assert {"answer_keys", "retired"} <= set(_columns(conn, "grammar_questions"))
+    assert "error_kind" in _columns(conn, "answer_events")
+
+
+def test_migrate_a_baseline_db_keeps_progress_and_matches_a_fresh_schema(tmp_path):
+    path = tmp_path / "app.db"
+    _create_baseline_db(path)
+    conn = sqlite3.connect(path)
+    assert migrations.migrate(conn) == len(migrations.MIGRATIONS)
+
+    fresh = sqlite3.connect(tmp_path / "fresh.db")
+    migrations.migrate(fresh)
+    assert _schema(conn) == _schema(fresh)
+    for table in ("words", "word_progress", "grammar_questions", "answer_events"):
+        assert _columns(conn, table) == _columns(fresh, table)
+
+    # 重複した単語は古い方にまとめ、同じユーザーの進捗は残す側を優先する
+    assert conn.execute("SELECT word_id FROM words ORDER BY word_id").fetchall() == [(1,), (2,)]
+    assert conn.execute(
+        "SELECT user_id, word_id, stage, last_answered_day FROM word_progress ORDER BY user_id, word_id"
+    ).fetchall() == [(1, 1, 2, 19724), (1, 2, 4, 19724), (2, 1, 1, 19724)]
+    assert conn.execute("SELECT grammar_id FROM grammar_questions").fetchall() == [(1,)]
+
+    # 集計は移行後の進捗と一致する
+    assert conn.execute(
+        "SELECT user_id, stage1_count, stage2_count, stage3_count, stage4_count "
+        "FROM word_stage_summary ORDER BY user_id"
+    ).fetchall() == [(1, 0, 1, 0, 1), (2, 1, 0, 0, 0)]
+    assert conn.execute("SELECT total_words FROM word_catalog_summary").fetchone() == (2,)
@@ -0,0 +1,72 @@
+"""
+イベントログからの進捗の作り直し（rebuild_word_progress / rebuild_grammar_progress）
+"""
+import sqlite3
+
+from app.services import db
+from app.services import grammar_service
+from app.services import migrations
+from app.services import word_service
+
+
+def _create_v2_db(path) -> None:
+    """answer_events がまだない v2 のスキーマで、学習済みの DB を作る"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    migrations._migrate_v1(cursor)
+    migrations._migrate_v2(cursor)
+    cursor.execute("INSERT INTO users (user_id, name) VALUES (1, 'test')")
+    cursor.executemany(
+        "INSERT INTO words (word_id, english, japanese, grade, unit, level) VALUES (?, ?, ?, 1, 'u', 1)",
+        [(1, "apple", "りんご"), (2, "book", "本"), (3, "cat", "ねこ")],
+    )
+    cursor.executemany("""
+        INSERT INTO word_progress
+        (user_id, word_id, stage, total_correct, total_wrong, correct_streak,
+         avg_answer_time_sec, last_answered_at, last_answered_day)
+        VALUES (1, ?, ?, ?, 0, ?, 3.0, '2024-01-01T10:00:00', 19723)
+    """, [(1, 4, 9, 3), (2, 2, 3, 1)])
+    cursor.execute(
+        "INSERT INTO grammar_topics (grammar_id, title, level) VALUES (1, 'be動詞', 1)"
+    )
+    cursor.execute("""
+        INSERT INTO grammar_questions
+        (question_id, grammar_id, question_type, prompt_text, choice1, choice2, correct_answer)
+        VALUES (1, 1, 'mcq', 'I ___ a student.', 'am', 'is', 'am')
+    """)
+    cursor.execute("""
+        INSERT INTO grammar_progress
+        (user_id, grammar_id, correct_count, wrong_count, mastery_level, last_studied_at)
+        VALUES (1, 1, 7, 2, 3, '2024-01-01T10:00:00')
+    """)
+    cursor.execute("PRAGMA user_version = 2")
+    conn.commit()
+    conn.close()
+
+
+def test_rebuild_keeps_progress_from_before_the_event_log(db_path):
+    _create_v2_db(db_path)
+    db.init_db()
+    conn = db.get_connection()
+    assert migrations.get_version(conn) == migrations.LATEST_VERSION
+
+    # ログを取り始めてから回答した単語（word 3）だけイベントがある
+    word_service.record_answer(1, 3, True, 2.0)
+    stats_before = word_service.get_word_stats(1)
+    assert stats_before["stage1_cleared_pct"] > 0
+
+    assert word_service.rebuild_word_progress() == 1
+    assert grammar_service.rebuild_grammar_progress() == 0
+
+    assert word_service.get_word_stats(1) == stats_before
+    rows = {
+        row["word_id"]: (row["stage"], row["total_correct"])
+        for row in conn.execute("SELECT * FROM word_progress WHERE user_id = 1")
+    }
+    assert rows[1] == (4, 9)
+    assert rows[2] == (2, 3)
+    assert rows[3][1] == 1
+    grammar = conn.execute(
+        "SELECT correct_count, wrong_count, mastery_level FROM grammar_progress"
+    ).fetchone()
+    assert tuple(grammar) == (7, 2, 3)
@@ -0,0 +1,103 @@
+"""
+ステージ集計（word_stage_summary / word_catalog_summary）を最新に保つトリガー
+"""
+import random
+
+from app.services import db
+from app.services import migrations
+from app.services import word_service
+
+
+def _summary(conn) -> tuple[dict, int]:
+    stages = {
+        row[0]: tuple(row[1:])
+        for row in conn.execute(
+            "SELECT user_id, stage1_count, stage2_count, stage3_count, stage4_count "
+            "FROM word_stage_summary"
+        )
+        if any(row[1:])
+    }
+    total = conn.execute("SELECT total_words FROM word_catalog_summary WHERE id = 1").fetchone()[0]
+    return stages, total
+
+
+def _recount(conn) -> tuple[dict, int]:
+    """トリガーに頼らずに数え直した集計（rebuild_word_summary と同じ結果）"""
+    with conn:
+        conn.execute("SAVEPOINT recount")
+        migrations.rebuild_word_summary(conn.cursor())
+        result = _summary(conn)
+        conn.execute("ROLLBACK TO recount")
+        conn.execute("RELEASE recount")
+    return result
+
+
+def test_triggers_keep_the_summary_equal_to_a_full_recount(db_path):
+    db.init_db()
+    conn = db.get_connection()
+    rng = random.Random(9)
+    with conn:
+        conn.executemany("INSERT INTO users (user_id, name) VALUES (?, 'u')", [(1,), (2,), (3,)])
+        conn.executemany(
+            "INSERT INTO words (word_id, english, japanese) VALUES (?, ?, 'x')",
+            [(i, f"w{i}") for i in range(1, 21)],
+        )
+
+    next_word = 21
+    for _ in range(400):
+        user_id = rng.randint(1, 3)
+        word_id = rng.randint(1, next_word - 1)
+        op = rng.random()
+        with conn:
+            if op < 0.4:
+                conn.execute("""
+                    INSERT INTO word_progress (user_id, word_id, stage) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id, word_id) DO UPDATE SET stage = excluded.stage
+                """, (user_id, word_id, rng.randint(1, 4)))
+            elif op < 0.5:
+                conn.execute(
+                    "DELETE FROM word_progress WHERE user_id = ? AND word_id = ?", (user_id, word_id)
+                )
+            elif op < 0.6:
+                conn.execute(
+                    "UPDATE OR IGNORE word_progress SET word_id = ? WHERE user_id = ? AND word_id = ?",
+                    (rng.randint(1, next_word - 1), user_id, word_id),
+                )
+            elif op < 0.75:
+                conn.execute("UPDATE words SET retired = ? WHERE word_id = ?", (rng.randint(0, 1), word_id))
+            elif op < 0.85:
+                conn.execute("DELETE FROM words WHERE word_id = ?", (word_id,))
+            else:
+                # 進捗が残っている単語 ID に単語が戻ってくる場合もある
+                conn.execute(
+                    "INSERT OR IGNORE INTO words (word_id, english, japanese) VALUES (?, ?, 'x')",
+                    (word_id, f"w{word_id}"),
+                )
+                if rng.random() < 0.3:
+                    conn.execute(
+                        "INSERT INTO words (word_id, english, japanese) VALUES (?, ?, 'x')",
+                        (next_word, f"w{next_word}"),
+                    )
+                    next_word += 1
+        assert _summary(conn) == _recount(conn)
+
+
+def test_get_word_stats_reads_the_summary(db_path):
+    db.init_db()
+    conn = db.get_connection()
+    with conn:
+        conn.execute("INSERT INTO users (user_id, name) VALUES (1, 'u')")
+        conn.executemany(
+            "INSERT INTO words (word_id, english, japanese) VALUES (?, ?, 'x')",
+            [(1, "a"), (2, "b"), (3, "c"), (4, "d")],
+        )
+        conn.executemany(
+            "INSERT INTO word_progress (user_id, word_id, stage) VALUES (1, ?, ?)",
+            [(1, 2), (2, 4), (3, 4)],
+        )
+        conn.execute("UPDATE words SET retired = 1 WHERE word_id = 3")
+
+    stats = word_service.get_word_stats(1)
+    assert stats["total_words"] == 3
+    assert stats["stage1_cleared_pct"] == round(2 * 100 / 3, 1)
+    assert stats["stage3_cleared_pct"] == round(100 / 3, 1)
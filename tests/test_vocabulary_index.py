@@ -0,0 +1,73 @@
+"""
+語彙索引（OSA 編集距離・1回の編集で届く単語・誤答の分類）
+"""
+import random
+
+from app.services import vocabulary_index
+from app.services.vocabulary_index import VocabularyIndex, edit_distance
+
+
+WORDS = [("weather", "天気"), ("whether", "〜かどうか"), ("form", "形"), ("from", "〜から"), ("apple", "りんご")]
+
+
+def _osa_reference(a: str, b: str) -> int:
+    """表全体を作る素直な OSA 距離"""
+    d = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        d[i][0] = i
+    for j in range(len(b) + 1):
+        d[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+def test_edit_distance_counts_a_transposition_as_one_edit():
+    assert edit_distance("form", "from") == 1
+    assert edit_distance("weather", "whether") == 2
+    assert edit_distance("", "abc") == 3
+    assert edit_distance("ca", "abc") == 3  # OSA（制限付き）なので 2 にはならない
+    assert edit_distance("apple", "apple") == 0
+
+
+def test_edit_distance_matches_the_full_table_and_cuts_off():
+    rng = random.Random(5)
+    for _ in range(300):
+        a = "".join(rng.choice("abcd") for _ in range(rng.randrange(0, 7)))
+        b = "".join(rng.choice("abcd") for _ in range(rng.randrange(0, 7)))
+        expected = _osa_reference(a, b)
+        assert edit_distance(a, b) == expected
+        assert edit_distance(a, b, 2) == min(expected, 3)
+
+
+def test_edits1_neighbors_are_one_edit_away():
+    index = VocabularyIndex(WORDS)
+    assert sorted(w[0] for w in index.neighbors("form")) == ["from"]
+    assert sorted(w[0] for w in index.neighbors("aple")) == ["apple"]
+    assert sorted(w[0] for w in index.neighbors("weathers")) == ["weather"]
+    assert sorted(w[0] for w in index.neighbors("wether")) == ["weather", "whether"]
+    # 自分自身は含まない
+    assert index.neighbors("apple") == []
+
+    keys = {"weather", "whether", "form", "from", "apple"}
+    for candidate in set(index._edits1("wheter")):
+        assert candidate in keys or edit_distance(candidate, "wheter") <= 1
+
+
+def test_classify_wrong_spellings():
+    index = VocabularyIndex(WORDS)
+    assert index.classify("Apple", "apple") is None
+    assert index.classify("form", "from")["kind"] == vocabulary_index.ERROR_OTHER_WORD
+    assert index.classify("form", "from")["confused_japanese"] == "形"
+    assert index.classify("aplpe", "apple")["kind"] == vocabulary_index.ERROR_TRANSPOSITION
+    assert index.classify("appl", "apple")["kind"] == vocabulary_index.ERROR_TYPO
+    near = index.classify("whethr", "weather")
+    assert near["kind"] == vocabulary_index.ERROR_NEAR_OTHER_WORD
+    assert near["confused_with"] == "whether"
+    assert index.classify("wheathr", "weather")["kind"] == vocabulary_index.ERROR_MISSPELLING
+    unrelated = index.classify("banana", "apple")
+    assert unrelated["kind"] == vocabulary_index.ERROR_UNRELATED
+    assert unrelated["distance"] is None
@@ -0,0 +1,49 @@
+"""
+単語出題スケジューラ（heap / numpy バックエンドの一致）
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import word_scheduler
+
+
+def _progress(rng: random.Random, now: datetime) -> dict:
+    answered = None
+    if rng.random() < 0.7:
+        answered = (now - timedelta(days=rng.randrange(0, 30))).isoformat()
+    return {
+        "stage": rng.randint(1, 4),
+        "total_wrong": rng.randrange(0, 6),
+        "correct_streak": rng.randrange(0, 6),
+        "avg_answer_time_sec": round(rng.uniform(0.5, 10.0), 2),
+        "last_answered_at": answered,
+    }
+
+
+@pytest.mark.skipif(not word_scheduler.NUMPY_AVAILABLE, reason="NumPy が必要")
+def test_numpy_backend_matches_heap_after_random_updates():
+    rng = random.Random(20241017)
+    now = datetime.now()
+    rows = [
+        {"word_id": word_id, "english": f"w{word_id}", "japanese": f"語{word_id}", **_progress(rng, now)}
+        for word_id in range(1, 5001)
+    ]
+    heap = word_scheduler.create_scheduler("heap", 1, rows)
+    vectorized = word_scheduler.create_scheduler("numpy", 1, rows)
+
+    def top(scheduler):
+        return [(w["word_id"], w["stage"], w["total_wrong"], w["correct_streak"])
+                for w in scheduler.top_candidates(50)]
+
+    assert top(vectorized) == top(heap)
+    for step in range(2000):
+        word_id = rng.randint(1, 5000)
+        progress = _progress(rng, now)
+        heap.update(word_id, progress)
+        vectorized.update(word_id, progress)
+        if step % 100 == 99:
+            assert top(vectorized) == top(heap)
+    assert top(vectorized) == top(heap)
+    assert len(top(heap)) == 50
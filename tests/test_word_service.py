@@ -0,0 +1,146 @@
+"""
+単語の出題（get_next_word）と紛らわしい単語の続けての出題
+"""
+import sqlite3
+import threading
+
+from app.services import db
+from app.services import importer
+from app.services import word_service
+from app.services.word_prefetch import WordPrefetchQueue
+
+
+WORDS = [(1, "weather", "天気"), (2, "whether", "〜かどうか"), (3, "apple", "りんご"), (4, "book", "本")]
+
+
+def _setup() -> None:
+    db.init_db()
+    conn = db.get_connection()
+    with conn:
+        conn.execute("INSERT INTO users (user_id, name) VALUES (1, 'test')")
+        conn.executemany(
+            "INSERT INTO words (word_id, english, japanese, grade, unit, level) VALUES (?, ?, ?, 1, 'u', 1)",
+            WORDS,
+        )
+        conn.executemany(
+            "INSERT INTO word_confusables (word_id, other_word_id, score, reason) VALUES (?, ?, 0.7, 1)",
+            [(1, 2), (2, 1)],
+        )
+
+
+def test_get_next_word_follows_the_previous_word_with_a_confusable(db_path):
+    _setup()
+    weather = {"word_id": 1, "interleaved": False}
+
+    # 先読みなど、previous を渡さない呼び出しは続けての出題に影響しない
+    for _ in range(20):
+        assert not word_service.get_next_word(1)["interleaved"]
+
+    whether = word_service.get_next_word(1, previous=weather)
+    assert whether["word_id"] == 2
+    assert whether["interleaved"]
+
+    # 続けて出した単語からはさらに続けない
+    for _ in range(20):
+        assert not word_service.get_next_word(1, previous=whether)["interleaved"]
+
+    word_service.set_confusable_interleaving(False)
+    try:
+        assert not word_service.get_next_word(1, previous=weather)["interleaved"]
+    finally:
+        word_service.set_confusable_interleaving(True)
+
+
+def test_prefetch_chains_from_the_shown_word(db_path):
+    _setup()
+    filters = (None, None, None, None)
+    queue = WordPrefetchQueue(user_id=1, depth=1)
+    try:
+        queue.request_fill(filters, {"word_id": 1, "interleaved": False})
+        for _ in range(200):
+            words = queue.peek()
+            if words:
+                break
+            queue._thread.join(0.01)
+        assert [w["word_id"] for w in words] == [2]
+    finally:
+        queue.shutdown()
+
+
+def test_get_next_word_stops_serving_words_retired_by_a_sync(db_path):
+    _setup()
+    assert {word_service.get_next_word(1)["word_id"] for _ in range(50)} == {1, 2, 3, 4}
+
+    # apple だけを外す（スケジューラは作り直す）
+    kept = [
+        {"english": english, "japanese": japanese, "grade": 1, "unit": "u", "level": 1}
+        for _, english, japanese in WORDS if english != "apple"
+    ]
+    importer.sync_words(kept)
+
+    assert {word_service.get_next_word(1)["word_id"] for _ in range(50)} == {1, 2, 4}
+    assert 3 not in {w["word_id"] for w in word_service.get_upcoming_words(1)}
+
+
+def test_get_next_word_sees_words_changed_by_another_process(db_path):
+    _setup()
+    assert word_service.get_next_word(1) is not None
+
+    # 別のプロセスのインポート（このプロセスの importer を通らない）
+    other = sqlite3.connect(db_path)
+    with other:
+        other.execute("UPDATE words SET retired = 1 WHERE word_id <> 4")
+        other.execute(
+            "INSERT INTO content_sync_state (source, file_hash, synced_at) VALUES ('words', 'x', '')"
+        )
+    other.close()
+
+    assert {word_service.get_next_word(1)["word_id"] for _ in range(10)} == {4}
+
+
+def test_record_answer_does_not_wait_for_a_scheduler_load(db_path, monkeypatch):
+    _setup()
+    load_candidates = word_service._load_candidates
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_load(*args):
+        rows = load_candidates(*args)
+        started.set()
+        assert release.wait(10)
+        return rows
+
+    monkeypatch.setattr(word_service, "_load_candidates", slow_load)
+    loader = threading.Thread(target=lambda: word_service.get_next_word(1))
+    loader.start()
+    try:
+        assert started.wait(10)
+        # 先読みワーカーが読み込んでいる間に、GUI スレッドで回答を記録する
+        recorder = threading.Thread(target=lambda: word_service.record_answer(1, 3, False, 1.0))
+        recorder.start()
+        recorder.join(2)
+        assert not recorder.is_alive()
+    finally:
+        release.set()
+        loader.join(10)
+
+    # 読み込み中に記録した回答も、登録されたスケジューラに反映されている
+    scheduler = word_service._schedulers[(1, None, None, None, None)]
+    apple = next(row for row in scheduler.top_candidates(10) if row["word_id"] == 3)
+    assert apple["total_wrong"] == 1
+
+
+def test_peek_upcoming_words_reads_only_cached_schedulers(db_path):
+    _setup()
+    statements = []
+    db.get_connection().set_trace_callback(statements.append)
+    try:
+        assert word_service.peek_upcoming_words(1) == []
+        assert statements == []
+    finally:
+        db.get_connection().set_trace_callback(None)
+
+    word_service.get_next_word(1)
+    upcoming = word_service.peek_upcoming_words(1)
+    assert {w["word_id"] for w in upcoming} == {1, 2, 3, 4}
+    assert upcoming == word_service.get_upcoming_words(1)